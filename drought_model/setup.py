@@ -20,9 +20,13 @@ setuptools.setup(
     package_dir={"": "src"},
     packages=setuptools.find_packages(where="src"),
     install_requires=install_requires,
+    extras_require={'dev': ['pytest']},
     entry_points={
         'console_scripts': [
             f"run-drought-model = {PROJECT_NAME}.pipeline:main",
+            f"run-drought-service = {PROJECT_NAME}.service:main",
+            f"benchmark-drought-model = {PROJECT_NAME}.benchmark:main",
+            f"backfill-drought-model = {PROJECT_NAME}.backfill:main",
         ]
     }
 )
\ No newline at end of file
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+
+# length of the rolling window and rainfall threshold of a dryspell, as in cumulative_and_dryspell()
+window_days = 14
+dryspell_threshold = 2
+
+# columns of the last daily rainfall values (oldest first) kept for the rolling window
+window_columns = [f'w{i:02d}' for i in range(1, window_days)]
+
+
+def new_accumulator(pcodes):
+    '''
+    Function to create an empty accumulator of daily rainfall per district for a month.
+    '''
+    df_acc = pd.DataFrame({'ADM2_PCODE': list(pcodes),
+                           'p_cumul': 0.0,
+                           'dryspell': 0,
+                           'n_days': 0,
+                           'last_date': ''})
+    for column in window_columns:
+        df_acc[column] = np.nan
+
+    return df_acc
+
+
+def update_accumulator(df_acc, rain, date):
+    '''
+    Function to add the rainfall of one day (array in the order of the districts of the accumulator)
+    to the accumulator: monthly cumulative rainfall, the 14-day rolling window and the dryspell count.
+    Days have to be added in order.
+    '''
+    rain = np.asarray(rain, dtype=float)
+    window = np.column_stack([df_acc[window_columns].to_numpy(dtype=float), rain])
+    n_days = df_acc['n_days'].to_numpy() + 1
+
+    # a day is dry if the rolling cumulative rainfall of 14 complete days is below the threshold
+    rolling_cumul = window.sum(axis=1)
+    dry = (n_days >= window_days) & ~np.isnan(rolling_cumul) & (rolling_cumul <= dryspell_threshold)
+
+    df_acc = df_acc.copy()
+    df_acc['p_cumul'] = df_acc['p_cumul'].to_numpy() + np.nan_to_num(rain)
+    df_acc['dryspell'] = df_acc['dryspell'].to_numpy() + dry.astype(int)
+    df_acc['n_days'] = n_days
+    df_acc['last_date'] = date.isoformat()
+    df_acc[window_columns] = window[:, 1:]
+
+    return df_acc
+
+
+def finalize_accumulator(df_acc, month_data):
+    '''
+    Function to get the monthly cumulative rainfall and dryspell per district from the accumulator,
+    in the format of cumulative_and_dryspell().
+    '''
+    return df_acc[['ADM2_PCODE', 'dryspell', 'p_cumul']].rename(
+        columns={'p_cumul': f'{month_data:02}_p_cumul',
+                 'dryspell': f'{month_data:02}_dryspell'})
@@ -0,0 +1,96 @@
+'''
+Network and CPU activity of a run. The I/O helpers (downloads, datalake, Key Vault, IBF API) are recorded
+as 'network', the CPU-bound work (zonal statistics, inference, cumulative rainfall) as 'cpu'.
+Intervals are recorded from any thread; activity_summary() reports the share of the run in which
+the network, the CPU and both at the same time were busy.
+'''
+import time
+import functools
+import contextlib
+
+
+# recorded intervals of the current run: (kind, start, end) in seconds of time.monotonic()
+activity_log = []
+
+
+def start_recording():
+    '''
+    Function to clear the recorded intervals at the start of a run.
+    Returns the start time of the run.
+    '''
+    activity_log.clear()
+    return time.monotonic()
+
+
+def add_activity(kind, start, end):
+    activity_log.append((kind, start, end))
+
+
+@contextlib.contextmanager
+def busy(kind):
+    '''
+    Record the duration of a block of code as activity of a kind.
+    '''
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        add_activity(kind, start, time.monotonic())
+
+
+def record(kind):
+    '''
+    Decorator to record every call of a function as activity of a kind.
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with busy(kind):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def merge_intervals(intervals, start, end):
+    '''
+    Function to merge overlapping intervals, clipped to the period from start to end.
+    '''
+    merged = []
+    for interval_start, interval_end in sorted(intervals):
+        interval_start, interval_end = max(interval_start, start), min(interval_end, end)
+        if interval_end <= interval_start:
+            continue
+        if merged and interval_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], interval_end)
+        else:
+            merged.append([interval_start, interval_end])
+    return merged
+
+
+def intersection_length(intervals_a, intervals_b):
+    '''
+    Function to calculate the total length of the intersection of two lists of merged intervals.
+    '''
+    length, i, j = 0.0, 0, 0
+    while i < len(intervals_a) and j < len(intervals_b):
+        length += max(0.0, min(intervals_a[i][1], intervals_b[j][1]) - max(intervals_a[i][0], intervals_b[j][0]))
+        if intervals_a[i][1] < intervals_b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return length
+
+
+def activity_summary(start, end=None):
+    '''
+    Function to summarize the recorded activity of a run from start to end (default: now):
+    share of the run time in which the network was busy, the CPU was busy, and both at the same time.
+    '''
+    end = time.monotonic() if end is None else end
+    duration = max(end - start, 1e-9)
+    network = merge_intervals([(s, e) for kind, s, e in activity_log if kind == 'network'], start, end)
+    cpu = merge_intervals([(s, e) for kind, s, e in activity_log if kind == 'cpu'], start, end)
+
+    return {'network_busy': round(sum(e - s for s, e in network) / duration, 3),
+            'cpu_busy': round(sum(e - s for s, e in cpu) / duration, 3),
+            'overlap': round(intersection_length(network, cpu) / duration, 3)}
@@ -0,0 +1,183 @@
+'''
+Streaming backfill of CHIRPS over many months, e.g. to fill the feature store of past seasons.
+The feature store of CHIRPS or VCI can also be rebuilt from the processed monthly files
+already in the datalake (--from-processed), without any download.
+The daily rasters of a month flow one at a time through download -> decode -> zonal average -> accumulator
+(see accumulator.py): a raster is only held in memory while it is processed and is never written to disk.
+Memory does not grow with the number of days or months; the resident memory of the process is checked
+against a budget after every raster.
+
+Run with:   "backfill-drought-model --start 2019-10 --end 2024-04 --memory-budget 1024"
+            "backfill-drought-model --start 2019-10 --end 2024-04 --source vci --from-processed"
+(months of execution; the file of a month of execution holds the data of the previous month)
+'''
+import os
+import sys
+import json
+import calendar
+import argparse
+import logging
+import pandas as pd
+from drought_model.settings import backfill_memory_budget_mb, run_context_from_env
+from drought_model.accumulator import new_accumulator, update_accumulator, finalize_accumulator
+from drought_model.gridded import read_clipped_gzip
+from drought_model.workdir import parse_chirps_date
+from drought_model.zonal import array_zonal_mean
+
+
+def current_rss():
+    '''
+    Function to get the resident memory of the process in bytes,
+    or its peak if the current value is not available (no /proc).
+    '''
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def check_memory(memory, memory_budget):
+    '''
+    Function to measure the resident memory after a raster, keep its peak in memory['peak_rss']
+    and fail if it exceeds the budget in bytes.
+    '''
+    rss = current_rss()
+    memory['peak_rss'] = max(memory['peak_rss'], rss)
+    if memory_budget and rss > memory_budget:
+        logging.error(f'check_memory: resident memory {rss / 1024**2:.0f} MB exceeds budget '
+                      f'{memory_budget / 1024**2:.0f} MB')
+        raise ValueError()
+
+
+def run_months_between(start, end):
+    '''
+    Function to list the months of execution (year, month) from start to end ('YYYY-MM'), both included.
+    '''
+    year, month = map(int, start.split('-'))
+    year_end, month_end = map(int, end.split('-'))
+    run_months = []
+    while (year, month) <= (year_end, month_end):
+        run_months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return run_months
+
+
+def stream_chirps_days(urls, year_data, month_data):
+    '''
+    Generator of the daily CHIRPS of a month in order of date: (date, gzipped GeoTIFF in memory).
+    urls is the listing of the year of the CHIRPS data source.
+    '''
+    from drought_model.utils import fetch_data
+
+    prefix = f'chirps-v2.0.{year_data}.{month_data:02d}'
+    for file_url in sorted(url for url in urls if url.split('/')[-1].startswith(prefix)):
+        date = parse_chirps_date(file_url.split('/')[-1])
+        if date is not None:
+            yield date, fetch_data(file_url)
+
+
+def backfill_chirps_month(ctx, urls, year_data, month_data, memory, memory_budget):
+    '''
+    Function to calculate the monthly cumulative rainfall and dryspell per adm2 of a past month,
+    streaming its daily rasters one at a time into the accumulator.
+    '''
+    from drought_model.utils import get_admin_geometries
+
+    boundaries = get_admin_geometries(ctx, 2)
+    adm_csv_path = os.path.join(ctx.adm_path, ctx.adm_name(2) + '.csv')
+    df_acc = new_accumulator(pd.read_csv(adm_csv_path)['ADM2_PCODE'])
+
+    for date, data_gz in stream_chirps_days(urls, year_data, month_data):
+        array, transform, _ = read_clipped_gzip(data_gz, boundaries['total_bounds'])
+        del data_gz
+        mean = array_zonal_mean(array, transform, boundaries['geometries'])
+        del array
+        df_acc = update_accumulator(df_acc, mean, date)
+        check_memory(memory, memory_budget)
+
+    n_days = int(df_acc['n_days'].iloc[0])
+    if n_days < calendar.monthrange(year_data, month_data)[1]:
+        logging.warning(f'backfill_chirps_month: CHIRPS of {year_data}-{month_data:02} has {n_days} days')
+    return finalize_accumulator(df_acc, month_data)
+
+
+def backfill_chirps(ctx, run_months, memory_budget_mb=backfill_memory_budget_mb):
+    '''
+    Function to process the CHIRPS of past months of execution, as get_new_chirps() would have:
+    the processed file and the feature store partition of every month are saved in the datalake as soon as
+    the month is processed, so that a failed backfill keeps the months already processed.
+    Returns the number of months and the peak resident memory in MB.
+    '''
+    from drought_model.utils import access_chirps, update_feature_store, save_dataframe_to_remote
+
+    memory_budget = memory_budget_mb * 1024**2 if memory_budget_mb else None
+    memory = {'peak_rss': current_rss()}
+    listing = {}
+    for year_run, month_run in run_months:
+        year_data, month_data = (year_run - 1, 12) if month_run == 1 else (year_run, month_run - 1)
+        logging.info(f'backfill_chirps: processing CHIRPS of {year_data}-{month_data:02}')
+        if year_data not in listing:
+            # only the listing of the year in process is kept
+            listing = {year_data: access_chirps(ctx.chirps_url + str(year_data) + '/')}
+        df_chirps = backfill_chirps_month(ctx, listing[year_data], year_data, month_data, memory, memory_budget)
+
+        blob_path = f'drought/Silver/{ctx.country}/chirps/chirps_{year_run}-{month_run:02}.csv'
+        save_dataframe_to_remote(ctx, df_chirps, blob_path, ctx.container)
+        update_feature_store(ctx, 'chirps', df_chirps, year_data, month_data)
+
+    return {'months': len(run_months), 'peak_rss_mb': round(memory['peak_rss'] / 1024**2, 1)}
+
+
+def backfill_feature_store(ctx, source, run_months):
+    '''
+    Function to fill the feature store of a source (chirps, vci) from the processed monthly files in the datalake,
+    one partition per month. The file of a month of execution holds the data of the previous month.
+    Returns the number of months.
+    '''
+    from drought_model.utils import read_dataframe_from_remote, update_feature_store
+
+    for year_run, month_run in run_months:
+        year_data, month_data = (year_run - 1, 12) if month_run == 1 else (year_run, month_run - 1)
+        logging.info(f'backfill_feature_store: storing {source} of {year_data}-{month_data:02}')
+        blob_path = f'drought/Silver/{ctx.country}/{source}/{source}_{year_run}-{month_run:02}.csv'
+        df_processed = read_dataframe_from_remote(ctx, ctx.container, blob_path)
+        update_feature_store(ctx, source, df_processed, year_data, month_data)
+
+    return {'months': len(run_months)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill of CHIRPS and of the feature store of past months')
+    parser.add_argument('--start', required=True, help='first month of execution YYYY-MM')
+    parser.add_argument('--end', required=True, help='last month of execution YYYY-MM')
+    parser.add_argument('--source', choices=['chirps', 'vci'], default='chirps', help='data source (default: chirps)')
+    parser.add_argument('--from-processed', action='store_true',
+                        help='fill the feature store from the processed monthly files in the datalake')
+    parser.add_argument('--memory-budget', type=int, default=backfill_memory_budget_mb,
+                        help=f'resident memory budget in MB, 0: no budget (default: {backfill_memory_budget_mb})')
+    parser.add_argument('--country', help='country code, e.g. zwe')
+    parser.add_argument('--work-dir', help='folder of data_in, data_out, shp and model')
+    parser.add_argument('--local-store', help='folder of local secrets and blobs used instead of Azure')
+    args = parser.parse_args(argv)
+    if args.source == 'vci' and not args.from_processed:
+        parser.error('the VCI backfill reads the processed monthly files, use --from-processed')
+
+    from drought_model.utils import basic_data
+
+    ctx = run_context_from_env(today=f'{args.end}-01', country=args.country, work_dir=args.work_dir,
+                               local_store=args.local_store)
+    run_months = run_months_between(args.start, args.end)
+    if args.from_processed:
+        result = backfill_feature_store(ctx, args.source, run_months)
+    else:
+        basic_data(ctx)
+        result = backfill_chirps(ctx, run_months, args.memory_budget)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
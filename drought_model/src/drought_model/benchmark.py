@@ -0,0 +1,575 @@
+'''
+Benchmarks of the drought pipeline.
+Run with:  "benchmark-drought-model <case>"
+'''
+import os
+import sys
+import time
+import json
+import argparse
+import datetime
+import statistics
+import subprocess
+import tracemalloc
+import dataclasses
+
+
+# a case of the suite regresses when it is slower (or uses more memory) than the median of
+# its last history_runs runs by more than regression_threshold (relative)
+regression_threshold = 0.2
+history_runs = 5
+
+# imports measured by the startup benchmark: entry point and the fast (off-season) path
+startup_targets = {
+    'entry_point': 'import drought_model.pipeline',
+    'off_season': 'from drought_model.utils import post_none_output',
+    'full_stack': 'import drought_model.utils; import rasterstats; import xgboost; import bs4',
+}
+
+
+def parse_importtime(stderr):
+    '''
+    Function to parse the output of "python -X importtime".
+    Returns the cumulative import time in seconds of every top-level import.
+    '''
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('  '):
+            continue
+        timings[name.strip()] = int(cumulative) / 1e6
+
+    return timings
+
+
+def startup_benchmark(targets=startup_targets, repeat=3):
+    '''
+    Function to measure the import time of the entry point with "python -X importtime".
+    Every statement runs in a fresh interpreter, the fastest of the repeats is kept.
+    Returns per target the total import time and the slowest top-level imports.
+    '''
+    results = {}
+    for target, statement in targets.items():
+        best = None
+        for _ in range(repeat):
+            completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                                       capture_output=True, text=True)
+            if completed.returncode != 0:
+                results[target] = {'error': completed.stderr.strip().splitlines()[-1]}
+                break
+            timings = parse_importtime(completed.stderr)
+            if best is None or sum(timings.values()) < sum(best.values()):
+                best = timings
+        if best is None:
+            continue
+        slowest = sorted(best.items(), key=lambda item: item[1], reverse=True)[:5]
+        results[target] = {'total_s': round(sum(best.values()), 4),
+                           'slowest': [[name, round(seconds, 4)] for name, seconds in slowest]}
+
+    return results
+
+
+def zonal_benchmark(raster_dir, cache_path, workers_list=None, repeat=3):
+    '''
+    Function to measure the scaling of the zonal statistics of a month of rasters
+    (e.g. a working directory of CHIRPS) from 1 to N processes.
+    Returns per number of workers the fastest duration, the speedup over 1 worker
+    and whether the averages equal those of 1 worker.
+    '''
+    import numpy as np
+    from drought_model.zonal import zonal_means
+
+    raster_paths = sorted(os.path.join(raster_dir, filename) for filename in os.listdir(raster_dir)
+                          if filename.endswith(('.tif', '.tif.gz')))
+    if workers_list is None:
+        workers_list = sorted({1, 2, 4, os.cpu_count() or 1})
+
+    results = {'rasters': len(raster_paths)}
+    reference = None
+    for workers in workers_list:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            means, _ = zonal_means(raster_paths, cache_path, workers)
+            duration = time.perf_counter() - start
+            best = duration if best is None else min(best, duration)
+        if reference is None:
+            reference = (means, best)
+        results[f'workers_{workers}'] = {'seconds': round(best, 3),
+                                         'speedup': round(reference[1] / best, 2),
+                                         'equal': bool(np.allclose(means, reference[0], equal_nan=True))}
+
+    return results
+
+
+def e2e_benchmark(scales=(10, 100, 1000), today='2024-02-15', workers=None, orchestration='sync', latency=0):
+    '''
+    Function to run the whole pipeline on synthetic fixtures (see fixtures.py) at several numbers of districts.
+    Every scale runs in a fresh temporary folder with its own fixture server, which answers every request
+    after latency seconds.
+    Returns per scale the duration of the run and of every stage, the network and CPU activity
+    and the number of layers posted.
+    '''
+    import tempfile
+    from drought_model import pipeline
+    from drought_model.fixtures import make_fixtures, serve_fixtures, fixture_context
+
+    results = {}
+    for n_adm2 in scales:
+        with tempfile.TemporaryDirectory() as root:
+            paths = make_fixtures(root, today, n_adm2=n_adm2)
+            server, base_url = serve_fixtures(paths['http_root'], latency=latency)
+            try:
+                ctx = fixture_context(root, base_url, today, workers=workers, notify_email=False,
+                                      orchestration=orchestration)
+                start = time.perf_counter()
+                timings = pipeline.run(ctx)
+                duration = time.perf_counter() - start
+            finally:
+                server.shutdown()
+            results[f'adm2_{n_adm2}'] = {'seconds': round(duration, 3),
+                                         'status': timings.pop('status', None),
+                                         'failures': pipeline.run_failures(timings.pop('results', {})),
+                                         'activity': timings.pop('activity', None),
+                                         'stages': timings,
+                                         'layers_posted': len(server.posted)}
+
+    return results
+
+
+def overlap_benchmark(n_adm2=100, today='2024-02-15', workers=None, latency=0.2):
+    '''
+    Function to run the whole pipeline on the same fixtures with the synchronous and the asynchronous
+    orchestration (see orchestration.py), with a latency in seconds per request of the data sources
+    (a local fixture server without latency leaves nothing to overlap).
+    Returns both runs, the ratio of their durations (async / sync) and the share of the asynchronous run
+    in which network and CPU were busy at the same time.
+    '''
+    runs = {orchestration: e2e_benchmark([n_adm2], today, workers, orchestration, latency)[f'adm2_{n_adm2}']
+            for orchestration in ('sync', 'async')}
+    return {'runs': runs,
+            'ratio': round(runs['async']['seconds'] / runs['sync']['seconds'], 3),
+            'overlap': runs['async']['activity']['overlap']}
+
+
+def backfill_benchmark(n_adm2=100, months=6, today='2024-02-15', memory_budget_mb=None):
+    '''
+    Function to run the streaming backfill of CHIRPS (see backfill.py) on fixtures of the months of execution
+    up to the month of today. The peak resident memory after the first month and after all months shows
+    whether memory grows with the number of months; no raster may be written to disk.
+    Fails (ValueError) when the resident memory exceeds the budget.
+    '''
+    import tempfile
+    import numpy as np
+    from drought_model.utils import basic_data
+    from drought_model.settings import backfill_memory_budget_mb
+    from drought_model.backfill import backfill_chirps, run_months_between
+    from drought_model.fixtures import make_fixtures, serve_fixtures, fixture_context, write_chirps
+
+    memory_budget_mb = memory_budget_mb or backfill_memory_budget_mb
+    end = datetime.date.fromisoformat(today)
+    first = end.year * 12 + end.month - months
+    run_months = run_months_between(f'{first // 12}-{first % 12 + 1:02}', end.strftime('%Y-%m'))
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = make_fixtures(root, today, n_adm2=n_adm2)
+        rng = np.random.default_rng(0)
+        for year_run, month_run in run_months[:-1]:
+            year_data, month_data = (year_run - 1, 12) if month_run == 1 else (year_run, month_run - 1)
+            write_chirps(paths['http_root'], year_data, month_data, rng)
+        server, base_url = serve_fixtures(paths['http_root'])
+        try:
+            ctx = fixture_context(root, base_url, today, notify_email=False)
+            basic_data(ctx)
+            start = time.perf_counter()
+            first_month = backfill_chirps(ctx, run_months[:1], memory_budget_mb)
+            all_months = backfill_chirps(ctx, run_months, memory_budget_mb)
+            duration = time.perf_counter() - start
+        finally:
+            server.shutdown()
+        raw_files = sum(len(files) for _, _, files in os.walk(ctx.rawchirps_path))
+
+    return {'months': len(run_months),
+            'seconds': round(duration, 3),
+            'memory_budget_mb': memory_budget_mb,
+            'peak_rss_mb_first_month': first_month['peak_rss_mb'],
+            'peak_rss_mb': all_months['peak_rss_mb'],
+            'raw_files_written': raw_files}
+
+
+# GDAL configurations compared by the raster_io benchmark (see gridded.configure_rasters())
+raster_io_configs = {
+    'gdal_default': {'cache_mb': None, 'num_threads': None, 'vsi_cache_mb': None, 'gzip': 'memory'},
+    'cache_1_thread': {'cache_mb': 256, 'num_threads': 1, 'vsi_cache_mb': 64, 'gzip': 'memory'},
+    'cache_all_cpus': {'cache_mb': 256, 'num_threads': 'ALL_CPUS', 'vsi_cache_mb': 64, 'gzip': 'memory'},
+    'cache_all_cpus_vsigzip': {'cache_mb': 256, 'num_threads': 'ALL_CPUS', 'vsi_cache_mb': 64, 'gzip': 'vsigzip'},
+}
+
+
+def decode_rasters(locations, bounds, config, repeat=3):
+    '''
+    Function to read rasters clipped to bounds with a GDAL configuration, in a fresh process
+    (see raster_io_benchmark()). Returns the duration of the first read of all rasters,
+    the fastest of the repeats (with the GDAL cache filled) and the number of pixels read.
+    '''
+    from drought_model.gridded import configure_rasters, read_raster
+
+    configure_rasters(**config)
+    durations = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        pixels = sum(read_raster(location, bounds)[0].size for location in locations)
+        durations.append(time.perf_counter() - start)
+    return durations[0], min(durations[1:]), pixels
+
+
+def raster_io_benchmark(today='2024-02-15', repeat=3, seed=0):
+    '''
+    Function to measure the decoding of the daily CHIRPS of a month of fixtures per GDAL configuration
+    (raster_io_configs), in layouts of the rasters: gzipped (as the CHIRPS source), plain GeoTIFF,
+    tiled GeoTIFF with DEFLATE, and the gzipped and DEFLATE rasters read over HTTP (/vsicurl/).
+    Every configuration runs in a fresh process, as GDAL sizes its block cache at the first read.
+    Returns per layout and configuration the duration of the first read and of a read with the cache filled,
+    and the rasters and megapixels decoded per second.
+    '''
+    import gzip
+    import tempfile
+    import multiprocessing
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+    from rasterio.io import MemoryFile
+    from drought_model.fixtures import write_chirps, raster_bytes, serve_fixtures, fixture_bounds
+    from drought_model.settings import build_run_context
+
+    ctx = build_run_context(today)
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        write_chirps(root, ctx.year_data, ctx.month_data, np.random.default_rng(seed))
+        gz_dir = os.path.join(root, 'chirps', str(ctx.year_data))
+        layouts = {'gzip': [], 'geotiff': [], 'deflate': []}
+        for layout in ('geotiff', 'deflate'):
+            os.makedirs(os.path.join(root, layout))
+        for filename in sorted(os.listdir(gz_dir)):
+            with open(os.path.join(gz_dir, filename), 'rb') as raster_file:
+                data = gzip.decompress(raster_file.read())
+            with MemoryFile(data) as memfile, memfile.open() as src:
+                array, transform = src.read(1), src.transform
+            encoded = {'geotiff': data,
+                       'deflate': raster_bytes(array, transform, tiled=True, blockxsize=256, blockysize=256,
+                                               compress='deflate', predictor=3)}
+            for layout, content in encoded.items():
+                with open(os.path.join(root, layout, filename[:-3]), 'wb') as raster_file:
+                    raster_file.write(content)
+                layouts[layout].append(os.path.join(layout, filename[:-3]))
+            layouts['gzip'].append(os.path.relpath(os.path.join(gz_dir, filename), root))
+
+        server, base_url = serve_fixtures(root)
+        try:
+            sources = {layout: [os.path.join(root, path) for path in paths] for layout, paths in layouts.items()}
+            sources.update({f'{layout}_http': [base_url + path.replace(os.sep, '/') for path in layouts[layout]]
+                            for layout in ('gzip', 'deflate')})
+            for source, locations in sources.items():
+                results[source] = {}
+                for name, config in raster_io_configs.items():
+                    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                        first, cached, pixels = executor.submit(decode_rasters, locations, fixture_bounds,
+                                                                config, repeat).result()
+                    results[source][name] = {'first_seconds': round(first, 3),
+                                             'cached_seconds': round(cached, 3),
+                                             'rasters_per_s': round(len(locations) / cached, 1),
+                                             'mpixels_per_s': round(pixels / cached / 1e6, 1)}
+        finally:
+            server.shutdown()
+
+    return results
+
+
+def inference_benchmark(rows=10, calls=1000, seed=0):
+    '''
+    Function to compare the compiled inference (inference.py) with XGBClassifier.predict() on the dummy
+    models of fixtures.py of every month of the season, with feature matrices of random inputs of some rows
+    (one province) and missing values.
+    Returns per month the share of equal predictions and the predictions per second of both paths.
+    '''
+    import numpy as np
+    import pandas as pd
+    from drought_model.fixtures import dummy_model, model_features
+    from drought_model.inference import compile_model, predict_classes, feature_matrix
+    from drought_model.settings import months_for_model1, months_for_model2, months_for_model3
+
+    rng = np.random.default_rng(seed)
+    results = {}
+    for month in months_for_model1 + months_for_model2 + months_for_model3:
+        features = model_features(month)
+        model = dummy_model(features, rng)
+        compiled = compile_model(model.get_booster().save_raw('json'))
+
+        df_input = pd.DataFrame(rng.random((1000, len(features))), columns=features)
+        df_input = df_input.mask(rng.random(df_input.shape) < 0.05)
+        x, _ = feature_matrix(df_input, features)
+        parity = (model.predict(df_input) == predict_classes(compiled, x)).mean()
+
+        # the feature matrix is built once per forecast and reused by all calls
+        x_small = x[:rows]
+        start = time.perf_counter()
+        for _ in range(calls):
+            model.predict(x_small)
+        xgboost_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(calls):
+            predict_classes(compiled, x_small)
+        compiled_seconds = time.perf_counter() - start
+
+        results[f'month_{month:02}'] = {'features': len(features),
+                                        'parity': float(parity),
+                                        'xgboost_calls_per_s': round(calls / xgboost_seconds),
+                                        'compiled_calls_per_s': round(calls / compiled_seconds),
+                                        'speedup': round(xgboost_seconds / compiled_seconds, 1)}
+
+    return results
+
+
+def rollup_benchmark(n_adm2=1000, n_adm3=10, layers=31, repeat=3, seed=0):
+    '''
+    Function to compare the roll-up of rollup.py with a pandas groupby per admin level, on the admin grid
+    of fixtures.py with n_adm3 sub-districts per district and daily layers of a month with missing values.
+    The roll-up matrices are built once per admin table, like in a run (get_admin_hierarchy()).
+    Returns whether both give the same layers per level, the duration of both and of building the matrices.
+    '''
+    import numpy as np
+    import pandas as pd
+    from drought_model.fixtures import admin_grid
+    from drought_model.rollup import rollup_matrices, roll_up
+
+    rng = np.random.default_rng(seed)
+    _, _, _, df_adm2 = admin_grid(n_adm2)
+    df_adm = df_adm2.loc[df_adm2.index.repeat(n_adm3)].reset_index(drop=True)
+    df_adm['ADM3_PCODE'] = df_adm['ADM2_PCODE'] + pd.Series(np.tile(np.arange(n_adm3), len(df_adm2))).map('{:02d}'.format)
+    df_adm.insert(0, 'ADM0_PCODE', 'ZW')
+    areas = rng.random(len(df_adm))
+    columns = [f'{day:02d}' for day in range(1, layers + 1)]
+    df_values = pd.DataFrame(rng.random((len(df_adm), layers)), columns=columns)
+    df_values = df_values.mask(rng.random(df_values.shape) < 0.05)
+    df_values.insert(0, 'ADM3_PCODE', df_adm['ADM3_PCODE'])
+
+    def groupby_rollup():
+        df = pd.concat([df_adm, df_values.drop(columns='ADM3_PCODE')], axis=1)
+        weights = df_values[columns].notna().mul(areas, axis=0)
+        df_weighted = df_values[columns].fillna(0).mul(areas, axis=0)
+        return {level: (df_weighted.groupby(df[f'ADM{level}_PCODE']).sum()
+                        / weights.groupby(df[f'ADM{level}_PCODE']).sum()).reset_index()
+                for level in (0, 1, 2)}
+
+    seconds = {'matrices': measure(rollup_matrices, df_adm, repeat=repeat)['seconds']}
+    rollup = rollup_matrices(df_adm)
+    for name, function in (('rollup', lambda: roll_up(df_values, rollup, 'area_mean', weights=areas)),
+                           ('groupby', groupby_rollup)):
+        seconds[name] = measure(function, repeat=repeat)['seconds']
+    rolled, expected = roll_up(df_values, rollup, 'area_mean', weights=areas), groupby_rollup()
+    parity = all(np.allclose(rolled[level][columns], expected[level][columns]) for level in expected)
+
+    return {'units': {f'adm{level}': len(df_level) for level, df_level in rolled.items()},
+            'parity': parity,
+            'rollup_seconds': seconds['rollup'],
+            'groupby_seconds': seconds['groupby'],
+            'matrices_seconds': seconds['matrices'],
+            'speedup': round(seconds['groupby'] / seconds['rollup'], 1)}
+
+
+def measure(function, *args, repeat=3):
+    '''
+    Function to measure a case of the suite: fastest duration of the repeats,
+    and peak memory allocated by Python and NumPy (tracemalloc) in a separate call.
+    '''
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'seconds': round(min(durations), 4), 'peak_mb': round(peak / 2**20, 2)}
+
+
+def suite_benchmark(n_adm2=100, workers=None, repeat=3, today='2024-02-15'):
+    '''
+    Function to measure the hot paths of the pipeline on fixtures of n_adm2 districts:
+    zonal statistics of a month of CHIRPS, cumulative_and_dryspell(), arrange_data(),
+    forecast_model1/2/3(), forecast_ensemble(), calculate_impact() and the payloads of post_output().
+    The ingest stages run once to prepare the inputs, model 1 and 2 run on synthetic inputs
+    of October and December.
+    '''
+    import tempfile
+    import numpy as np
+    import pandas as pd
+    from drought_model import utils
+    from drought_model.fixtures import make_fixtures, serve_fixtures, fixture_context, write_model_inputs
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = make_fixtures(root, today, n_adm2=n_adm2)
+        server, base_url = serve_fixtures(paths['http_root'])
+        try:
+            ctx = fixture_context(root, base_url, today, workers=workers, notify_email=False)
+            for stage in (utils.basic_data, utils.get_new_enso, utils.get_new_chirps, utils.get_new_vci):
+                stage(ctx)
+            ctx_model1 = dataclasses.replace(ctx, today=datetime.date(ctx.year - 1, 10, 15))
+            ctx_model2 = dataclasses.replace(ctx, today=datetime.date(ctx.year - 1, 12, 15))
+            rng = np.random.default_rng(0)
+            write_model_inputs(ctx_model1, rng)
+            write_model_inputs(ctx_model2, rng)
+
+            chirps_dir = os.path.join(ctx.rawchirps_path, f'{ctx.year_data}-{ctx.month_data:02}')
+            raster_paths = sorted(os.path.join(chirps_dir, filename) for filename in os.listdir(chirps_dir))
+            df_precip = pd.DataFrame(rng.gamma(0.8, 6.0, (n_adm2, 31)), columns=[f'{day:02}' for day in range(1, 32)])
+            df_precip.insert(0, 'ADM2_PCODE', [f'ZW{i:06d}' for i in range(n_adm2)])
+            utils.arrange_data(ctx)
+            utils.forecast_model3(ctx)
+            df_impact = utils.calculate_impact(ctx)
+            upload_date = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%fZ")[:-3]
+
+            cases = {
+                'zonal_stats_month': (utils.zonal_means, raster_paths, utils.geometry_cache_path(ctx, 2), ctx.workers),
+                'cumulative_and_dryspell': (utils.cumulative_and_dryspell, df_precip, 'ADM2_PCODE', ctx.month_data),
+                'arrange_data': (utils.arrange_data, ctx),
+                'forecast_model1': (utils.forecast_model1, ctx_model1),
+                'forecast_model2': (utils.forecast_model2, ctx_model2),
+                'forecast_model3': (utils.forecast_model3, ctx),
+                'forecast_ensemble': (utils.forecast_ensemble, ctx),
+                'calculate_impact': (utils.calculate_impact, ctx),
+                'exposure_payloads': (utils.exposure_payloads, ctx, df_impact, upload_date),
+            }
+            results = {name: measure(*case, repeat=repeat) for name, case in cases.items()}
+        finally:
+            server.shutdown()
+
+    return results
+
+
+def git_commit():
+    completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True)
+    return completed.stdout.strip() if completed.returncode == 0 else None
+
+
+def check_regressions(history, record, threshold=regression_threshold):
+    '''
+    Function to compare the cases of a run of the suite with the median of the last runs
+    of the same scale in the history.
+    Returns the regressions, e.g. "arrange_data seconds 0.52 > 0.40 (+30%)".
+    '''
+    previous = [run for run in history if run['scale'] == record['scale']][-history_runs:]
+    regressions = []
+    for name, result in record['cases'].items():
+        for metric in ('seconds', 'peak_mb'):
+            values = [run['cases'][name][metric] for run in previous if name in run['cases']]
+            if not values:
+                continue
+            baseline = statistics.median(values)
+            if baseline > 0 and result[metric] > baseline * (1 + threshold):
+                regressions.append(f'{name} {metric} {result[metric]} > {baseline} '
+                                   f'(+{(result[metric] / baseline - 1) * 100:.0f}%)')
+
+    return regressions
+
+
+def run_suite(history_path, n_adm2=100, workers=None, repeat=3, threshold=regression_threshold):
+    '''
+    Function to run the suite, check it against the history (JSON) and append the run to the history.
+    Returns the record of the run and its regressions.
+    '''
+    history = []
+    if os.path.isfile(history_path):
+        with open(history_path) as history_file:
+            history = json.load(history_file)
+
+    record = {'date': datetime.datetime.utcnow().isoformat(timespec='seconds'),
+              'commit': git_commit(),
+              'scale': n_adm2,
+              'cases': suite_benchmark(n_adm2, workers, repeat)}
+    regressions = check_regressions(history, record, threshold)
+
+    with open(history_path, 'w') as history_file:
+        json.dump(history + [record], history_file, indent=2)
+
+    return record, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of the drought pipeline')
+    parser.add_argument('case', choices=['startup', 'zonal', 'e2e', 'overlap', 'suite', 'inference', 'backfill',
+                                             'raster_io', 'rollup'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--rasters', help='zonal: folder of the rasters of a month, e.g. data_in/chirps_tif/2024-01')
+    parser.add_argument('--geometries', help='zonal: geometry cache of the admin boundaries (shp/*.geometries.pkl)')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        help='zonal: numbers of processes to compare; e2e, overlap, suite: number of processes')
+    parser.add_argument('--orchestration', choices=['sync', 'async'], default='sync',
+                        help='e2e: orchestration of the run')
+    parser.add_argument('--scales', type=int, nargs='+', default=[10, 100, 1000],
+                        help='e2e: numbers of districts of the fixtures; overlap, suite, backfill, rollup: '
+                             'first one is used')
+    parser.add_argument('--history', default='benchmark_history.json', help='suite: JSON history of the runs')
+    parser.add_argument('--threshold', type=float, default=regression_threshold,
+                        help='suite: relative slowdown over the median of the history which fails the run')
+    parser.add_argument('--date', default='2024-02-15',
+                        help='e2e, overlap, raster_io: date of execution; backfill: last month')
+    parser.add_argument('--months', type=int, default=6, help='backfill: number of months of execution')
+    parser.add_argument('--memory-budget', type=int, help='backfill: resident memory budget in MB')
+    parser.add_argument('--rows', type=int, default=10, help='inference: rows per prediction')
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help='overlap: latency of the fixture server in seconds per request')
+    args = parser.parse_args()
+
+    if args.case == 'startup':
+        results = startup_benchmark(repeat=args.repeat)
+    elif args.case == 'zonal':
+        if not args.rasters or not args.geometries:
+            parser.error('zonal requires --rasters and --geometries')
+        results = zonal_benchmark(args.rasters, args.geometries, args.workers, args.repeat)
+    elif args.case == 'e2e':
+        results = e2e_benchmark(args.scales, args.date, args.workers[0] if args.workers else None,
+                                args.orchestration)
+    elif args.case == 'overlap':
+        results = overlap_benchmark(args.scales[0], args.date, args.workers[0] if args.workers else None,
+                                    args.latency)
+        if not results['overlap'] > 0:
+            print(json.dumps(results, indent=2))
+            print('Network and CPU work did not overlap in the asynchronous run')
+            sys.exit(1)
+    elif args.case == 'inference':
+        results = inference_benchmark(args.rows)
+        if any(result['parity'] < 1 for result in results.values()):
+            print(json.dumps(results, indent=2))
+            print('Compiled inference differs from XGBClassifier.predict()')
+            sys.exit(1)
+    elif args.case == 'backfill':
+        results = backfill_benchmark(args.scales[0], args.months, args.date, args.memory_budget)
+        if results['raw_files_written']:
+            print(json.dumps(results, indent=2))
+            print('Backfill wrote rasters to disk')
+            sys.exit(1)
+    elif args.case == 'raster_io':
+        results = raster_io_benchmark(args.date, args.repeat)
+    elif args.case == 'rollup':
+        results = rollup_benchmark(args.scales[0], repeat=args.repeat)
+        if not results['parity']:
+            print(json.dumps(results, indent=2))
+            print('Roll-up differs from the groupby per admin level')
+            sys.exit(1)
+    elif args.case == 'suite':
+        record, regressions = run_suite(args.history, args.scales[0], args.workers[0] if args.workers else None,
+                                        args.repeat, args.threshold)
+        print(json.dumps(record, indent=2))
+        if regressions:
+            print('Regressions:\n' + '\n'.join(regressions))
+            sys.exit(1)
+        return
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import json
+import pickle
+import numpy as np
+
+
+def compile_geometry_cache(geojson_path, cache_path):
+    '''
+    Function to compile admin boundaries from GeoJSON into a binary cache:
+    geometries as WKB, their properties, bounding boxes (minx, miny, maxx, maxy) and areas (see geometry_areas()).
+    The cache is loaded by load_geometry_cache() without parsing the GeoJSON again.
+    '''
+    from shapely.geometry import shape
+
+    with open(geojson_path) as geojson_file:
+        features = json.load(geojson_file)['features']
+    geometries = [shape(feature['geometry']) for feature in features]
+
+    geometry_cache = {'wkb': [geometry.wkb for geometry in geometries],
+                      'properties': [feature['properties'] for feature in features],
+                      'bounds': np.array([geometry.bounds for geometry in geometries], dtype=float),
+                      'areas': geometry_areas(geometries)}
+    with open(cache_path, 'wb') as cache_file:
+        pickle.dump(geometry_cache, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_geometry_cache(cache_path):
+    '''
+    Function to load the binary cache of admin boundaries.
+    Returns a dictionary of the geometries (shapely, in the order of the GeoJSON), their properties,
+    bounding boxes, total bounds, areas and a spatial index (STRtree) of the geometries.
+    '''
+    from shapely import wkb
+    from shapely.strtree import STRtree
+
+    with open(cache_path, 'rb') as cache_file:
+        geometry_cache = pickle.load(cache_file)
+    geometries = [wkb.loads(geometry) for geometry in geometry_cache['wkb']]
+    bounds = geometry_cache['bounds']
+    # caches compiled before the areas were added
+    areas = geometry_cache['areas'] if 'areas' in geometry_cache else geometry_areas(geometries)
+
+    return {'geometries': geometries,
+            'properties': geometry_cache['properties'],
+            'bounds': bounds,
+            'total_bounds': (float(bounds[:, 0].min()), float(bounds[:, 1].min()),
+                             float(bounds[:, 2].max()), float(bounds[:, 3].max())),
+            'areas': areas,
+            'tree': STRtree(geometries)}
+
+
+def geometry_areas(geometries):
+    '''
+    Function to approximate the areas of geometries in degrees (WGS84), in square degrees at the equator:
+    the area in degrees scaled by the cosine of the latitude of the centroid.
+    Used as weights of area-weighted means (see rollup.py), only the ratios of the areas matter.
+    '''
+    return np.array([geometry.area * np.cos(np.radians(geometry.centroid.y)) for geometry in geometries], dtype=float)
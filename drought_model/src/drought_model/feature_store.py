@@ -0,0 +1,86 @@
+
+# columns of the long-format feature store
+store_columns = ['ADM2_PCODE', 'date', 'variable', 'value']
+
+# start month of the rainy season in which the predictors are collected
+season_start_month = 9
+
+
+def features_to_long(df_wide, admin_column, year_data, month_data):
+    '''
+    Function to convert a processed monthly dataframe (one row per district,
+    columns such as '10_p_cumul', '10_dryspell' or '10_vci') into rows of the feature store.
+    The month prefix of the column is dropped, the month is kept in the column 'date'.
+    '''
+    prefix = f'{month_data:02}_'
+    value_columns = [col for col in df_wide.columns if col.startswith(prefix)]
+    df_long = df_wide.melt(id_vars=admin_column, value_vars=value_columns,
+                           var_name='variable', value_name='value')
+    df_long['variable'] = df_long['variable'].str[len(prefix):]
+    df_long['date'] = f'{year_data}-{month_data:02}'
+    df_long = df_long.rename(columns={admin_column: 'ADM2_PCODE'})
+
+    return df_long[store_columns]
+
+
+def season_window(year, month):
+    '''
+    Function to get the first and last data month (as 'YYYY-MM') of the season
+    which is observed at the month of execution.
+    Data of a month are available from the following month onwards.
+    '''
+    if month >= season_start_month:
+        season_year = year
+    else:
+        season_year = year - 1
+    if month == 1:
+        year_last, month_last = year - 1, 12
+    else:
+        year_last, month_last = year, month - 1
+
+    return f'{season_year}-{season_start_month:02}', f'{year_last}-{month_last:02}'
+
+
+def season_data_months(month):
+    '''
+    Function to list the data months of the season observed at the month of execution, e.g. [9, 10] in November.
+    '''
+    n_months = (month - season_start_month) % 12
+    return [(season_start_month + i - 1) % 12 + 1 for i in range(n_months)]
+
+
+def season_dates(year, month):
+    '''
+    Function to list the data months (as 'YYYY-MM') of the season observed at the month of execution,
+    i.e. the partitions of the feature store which are read for it, e.g. ['2023-09', '2023-10'] in November 2023.
+    '''
+    year_start = int(season_window(year, month)[0][:4])
+    return [f'{year_start + (month_data < season_start_month)}-{month_data:02}'
+            for month_data in season_data_months(month)]
+
+
+def missing_features(df_store, year, month, variables):
+    '''
+    Function to list the data months and variables of the season observed at the month of execution
+    which have no row in the feature store, as 'YYYY-MM/variable'.
+    '''
+    present = set(df_store['date'] + '/' + df_store['variable'])
+    return [f'{date}/{variable}' for date in season_dates(year, month) for variable in variables
+            if f'{date}/{variable}' not in present]
+
+
+def slice_features(df_store, year, month, variables):
+    '''
+    Function to build the per-district feature matrix of the season observed at the month of execution.
+    The store is indexed by date, sliced once to the season window and pivoted
+    to one column per data month and variable, e.g. '10_p_cumul'.
+    '''
+    start, end = season_window(year, month)
+    df_season = df_store.set_index('date').sort_index().loc[start:end]
+    df_season = df_season[df_season['variable'].isin(variables)].reset_index()
+
+    df_features = df_season.pivot_table(index='ADM2_PCODE', columns=['date', 'variable'],
+                                        values='value', aggfunc='first')
+    df_features.columns = [f'{date[-2:]}_{variable}' for date, variable in df_features.columns]
+
+    return df_features.reset_index()
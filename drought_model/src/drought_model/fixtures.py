@@ -0,0 +1,386 @@
+'''
+Synthetic fixtures of the pipeline, to run and benchmark it offline:
+- daily CHIRPS-like rasters, weekly VCI rasters and an ONI text file, served by a local HTTP server
+  which also stands in for the IBF API
+- admin boundaries (GeoJSON, csv) of a configurable number of districts, exposure tables,
+  feature store of the past months of the season and dummy XGBoost models, in a local store (see storage.py)
+
+Usage:
+    paths = make_fixtures(root, today, n_adm2=1000)
+    server, base_url = serve_fixtures(paths['http_root'])
+    ctx = fixture_context(root, base_url, today)
+    pipeline.run(ctx)
+'''
+import io
+import os
+import re
+import json
+import time
+import gzip
+import datetime
+import threading
+import functools
+import numpy as np
+import pandas as pd
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from drought_model.settings import countries, impact_indicators, leadtimes, months_for_model1, \
+    months_for_model2, months_for_model3, months_inactive, enso_seasons, build_run_context
+from drought_model.feature_store import features_to_long, season_data_months
+from drought_model.vci_weeks import list_iso_weeks, vci_filename
+
+
+# extent of the synthetic country (minx, miny, maxx, maxy), margin of the rasters around it in degrees
+fixture_bounds = (25.2, -22.4, 33.1, -15.6)
+raster_margin = 0.5
+chirps_resolution = 0.05
+vci_resolution = 0.036
+
+# ENSO columns of get_new_enso()
+enso_columns_all = ['FMA', 'MAM', 'AMJ', 'MJJ', 'JJA', 'JAS', 'ASO', 'SON', 'OND', 'NDJ', 'DJF', 'JFM']
+
+
+def admin_grid(n_adm2, n_adm1=10, bounds=fixture_bounds, country='zwe'):
+    '''
+    Function to create synthetic admin boundaries: n_adm1 provinces as vertical stripes of the extent,
+    each divided into a grid of districts, about n_adm2 districts in total.
+    Returns the GeoJSON features and csv tables of adm1 and adm2.
+    '''
+    prefix = country[:2].upper()
+    n_adm1 = max(1, min(n_adm1, n_adm2))
+    n_per_adm1 = int(np.ceil(n_adm2 / n_adm1))
+    minx, miny, maxx, maxy = bounds
+    stripe_width = (maxx - minx) / n_adm1
+    n_cols = int(np.ceil(np.sqrt(n_per_adm1 * stripe_width / (maxy - miny))))
+    n_rows = int(np.ceil(n_per_adm1 / n_cols))
+
+    features_adm1, features_adm2, rows_adm1, rows_adm2 = [], [], [], []
+    for i in range(n_adm1):
+        adm1_pcode = f'{prefix}{i + 10:02d}'
+        x0 = minx + i * stripe_width
+        features_adm1.append(polygon_feature((x0, miny, x0 + stripe_width, maxy), {'ADM1_PCODE': adm1_pcode}))
+        rows_adm1.append({'ADM1_PCODE': adm1_pcode, 'ADM1_EN': f'Province {i + 1}'})
+        for j in range(n_per_adm1):
+            adm2_pcode = f'{adm1_pcode}{j + 1:04d}'
+            col, row = j % n_cols, j // n_cols
+            cell_width, cell_height = stripe_width / n_cols, (maxy - miny) / n_rows
+            cell = (x0 + col * cell_width, miny + row * cell_height,
+                    x0 + (col + 1) * cell_width, miny + (row + 1) * cell_height)
+            features_adm2.append(polygon_feature(cell, {'ADM1_PCODE': adm1_pcode, 'ADM2_PCODE': adm2_pcode}))
+            rows_adm2.append({'ADM1_PCODE': adm1_pcode, 'ADM2_PCODE': adm2_pcode})
+
+    return features_adm1, features_adm2, pd.DataFrame(rows_adm1), pd.DataFrame(rows_adm2)
+
+
+def polygon_feature(bounds, properties):
+    minx, miny, maxx, maxy = bounds
+    ring = [[minx, miny], [maxx, miny], [maxx, maxy], [minx, maxy], [minx, miny]]
+    return {'type': 'Feature', 'properties': properties, 'geometry': {'type': 'Polygon', 'coordinates': [ring]}}
+
+
+def raster_grid(resolution, bounds=fixture_bounds):
+    '''
+    Function to get the shape and transform of a raster covering the extent with a margin.
+    '''
+    from rasterio.transform import from_origin
+
+    minx, miny, maxx, maxy = bounds
+    minx, maxy = np.floor((minx - raster_margin) / resolution) * resolution, \
+        np.ceil((maxy + raster_margin) / resolution) * resolution
+    width = int(np.ceil((maxx + raster_margin - minx) / resolution))
+    height = int(np.ceil((maxy - miny + raster_margin) / resolution))
+
+    return (height, width), from_origin(minx, maxy, resolution, resolution)
+
+
+def raster_bytes(array, transform, nodata=-9999, **creation_options):
+    '''
+    Function to encode an array as GeoTIFF (EPSG:4326) in memory.
+    Creation options (e.g. tiled=True, compress='deflate') are added to the profile.
+    '''
+    from rasterio.io import MemoryFile
+
+    profile = {'driver': 'GTiff', 'height': array.shape[0], 'width': array.shape[1], 'count': 1,
+               'dtype': 'float32', 'crs': 'EPSG:4326', 'transform': transform, 'nodata': nodata}
+    profile.update(creation_options)
+    with MemoryFile() as memfile:
+        with memfile.open(**profile) as dst:
+            dst.write(array.astype('float32'), 1)
+        return memfile.read()
+
+
+def write_chirps(http_root, year, month, rng, resolution=chirps_resolution):
+    '''
+    Function to write the daily CHIRPS-like rasters (gzipped GeoTIFF) of a month:
+    rainfall in mm on wet days, about half of the days are wet.
+    '''
+    shape, transform = raster_grid(resolution)
+    chirps_dir = os.path.join(http_root, 'chirps', str(year))
+    os.makedirs(chirps_dir, exist_ok=True)
+    for day in range(1, pd.Period(f'{year}-{month:02}').days_in_month + 1):
+        rain = rng.gamma(0.8, 6.0, shape) * (rng.random(shape) < 0.5)
+        filename = f'chirps-v2.0.{year}.{month:02}.{day:02}.tif.gz'
+        with open(os.path.join(chirps_dir, filename), 'wb') as raster_file:
+            raster_file.write(gzip.compress(raster_bytes(rain, transform)))
+
+
+def write_vci(http_root, year, month, rng, resolution=vci_resolution):
+    '''
+    Function to write the weekly VCI rasters (GeoTIFF, 0-100) of the ISO weeks of a month.
+    '''
+    shape, transform = raster_grid(resolution)
+    vci_dir = os.path.join(http_root, 'vci')
+    os.makedirs(vci_dir, exist_ok=True)
+    for iso_year, week in list_iso_weeks(year, month):
+        vci = rng.uniform(0, 100, shape)
+        with open(os.path.join(vci_dir, vci_filename(iso_year, week)), 'wb') as raster_file:
+            raster_file.write(raster_bytes(vci, transform))
+
+
+def write_oni(http_root, year, month, rng):
+    '''
+    Function to write an ONI text file (as oni.ascii.txt of NOAA CPC) from 1950
+    up to the last season available at the month of execution.
+    '''
+    last = datetime.date(year, month, 1) - pd.DateOffset(months=2)
+    lines = ['SEAS  YR   TOTAL   ANOM']
+    for middle in pd.period_range('1950-01', f'{last.year}-{last.month:02}', freq='M'):
+        anomaly = rng.normal(0, 0.9)
+        lines.append(f'{enso_seasons[middle.month]:>5}{middle.year:>5}{26.5 + anomaly:7.2f}{anomaly:7.2f}')
+    enso_dir = os.path.join(http_root, 'enso')
+    os.makedirs(enso_dir, exist_ok=True)
+    with open(os.path.join(enso_dir, 'oni.ascii.txt'), 'w') as oni_file:
+        oni_file.write('\n'.join(lines) + '\n')
+
+
+def enso_columns(month):
+    '''
+    Function to get the ENSO columns of get_new_enso() at the month of execution.
+    '''
+    if month in months_inactive:
+        return enso_columns_all
+    last = enso_seasons[(month - 3) % 12 + 1]
+    return enso_columns_all[:enso_columns_all.index(last) + 1]
+
+
+def model_features(month):
+    '''
+    Function to get the input columns of the models used at the month of execution,
+    as built by get_new_enso() and arrange_data().
+    '''
+    from drought_model.utils import input_columns_order
+
+    if month in months_for_model1:
+        return enso_columns(month)
+    variables = ['p_cumul', 'dryspell'] + (['vci'] if month in months_for_model3 else [])
+    columns = enso_columns(month) + [f'{month_data:02}_{variable}' for month_data in season_data_months(month)
+                                     for variable in variables]
+    columns += ['p_cumul'] + (['vci_avg'] if month in months_for_model3 else [])
+    return [column for column in input_columns_order if column in columns and not column.endswith('_PCODE')]
+
+
+def dummy_model(features, rng):
+    '''
+    Function to train a small XGBoost classifier on random data with the given input columns.
+    '''
+    from xgboost import XGBClassifier
+
+    x = pd.DataFrame(rng.random((200, len(features))), columns=features)
+    y = (x.mean(axis=1) > 0.5).astype(int)
+    model = XGBClassifier(n_estimators=10, max_depth=3)
+    model.fit(x, y)
+    return model
+
+
+def blob_file_path(store, container, blob_path):
+    file_path = os.path.join(store, container, *blob_path.split('/'))
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    return file_path
+
+
+def write_models(store, country, regions, rng):
+    '''
+    Function to write dummy models of all months of the season in the datalake layout of the local store.
+    '''
+    for month, (leadtime, _) in leadtimes.items():
+        if month in months_for_model1:
+            for region in regions:
+                blob_path = f'drought/Gold/{country}/model1/{country}_m1_crop_{region}_{leadtime}_model.json'
+                dummy_model(model_features(month), rng).save_model(blob_file_path(store, 'ibf', blob_path))
+        elif month in months_for_model2 + months_for_model3:
+            model = 'model2' if month in months_for_model2 else 'model3'
+            blob_path = f'drought/Gold/{country}/{model}/{country}_m{model[-1]}_crop_{leadtime}_model.json'
+            dummy_model(model_features(month), rng).save_model(blob_file_path(store, 'ibf', blob_path))
+
+
+def write_feature_history(store, country, pcodes, year, month, rng):
+    '''
+    Function to write the feature store of the data months of the season before the month to process.
+    '''
+    data_months = season_data_months(month)[:-1]
+    for month_data in data_months:
+        year_data = year if month_data < month else year - 1
+        df_month = pd.DataFrame({'ADM2_PCODE': pcodes,
+                                 f'{month_data:02}_p_cumul': rng.gamma(2.0, 40.0, len(pcodes)),
+                                 f'{month_data:02}_dryspell': rng.integers(0, 10, len(pcodes)),
+                                 f'{month_data:02}_vci': rng.uniform(0, 100, len(pcodes))})
+        for source, df_source in (('chirps', df_month.drop(columns=f'{month_data:02}_vci')),
+                                  ('vci', df_month[['ADM2_PCODE', f'{month_data:02}_vci']])):
+            blob_path = f'drought/Silver/{country}/features/{source}/{year_data}-{month_data:02}.csv'
+            df_store = features_to_long(df_source, 'ADM2_PCODE', year_data, month_data)
+            df_store.to_csv(blob_file_path(store, 'ibf', blob_path), index=False)
+
+
+def write_model_inputs(ctx, rng):
+    '''
+    Function to write synthetic inputs of the forecast at the month of execution of ctx into its work directory:
+    the ENSO csv of get_new_enso() and, for model 2 and 3, the input csv of arrange_data().
+    '''
+    os.makedirs(ctx.data_in_path, exist_ok=True)
+    enso = enso_columns(ctx.month)
+    pd.DataFrame(rng.normal(0, 0.9, (1, len(enso))), columns=enso).\
+        to_csv(os.path.join(ctx.data_in_path, 'enso_' + ctx.today.strftime("%Y-%m") + '.csv'), index=False)
+    if ctx.month in months_for_model1:
+        return
+
+    df_adm2 = pd.read_csv(os.path.join(ctx.adm_path, ctx.adm_name(2) + '.csv'))[['ADM1_PCODE', 'ADM2_PCODE']]
+    features = model_features(ctx.month)
+    df_data = pd.concat([df_adm2, pd.DataFrame(rng.random((len(df_adm2), len(features))), columns=features)], axis=1)
+    df_data.to_csv(os.path.join(ctx.data_in_path, 'data_' + ctx.today.strftime("%Y-%m") + '.csv'), index=False)
+
+
+def write_tables(store, country, regions, rng):
+    '''
+    Function to write the exposure tables, non-trigger and dummy forecast of the provinces.
+    '''
+    for filename, pcode_column, exposure_column in impact_indicators.values():
+        pd.DataFrame({pcode_column: regions, exposure_column: rng.integers(1000, 100000, len(regions))}).\
+            to_csv(blob_file_path(store, 'ibf', f'drought/Gold/{country}/{filename}'), index=False)
+    pd.DataFrame({'region': regions, 'forecast_severity': 0}).\
+        to_csv(blob_file_path(store, 'ibf', f'drought/Gold/{country}/{country}_nontrigger.csv'), index=False)
+    pd.DataFrame({'region': regions, 'drought': rng.integers(0, 2, len(regions)), 'leadtime': 0}).\
+        to_csv(blob_file_path(store, 'ibf', f'drought/Gold/{country}/{country}_m1_crop_predict_dummy.csv'),
+               index=False)
+
+
+def make_fixtures(root, today, n_adm2=100, n_adm1=10, country='zwe', seed=0):
+    '''
+    Function to create the fixtures of a run at the date of execution today, for about n_adm2 districts.
+    Returns the paths of the local store and of the files served over HTTP.
+    '''
+    if isinstance(today, str):
+        today = datetime.date.fromisoformat(today)
+    rng = np.random.default_rng(seed)
+    store = os.path.join(root, 'store')
+    http_root = os.path.join(root, 'http')
+    os.makedirs(http_root, exist_ok=True)
+    adm_name = countries[country]['adm_name']
+
+    # admin boundaries
+    features_adm1, features_adm2, df_adm1, df_adm2 = admin_grid(n_adm2, n_adm1, country=country)
+    for level, features, df_adm in ((1, features_adm1, df_adm1), (2, features_adm2, df_adm2)):
+        name = adm_name.format(level=level)
+        with open(blob_file_path(store, 'admin-boundaries', f'Bronze/{country}/{name}/{name}.geojson'), 'w') as f:
+            json.dump({'type': 'FeatureCollection', 'features': features}, f)
+        df_adm.to_csv(blob_file_path(store, 'admin-boundaries', f'Silver/{country}/{name}.csv'), index=False)
+    regions = list(df_adm1['ADM1_PCODE'])
+
+    # data sources of the month to process
+    ctx = build_run_context(today, country)
+    write_oni(http_root, ctx.year, ctx.month, rng)
+    write_chirps(http_root, ctx.year_data, ctx.month_data, rng)
+    write_vci(http_root, ctx.year_data, ctx.month_data, rng)
+
+    # datalake
+    write_feature_history(store, country, list(df_adm2['ADM2_PCODE']), ctx.year, ctx.month, rng)
+    write_tables(store, country, regions, rng)
+    write_models(store, country, regions, rng)
+
+    return {'store': store, 'http_root': http_root}
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    '''
+    GET: files of the data sources (directory listings as the CHIRPS server), also byte ranges of a file
+    (header Range: bytes=start-end or bytes=-length) as GDAL /vsicurl/ and preflight.py request
+    POST /ibf/api/...: stand-in of the IBF API, the posted payloads are kept in server.posted
+    Every request waits server.latency seconds before the response, as over a real network.
+    '''
+
+    def send_head(self):
+        time.sleep(self.server.latency)
+        file_path = self.translate_path(self.path)
+        match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if not match or not os.path.isfile(file_path) or match.groups() == ('', ''):
+            return super().send_head()
+
+        size = os.path.getsize(file_path)
+        start, end = match.groups()
+        if start:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+        else:
+            start, end = max(size - int(end), 0), size - 1
+        if start >= size or start > end:
+            self.send_error(416)
+            return None
+        with open(file_path, 'rb') as served_file:
+            served_file.seek(start)
+            content = served_file.read(end - start + 1)
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(file_path))
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        return io.BytesIO(content)
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if self.path.endswith('/api/user/login'):
+            content, status = {'user': {'token': 'fixture-token'}}, 201
+        else:
+            payload = json.loads(body) if self.headers.get('Content-Type') == 'application/json' else None
+            self.server.posted.append({'path': self.path, 'json': payload})
+            content, status = {}, 201
+        response = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures(http_root, port=0, latency=0):
+    '''
+    Function to serve the fixtures over HTTP in a background thread, with a latency in seconds per request.
+    Returns the server (stop with server.shutdown()) and its base url.
+    '''
+    server = ThreadingHTTPServer(('127.0.0.1', port), functools.partial(FixtureHandler, directory=http_root))
+    server.posted = []
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+
+def fixture_context(root, base_url, today, country='zwe', **kwargs):
+    '''
+    Function to build the settings of a run on the fixtures: data sources and IBF API on the fixture server,
+    secrets and datalake in the local store, work directory in root/work.
+    '''
+    store = os.path.join(root, 'store')
+    api_credentials = json.dumps({'IBF_API_URL': base_url + 'ibf', 'ADMIN_LOGIN': 'fixture', 'ADMIN_PASSWORD': 'fixture'})
+    secrets = {'ibf-blobstorage-secrets': json.dumps({'connection_string': 'local'})}
+    secrets.update({name: api_credentials for name in countries[country]['api_info']})
+    with open(os.path.join(store, 'secrets.json'), 'w') as secrets_file:
+        json.dump(secrets, secrets_file, indent=2)
+
+    work_dir = os.path.join(root, 'work')
+    os.makedirs(work_dir, exist_ok=True)
+    return build_run_context(today, country, work_dir=work_dir, local_store=store,
+                             enso_url=base_url + 'enso/oni.ascii.txt', chirps_url=base_url + 'chirps/',
+                             vci_url=base_url + 'vci/', **kwargs)
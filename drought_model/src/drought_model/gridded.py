@@ -0,0 +1,178 @@
+import logging
+import numpy as np
+from drought_model.settings import gdal_cache_mb, gdal_num_threads, gdal_vsi_cache_mb, raster_gzip
+
+
+# GDAL configuration of the raster readers of this process (see configure_rasters())
+raster_config = {'cache_mb': gdal_cache_mb, 'num_threads': gdal_num_threads,
+                 'vsi_cache_mb': gdal_vsi_cache_mb, 'gzip': raster_gzip}
+
+
+def configure_rasters(**options):
+    '''
+    Function to set the GDAL configuration of the raster readers of this process: cache_mb, num_threads,
+    vsi_cache_mb (None: GDAL default) and gzip ('memory' or 'vsigzip').
+    GDAL sizes its block cache at the first read, so the configuration is set before reading.
+    '''
+    unknown = set(options) - set(raster_config)
+    if unknown:
+        logging.error(f'configure_rasters: unknown options {sorted(unknown)}')
+        raise ValueError()
+    raster_config.update(options)
+
+
+def gdal_options(config=None):
+    '''
+    Function to get the GDAL configuration options of a raster configuration (default: of this process).
+    '''
+    config = raster_config if config is None else config
+    options = {'GDAL_CACHEMAX': config['cache_mb'],
+               'GDAL_NUM_THREADS': config['num_threads'],
+               # reads over HTTP: cache of the blocks read, no listing of the directory of the file
+               'VSI_CACHE': None if config['vsi_cache_mb'] is None else config['vsi_cache_mb'] > 0,
+               'VSI_CACHE_SIZE': None if config['vsi_cache_mb'] is None else config['vsi_cache_mb'] * 1024**2,
+               'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR'}
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def raster_env():
+    '''
+    Function to get the GDAL environment of the raster readers (rasterio.Env of gdal_options()).
+    '''
+    import rasterio
+
+    return rasterio.Env(**gdal_options())
+
+
+def is_url(location):
+    return location.startswith(('http://', 'https://'))
+
+
+def gdal_path(location):
+    '''
+    Function to get the path of a raster for GDAL: a local file as is, a URL read with HTTP range requests
+    (/vsicurl/, e.g. the source URL or a blob with SAS token) and gzipped rasters decompressed by GDAL
+    (/vsigzip/), e.g. /vsigzip//vsicurl/https://data.chc.ucsb.edu/.../chirps-v2.0.2024.01.01.tif.gz
+    '''
+    if location.startswith('/vsi'):
+        return location
+    path = '/vsicurl/' + location if is_url(location) else location
+    if location.split('?')[0].endswith('.gz'):
+        path = '/vsigzip/' + path
+    return path
+
+
+def read_window(src, bounds, nodata=-9999):
+    '''
+    Function to read the first band of an open raster clipped to bounds (minx, miny, maxx, maxy).
+    The window is padded by one pixel, so that no pixel touching the bounds is lost.
+    Returns the array (nodata as NaN) and its transform.
+    '''
+    from rasterio.windows import Window, from_bounds
+
+    window = from_bounds(*bounds, transform=src.transform)
+    window = Window(int(np.floor(window.col_off)) - 1, int(np.floor(window.row_off)) - 1,
+                    int(np.ceil(window.width)) + 2, int(np.ceil(window.height)) + 2)
+    array = src.read(1, window=window, boundless=True, fill_value=nodata).astype('float32')
+    array[array == nodata] = np.nan
+
+    return array, src.window_transform(window)
+
+
+def read_clipped(raster_path, bounds, nodata=-9999):
+    '''
+    Function to read a raster file or URL clipped to bounds (see gdal_path()).
+    Returns the array (nodata as NaN), its transform and crs.
+    '''
+    import rasterio
+
+    with raster_env(), rasterio.open(gdal_path(raster_path)) as src:
+        array, transform = read_window(src, bounds, nodata)
+        crs = src.crs
+
+    return array, transform, crs
+
+
+def read_clipped_gzip(data_gz, bounds, nodata=-9999):
+    '''
+    Function to read a gzipped GeoTIFF from memory clipped to bounds, without intermediate files.
+    Returns the array (nodata as NaN), its transform and crs.
+    '''
+    import gzip
+    from rasterio.io import MemoryFile
+
+    with raster_env(), MemoryFile(gzip.decompress(data_gz)) as memfile:
+        with memfile.open() as src:
+            array, transform = read_window(src, bounds, nodata)
+            crs = src.crs
+
+    return array, transform, crs
+
+
+def read_raster(location, bounds, nodata=-9999):
+    '''
+    Function to read a raster clipped to bounds from a local file or URL, gzipped or not.
+    Local gzipped rasters are decompressed in memory or by GDAL, see raster_config['gzip'].
+    Returns the array (nodata as NaN), its transform and crs.
+    '''
+    if location.endswith('.gz') and raster_config['gzip'] == 'memory' and not is_url(location):
+        with open(location, 'rb') as raster_file:
+            return read_clipped_gzip(raster_file.read(), bounds, nodata)
+    return read_clipped(location, bounds, nodata)
+
+
+def cumulative_and_dryspell_grid(stack, window=14, threshold=2):
+    '''
+    Function to calculate per pixel, from a stack of daily rainfall (day, row, column):
+    - monthly cumulative rainfall
+    - number of dryspell days, i.e. days on which the 14-day rolling cumulative rainfall is below 2mm,
+    as cumulative_and_dryspell() does per district.
+    '''
+    valid = ~np.isnan(stack)
+    rain = np.where(valid, stack, 0)
+
+    p_cumul = rain.sum(axis=0)
+    p_cumul[~valid.any(axis=0)] = np.nan
+
+    # rolling sums over the day axis from the difference of cumulative sums
+    zeros = np.zeros((1,) + stack.shape[1:], dtype=rain.dtype)
+    rain_cumsum = np.concatenate([zeros, rain.cumsum(axis=0)])
+    valid_cumsum = np.concatenate([zeros, valid.cumsum(axis=0)])
+    rolling_cumul = rain_cumsum[window:] - rain_cumsum[:-window]
+    rolling_complete = (valid_cumsum[window:] - valid_cumsum[:-window]) == window
+    dryspell = ((rolling_cumul <= threshold) & rolling_complete).sum(axis=0).astype('float32')
+    dryspell[~valid.any(axis=0)] = np.nan
+
+    return p_cumul, dryspell
+
+
+def mean_grid(stack):
+    '''
+    Function to average a stack (time, row, column) per pixel, ignoring missing values.
+    '''
+    valid = ~np.isnan(stack)
+    total = np.where(valid, stack, 0).sum(axis=0)
+    count = valid.sum(axis=0)
+
+    return np.where(count > 0, total / np.maximum(count, 1), np.nan).astype('float32')
+
+
+def write_grid(file_path, bands, transform, crs, nodata=-9999):
+    '''
+    Function to write gridded layers as a tiled, compressed GeoTIFF with overviews.
+    bands is a dictionary of band name and 2D array; the names are stored as band descriptions.
+    '''
+    import rasterio
+    from rasterio.enums import Resampling
+
+    names = list(bands)
+    height, width = bands[names[0]].shape
+    profile = {'driver': 'GTiff', 'height': height, 'width': width, 'count': len(names),
+               'dtype': 'float32', 'crs': crs, 'transform': transform, 'nodata': nodata,
+               'tiled': True, 'blockxsize': 256, 'blockysize': 256,
+               'compress': 'deflate', 'predictor': 3}
+    with rasterio.open(file_path, 'w', **profile) as dst:
+        for i, name in enumerate(names, start=1):
+            dst.write(np.nan_to_num(bands[name], nan=nodata).astype('float32'), i)
+            dst.set_band_description(i, name)
+        dst.build_overviews([2, 4, 8], Resampling.average)
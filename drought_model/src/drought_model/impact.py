@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+
+def build_exposure_matrix(exposure_tables, indicators):
+    '''
+    Function to combine the exposure tables into one matrix of province (row) x indicator (column).
+    exposure_tables is a dictionary of layer name and its dataframe,
+    indicators the configuration of the layers (see impact_indicators in settings.py).
+    '''
+    columns = []
+    for layer, (_, pcode_column, exposure_column) in indicators.items():
+        exposure = exposure_tables[layer].set_index(pcode_column)[exposure_column]
+        columns.append(exposure.rename(layer).astype(float))
+    df_exposure = pd.concat(columns, axis=1)
+    df_exposure.index.name = 'region'
+
+    return df_exposure
+
+
+def compute_impact(df_pred_provinces, df_exposure):
+    '''
+    Function to calculate all impact layers at once.
+    Forecast severity per province is multiplied with every exposure of the province.
+    Returns one row per province with the forecast and impact layers as columns.
+    '''
+    df_impact = df_pred_provinces.reset_index(drop=True)
+    severity = df_impact['forecast_severity'].to_numpy(dtype=float)
+    exposure = df_exposure.reindex(df_impact['region']).to_numpy()
+    impact = severity[:, np.newaxis] * exposure
+
+    df_layers = pd.DataFrame(impact, columns=df_exposure.columns, index=df_impact.index)
+    df_impact = pd.concat([df_impact, df_layers], axis=1)
+    df_impact = df_impact[df_impact['region'].isin(df_exposure.index)].reset_index(drop=True)
+
+    return df_impact
@@ -0,0 +1,144 @@
+import json
+import logging
+import numpy as np
+
+
+def compile_model(model_json):
+    '''
+    Function to compile a trained XGBoost tree model (JSON of save_model()) into flat arrays of all its trees,
+    so that predictions are made with NumPy only, without DMatrix and pandas validation.
+    Supported objectives are binary:logistic, multi:softprob and multi:softmax.
+    '''
+    if isinstance(model_json, (str, bytes, bytearray)):
+        model_json = json.loads(model_json)
+    learner = model_json['learner']
+    booster = learner['gradient_booster']
+    objective = learner['objective']['name']
+    if booster['name'] != 'gbtree' or objective not in ('binary:logistic', 'multi:softprob', 'multi:softmax'):
+        logging.error(f'compile_model: {booster["name"]} model with objective {objective} not supported')
+        raise ValueError()
+
+    trees = booster['model']['trees']
+    tree_class = np.array(booster['model']['tree_info'], dtype=int)
+    num_class = max(int(learner['learner_model_param']['num_class']), 1)
+    # trees of the best iteration only, as XGBClassifier.predict()
+    best_iteration = learner.get('attributes', {}).get('best_iteration')
+    if best_iteration is not None:
+        n_trees = (int(best_iteration) + 1) * num_class * \
+            int(booster['model']['gbtree_model_param'].get('num_parallel_tree', 1))
+        trees, tree_class = trees[:n_trees], tree_class[:n_trees]
+
+    roots = np.cumsum([0] + [len(tree['left_children']) for tree in trees[:-1]])
+    left = np.concatenate([np.where(np.array(tree['left_children']) < 0, -1, np.array(tree['left_children']) + root)
+                           for tree, root in zip(trees, roots)])
+    right = np.concatenate([np.where(np.array(tree['right_children']) < 0, -1, np.array(tree['right_children']) + root)
+                            for tree, root in zip(trees, roots)])
+
+    # base score is a probability for binary:logistic, a margin (per class in recent versions) otherwise
+    base_score = np.array(str(learner['learner_model_param']['base_score']).strip('[]').split(','), dtype=float)
+    if objective == 'binary:logistic':
+        base_margin = np.float32(np.log(base_score[0] / (1 - base_score[0])))
+    else:
+        base_margin = base_score.astype('float32')
+
+    return {'feature_names': learner.get('feature_names', []),
+            'num_feature': int(learner['learner_model_param']['num_feature']),
+            'objective': objective,
+            'num_class': num_class,
+            'base_margin': base_margin,
+            'roots': roots,
+            'tree_class': tree_class,
+            'left': left,
+            'right': right,
+            'feature': np.concatenate([tree['split_indices'] for tree in trees]).astype(int),
+            # split threshold of internal nodes, leaf value of leaves
+            'condition': np.concatenate([tree['split_conditions'] for tree in trees]).astype('float32'),
+            'default_left': np.concatenate([tree['default_left'] for tree in trees]).astype(bool)}
+
+
+def predict_margin(model, x):
+    '''
+    Function to calculate the raw margin per row (and class) of a compiled model.
+    x is a 2D float32 array with the features in the order of the model; missing values are NaN.
+    All trees are traversed at once, one level per iteration.
+    '''
+    rows = np.arange(x.shape[0])[:, np.newaxis]
+    node = np.broadcast_to(model['roots'], (x.shape[0], len(model['roots']))).copy()
+    internal = model['left'][node] >= 0
+    while internal.any():
+        value = x[rows, model['feature'][node]]
+        go_left = np.where(np.isnan(value), model['default_left'][node], value < model['condition'][node])
+        child = np.where(go_left, model['left'][node], model['right'][node])
+        node = np.where(internal, child, node)
+        internal = model['left'][node] >= 0
+    leaf = model['condition'][node]
+
+    if model['num_class'] == 1:
+        return leaf.sum(axis=1, dtype='float32') + model['base_margin']
+    margin = np.zeros((x.shape[0], model['num_class']), dtype='float32')
+    for class_index in range(model['num_class']):
+        margin[:, class_index] = leaf[:, model['tree_class'] == class_index].sum(axis=1, dtype='float32')
+    return margin + model['base_margin']
+
+
+def predict_classes(model, x):
+    '''
+    Function to predict the class of every row with a compiled model, as XGBClassifier.predict().
+    '''
+    margin = predict_margin(model, x)
+    if model['num_class'] == 1:
+        probability = 1 / (1 + np.exp(-margin))
+        return (probability > 0.5).astype(int)
+    return margin.argmax(axis=1)
+
+
+def model_schema(model, default_columns=None):
+    '''
+    Function to get the input features of a model of get_model() in order: the feature names saved with the model,
+    compiled (see compile_model()) or XGBClassifier.
+    A model saved without feature names gets default_columns, which have to be as many as the model features.
+    '''
+    if isinstance(model, dict):
+        feature_names, num_feature = model['feature_names'], model['num_feature']
+    else:
+        feature_names, num_feature = model.get_booster().feature_names, model.n_features_in_
+    if feature_names:
+        return list(feature_names)
+    if default_columns is None or len(default_columns) != num_feature:
+        logging.error(f'model_schema: model without feature names expects {num_feature} features, '
+                      f'got columns {default_columns}')
+        raise ValueError()
+    return list(default_columns)
+
+
+def feature_matrix(df_input, feature_names, index_column=None):
+    '''
+    Function to build the input of a model: a C-contiguous float32 array with the columns feature_names
+    of df_input in the order of the model, allocated once and filled column by column.
+    Features missing in df_input are logged and left NaN, i.e. missing values for the trees; a matrix
+    without any feature fails. Columns of df_input which are not features are ignored.
+    If index_column is given, the rows are sorted by it, e.g. by province.
+    Returns the matrix and the row index (values of index_column, or the index of df_input).
+    '''
+    missing = [feature for feature in feature_names if feature not in df_input.columns]
+    if len(missing) == len(feature_names):
+        logging.error(f'feature_matrix: none of the model features {list(feature_names)} in the input')
+        raise ValueError()
+    if missing:
+        logging.warning(f'feature_matrix: features {missing} missing in the input, set to NaN')
+
+    if index_column is not None:
+        order = np.argsort(df_input[index_column].to_numpy(), kind='stable')
+        row_index = df_input[index_column].to_numpy()[order]
+    else:
+        order = None
+        row_index = df_input.index.to_numpy()
+
+    x = np.full((len(df_input), len(feature_names)), np.nan, dtype='float32')
+    for position, feature in enumerate(feature_names):
+        if feature in missing:
+            continue
+        values = df_input[feature].to_numpy(dtype='float32', na_value=np.nan)
+        x[:, position] = values if order is None else values[order]
+
+    return x, row_index
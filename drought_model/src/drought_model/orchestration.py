@@ -0,0 +1,184 @@
+'''
+Asynchronous orchestration of a run (--orchestration async), in which network and CPU work overlap:
+- get_new_enso() and the ingest of CHIRPS and VCI run at the same time
+- the rasters of the month of data (daily CHIRPS, weekly VCI) are downloaded a few at a time
+  (async_downloads in settings.py); as soon as a raster is downloaded, it is archived in the datalake and
+  its zonal statistics are calculated in a pool of processes, while the next rasters are downloaded
+- get_new_chirps() and get_new_vci() then find the rasters downloaded and their averages in the zonal cache
+  of the run (ctx.zonal_cache), which is dropped with the run
+- the forecast and post stages run as in pipeline.run()
+The I/O helpers of utils.py (requests, wget, Azure SDK) are blocking, their async counterparts below
+run them in threads. The share of the run in which network and CPU were busy at the same time
+is reported as 'activity' (see activity.py).
+'''
+import os
+import time
+import asyncio
+import dataclasses
+import datetime
+import logging
+import multiprocessing
+from drought_model import utils
+from drought_model.settings import async_downloads
+from drought_model.activity import start_recording, activity_summary, add_activity
+from drought_model.vci_weeks import list_iso_weeks, stored_weeks
+from drought_model.zonal import zonal_executor, zonal_mean_task
+
+
+async def fetch_data_async(file_url):
+    return await asyncio.to_thread(utils.fetch_data, file_url)
+
+
+async def wget_download_async(file_url, local_path, filename):
+    await asyncio.to_thread(utils.wget_download, file_url, local_path, filename)
+
+
+async def save_bytes_to_remote_async(ctx, data, file_path_remote, container):
+    await asyncio.to_thread(utils.save_bytes_to_remote, ctx, data, file_path_remote, container)
+
+
+async def save_data_to_remote_async(ctx, file_path_local, file_path_remote, container):
+    await asyncio.to_thread(utils.save_data_to_remote, ctx, file_path_local, file_path_remote, container)
+
+
+async def get_secret_keyvault_async(ctx, secret_name):
+    return await asyncio.to_thread(utils.get_secret_keyvault, ctx, secret_name)
+
+
+def write_bytes(file_path, data):
+    with open(file_path, 'wb') as output_file:
+        output_file.write(data)
+
+
+def timed_zonal_mean(raster_path):
+    '''
+    Function to calculate the averages of a raster in a worker process, with the start and end of the calculation.
+    '''
+    start = time.monotonic()
+    result = zonal_mean_task(raster_path, False)
+    return result, start, time.monotonic()
+
+
+async def zonal_mean_async(ctx, executor, cache_path, raster_path):
+    '''
+    Function to calculate the averages of a raster per admin boundary in the pool of processes
+    and keep them in the zonal cache of the run for zonal_means().
+    '''
+    loop = asyncio.get_running_loop()
+    result, start, end = await loop.run_in_executor(executor, timed_zonal_mean, raster_path)
+    add_activity('cpu', start, end)
+    ctx.zonal_cache[(cache_path, raster_path)] = result
+
+
+async def prefetch_chirps_day(ctx, executor, cache_path, semaphore, file_url, file_path, compute):
+    async with semaphore:
+        data_gz = await fetch_data_async(file_url)
+    await asyncio.to_thread(write_bytes, file_path, data_gz)
+    blob_path = 'drought/Bronze/chirps/new_download/' + os.path.basename(file_path)
+    tasks = [save_bytes_to_remote_async(ctx, data_gz, blob_path, ctx.container)]
+    if compute:
+        tasks.append(zonal_mean_async(ctx, executor, cache_path, file_path))
+    await asyncio.gather(*tasks)
+
+
+async def prefetch_chirps(ctx, executor, cache_path, semaphore):
+    '''
+    Function to download and archive the daily CHIRPS of the month of data which are not downloaded yet,
+    and calculate the averages of all days of the month. In incremental mode and for gridded output,
+    get_new_chirps() calculates the averages itself: only the days after the accumulator, or with the arrays.
+    '''
+    compute = not ctx.chirps_incremental and not ctx.gridded_output
+    raster_index, downloads = await asyncio.to_thread(utils.chirps_downloads, ctx, ctx.year_data, ctx.month_data)
+    tasks = [zonal_mean_async(ctx, executor, cache_path, raster_path) for raster_path in raster_index.values()
+             if compute and (cache_path, raster_path) not in ctx.zonal_cache]
+    tasks += [prefetch_chirps_day(ctx, executor, cache_path, semaphore, file_url, file_path, compute)
+              for _, file_url, file_path in downloads]
+    await asyncio.gather(*tasks)
+
+
+async def prefetch_vci_week(ctx, executor, cache_path, semaphore, file_url, file_path, compute):
+    workdir, filename = os.path.split(file_path)
+    async with semaphore:
+        await wget_download_async(file_url, workdir, filename)
+    if not os.path.isfile(file_path):
+        return
+    tasks = [save_data_to_remote_async(ctx, file_path, 'drought/Bronze/vci/' + filename, ctx.container)]
+    if compute:
+        tasks.append(zonal_mean_async(ctx, executor, cache_path, file_path))
+    await asyncio.gather(*tasks)
+
+
+async def prefetch_vci(ctx, executor, cache_path, semaphore):
+    '''
+    Function to download and archive the weekly VCI of the month of data which get_new_vci() needs,
+    and calculate the averages of the weeks which are not in the weekly VCI store.
+    '''
+    weeks = list_iso_weeks(ctx.year_data, ctx.month_data)
+    weeks_stored = stored_weeks(await asyncio.to_thread(utils.get_vci_week_store, ctx))
+    raster_index, downloads = await asyncio.to_thread(utils.vci_downloads, ctx, weeks, weeks_stored)
+    tasks = [zonal_mean_async(ctx, executor, cache_path, raster_path) for week, raster_path in raster_index.items()
+             if week in weeks and week not in weeks_stored and (cache_path, raster_path) not in ctx.zonal_cache]
+    tasks += [prefetch_vci_week(ctx, executor, cache_path, semaphore, file_url, file_path, week not in weeks_stored)
+              for week, file_url, file_path in downloads]
+    await asyncio.gather(*tasks)
+
+
+async def ingest(timings, ctx, prefetch, stage, *args):
+    '''
+    Function to prefetch the rasters of a source, then run its stage. A failed prefetch is logged,
+    the stage then downloads and processes the rasters itself.
+    '''
+    from drought_model.pipeline import run_stage
+
+    start = time.perf_counter()
+    try:
+        await prefetch(ctx, *args)
+    except Exception as e:
+        logging.error(f'Error in {prefetch.__name__}(): {e}')
+    finally:
+        timings[prefetch.__name__] = round(time.perf_counter() - start, 3)
+    await asyncio.to_thread(run_stage, timings, stage, ctx)
+
+
+async def warm_credentials(ctx):
+    '''
+    Function to get the IBF API credentials from Key Vault during the ingest, so that post_output() finds them in memory.
+    '''
+    try:
+        await get_secret_keyvault_async(ctx, ctx.api_info)
+    except Exception as e:
+        logging.warning(f'warm_credentials: {e}')
+
+
+async def run_async(ctx):
+    '''
+    Run the pipeline for the month and country of ctx with overlapping network and CPU work.
+    Returns the duration of every stage (and prefetch) in seconds and the network and CPU activity of the run.
+    '''
+    from drought_model.pipeline import run_stage, forecast_and_post
+
+    start = start_recording()
+    utc_timestamp = datetime.datetime.utcnow().isoformat()
+    timings = {}
+    # the averages calculated ahead of the stages are passed to them with the settings of the run
+    ctx = dataclasses.replace(ctx, zonal_cache={})
+
+    await asyncio.to_thread(run_stage, timings, utils.basic_data, ctx)
+
+    # processes are spawned, not forked, as the run already has threads
+    cache_path = utils.geometry_cache_path(ctx, 2)
+    executor = zonal_executor(cache_path, ctx.workers, multiprocessing.get_context('spawn'))
+    semaphore = asyncio.Semaphore(async_downloads)
+    try:
+        await asyncio.gather(asyncio.to_thread(run_stage, timings, utils.get_new_enso, ctx),
+                             warm_credentials(ctx),
+                             ingest(timings, ctx, prefetch_chirps, utils.get_new_chirps, executor, cache_path, semaphore),
+                             ingest(timings, ctx, prefetch_vci, utils.get_new_vci, executor, cache_path, semaphore))
+    finally:
+        executor.shutdown()
+    logging.info('run_async: downloaded new ENSO, CHIRPS and VCI of the month')
+
+    await asyncio.to_thread(forecast_and_post, ctx, timings, utc_timestamp)
+    timings['activity'] = activity_summary(start)
+
+    return timings
@@ -1,7 +1,9 @@
+import sys
 import datetime
-from drought_model.utils import *
-from drought_model.settings import *
-from azure.storage.blob import BlobServiceClient, BlobClient
+import argparse
+from drought_model.settings import months_inactive, months_for_model1, \
+    months_for_model2, months_for_model3, run_context_from_env
+from drought_model.stages import blocking_stages, skip_stage, attempt_stage, run_action, run_status
 import logging
 logging.root.handlers = []
 logging.basicConfig(format='%(asctime)s : %(levelname)s : %(message)s', level=logging.DEBUG, filename='ex.log')
@@ -14,80 +16,217 @@ console.setFormatter(formatter)
 logging.getLogger("").addHandler(console)
 
 
-def main():
+def parse_run_context(argv=None):
+    '''
+    Function to build the settings of a run from the command line and environment variables.
+    Returns the settings, whether only the daily CHIRPS update has to be run
+    and whether only the preflight has to be run.
+    '''
+    parser = argparse.ArgumentParser(description='Drought forecast pipeline')
+    parser.add_argument('--date', help='date of execution YYYY-MM-DD (default: today)')
+    parser.add_argument('--country', help='country code, e.g. zwe')
+    parser.add_argument('--work-dir', help='folder of data_in, data_out, shp and model')
+    parser.add_argument('--local-store', help='folder of local secrets and blobs used instead of Azure')
+    parser.add_argument('--storage', choices=['blob', 'local', 'memory'],
+                        help='storage backend of the datalake (default: local if --local-store is set, otherwise blob)')
+    parser.add_argument('--api-test', action='store_const', const=True,
+                        help='send output to the test server')
+    parser.add_argument('--no-email', dest='notify_email', action='store_const', const=False,
+                        help='disable email notification')
+    parser.add_argument('--post-all', dest='upload_diff', action='store_const', const=False,
+                        help='post all layers, also the layers which did not change since the last post')
+    parser.add_argument('--dummy-data', action='store_const', const=True,
+                        help='post the dummy forecast')
+    parser.add_argument('--gridded-output', action='store_const', const=True,
+                        help='write per-pixel CHIRPS and VCI of the month')
+    parser.add_argument('--inference', choices=['compiled', 'xgboost'],
+                        help='inference of the models (default: compiled)')
+    parser.add_argument('--ensemble', action='store_const', const=True,
+                        help='forecast with the ensemble of the models of all lead times so far')
+    parser.add_argument('--orchestration', choices=['sync', 'async'],
+                        help='run the stages one by one, or overlap downloads, uploads and computation (default: sync)')
+    parser.add_argument('--preflight', action='store_const', const=True,
+                        help='defer the run (exit code 75) if ENSO, CHIRPS or VCI of the month is not available yet')
+    parser.add_argument('--preflight-only', action='store_true',
+                        help='only print which inputs of the month are available (exit code 75 if any is missing)')
+    parser.add_argument('--workers', type=int,
+                        help='number of processes of zonal statistics (default: number of CPUs)')
+    parser.add_argument('--chirps-incremental', action='store_const', const=True,
+                        help='finalize the daily CHIRPS accumulator instead of processing the whole month')
+    parser.add_argument('--chirps-daily', action='store_true',
+                        help='only add the new daily CHIRPS of the month of execution to the accumulator')
+    args = parser.parse_args(argv)
+
+    ctx = run_context_from_env(today=args.date, country=args.country, work_dir=args.work_dir,
+                               local_store=args.local_store, storage=args.storage, api_test=args.api_test,
+                               notify_email=args.notify_email, upload_diff=args.upload_diff, dummy_data=args.dummy_data,
+                               gridded_output=args.gridded_output, chirps_incremental=args.chirps_incremental, inference=args.inference,
+                               ensemble=args.ensemble, orchestration=args.orchestration, workers=args.workers,
+                               preflight=args.preflight)
+    return ctx, args.chirps_daily, args.preflight_only
+
+
+def run_stage(timings, function, ctx, *args):
+    '''
+    Function to run a stage of the pipeline with its policy (see stages.py): skip it if a stage it requires
+    did not succeed, otherwise attempt it and log its errors. The duration in seconds is recorded in timings
+    and the result record in timings['results']. Returns the StageResult.
+    '''
+    stage = function.__name__
+    results = timings.setdefault('results', {})
+    blocking = blocking_stages(ctx, results, stage)
+    result = skip_stage(stage, blocking) if blocking else attempt_stage(function, ctx, *args)
+    timings[stage] = result.duration
+    results[stage] = result.record()
+    return result
+
+
+def run(ctx):
+    '''
+    Run the pipeline for the month and country of ctx.
+    With ctx.orchestration 'async' the run is orchestrated by orchestration.run_async().
+    Returns the duration of every stage in seconds, the result records of the stages ('results'),
+    the status of the run ('status', see stages.py) and the network and CPU activity of the run
+    (see activity.py). With ctx.preflight, the run is deferred if any input of the month is not available yet
+    (see preflight.py): nothing is downloaded and the inputs available and missing are returned as 'deferred'.
+    '''
+    if ctx.preflight and ctx.month not in months_inactive:
+        from drought_model.preflight import preflight, inputs_ready, readiness_summary
+        df_readiness = preflight(ctx)
+        if not inputs_ready(df_readiness):
+            summary = readiness_summary(df_readiness)
+            logging.warning(f'run: inputs of the month not available yet, run deferred: {summary}')
+            return {'deferred': summary}
+
+    if ctx.orchestration == 'async':
+        import asyncio
+        from drought_model.orchestration import run_async
+        return asyncio.run(run_async(ctx))
+
+    from drought_model.activity import start_recording, activity_summary
+    start = start_recording()
     utc_timestamp = datetime.datetime.utcnow().isoformat()
+    timings = {}
 
-    try:
-        basic_data()
-    except Exception as e:
-        logging.error(f'Error in basic_data(): {e}')
-    try:
-        get_new_enso()
-    except Exception as e:
-        logging.error(f'Error in get_new_enso(): {e}')
-    try:
-        get_new_chirps()
-    except Exception as e:
-        logging.error(f'Error in get_new_chirps(): {e}')
-    try:
-        get_new_vci()
-    except Exception as e:
-        logging.error(f'Error in get_new_vci(): {e}')
+    # functions are imported per stage, so that a run only loads the packages of the stages it executes
+    from drought_model.utils import basic_data, get_new_enso, get_new_chirps, get_new_vci
+    run_stage(timings, basic_data, ctx)
+    run_stage(timings, get_new_enso, ctx)
+    run_stage(timings, get_new_chirps, ctx)
+    run_stage(timings, get_new_vci, ctx)
     logging.info(f'Python timer trigger function ran at {utc_timestamp}. \
         Downloaded new ENSO, CHIRPS and VCI of the month.')
 
+    forecast_and_post(ctx, timings, utc_timestamp)
+    timings['activity'] = activity_summary(start)
+
+    return timings
+
+
+def forecast_and_post(ctx, timings, utc_timestamp):
+    '''
+    Run the stages after the ingest of the month: forecast, impact and post to the IBF API,
+    or the non-trigger output off-season. If the forecast of the month fails, the latest forecast of the season
+    is posted instead (fallback_forecast()); after a stage with policy 'abort' failed, nothing is run.
+    The duration and result record of every stage and the status of the run are added to timings.
+    '''
+    results = timings.setdefault('results', {})
+    if run_action(results) == 'abort':
+        logging.error('Run aborted after the ingest, nothing posted')
+        timings['status'] = run_status(results)
+        return
+
     upload_date = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%fZ")[:-3]
-    if month in months_inactive:
+    if ctx.month in months_inactive:
         continue_calculation = False
-        try:
-            post_none_output(upload_date)
-            logging.info(f'Done post_output()')
-        except Exception as e:
-            logging.error(f'Error in post_output(): {e}')
+        from drought_model.utils import post_none_output
+        run_stage(timings, post_none_output, ctx, upload_date)
         logging.info(f'Python timer trigger function ran at {utc_timestamp}. \
             Non-trigger generated because of off-season')
 
-    elif month in months_for_model1:
-        try:
-            forecast_model1()
-        except Exception as e:
-            logging.error(f'Error in forecast_model1(): {e}')
+    elif ctx.ensemble:
+        from drought_model.utils import arrange_data, forecast_ensemble
+        if ctx.month not in months_for_model1:
+            run_stage(timings, arrange_data, ctx)
+        run_stage(timings, forecast_ensemble, ctx)
+        continue_calculation = True
+
+    elif ctx.month in months_for_model1:
+        from drought_model.utils import forecast_model1
+        run_stage(timings, forecast_model1, ctx)
         continue_calculation = True
 
-    elif month in months_for_model2:
-        try:
-            arrange_data()
-        except Exception as e:
-            logging.error(f'Error in arrange_data() for model 2: {e}')
-        try:
-            forecast_model2()
-        except Exception as e:
-            logging.error(f'Error in forecast_model2(): {e}')
+    elif ctx.month in months_for_model2:
+        from drought_model.utils import arrange_data, forecast_model2
+        run_stage(timings, arrange_data, ctx)
+        run_stage(timings, forecast_model2, ctx)
         continue_calculation = True
 
-    elif month in months_for_model3:
-        try:
-            arrange_data()
-        except Exception as e:
-            logging.error(f'Error in arrange_data() for model 3: {e}')
-        try:
-            forecast_model3()
-        except Exception as e:
-            logging.error(f'Error in forecast_model3(): {e}')
+    elif ctx.month in months_for_model3:
+        from drought_model.utils import arrange_data, forecast_model3
+        run_stage(timings, arrange_data, ctx)
+        run_stage(timings, forecast_model3, ctx)
         continue_calculation = True
     
     if continue_calculation:
-        try:
-            df_prediction = calculate_impact()
-        except Exception as e:
-            logging.error(f'Error in calculate_impact(): {e}')
-        try:
-            post_output(df_prediction, upload_date)
-        except Exception as e:
-            logging.error(f'Error in post_output(): {e}')
+        from drought_model.utils import fallback_forecast, calculate_impact, post_output
+        if run_action(results) == 'fallback':
+            run_stage(timings, fallback_forecast, ctx)
+        if run_action(results) != 'abort':
+            prediction = run_stage(timings, calculate_impact, ctx)
+            run_stage(timings, post_output, ctx, prediction.value, upload_date)
 
         logging.info(f'Python timer trigger function ran at {utc_timestamp}.')
 
+    timings['status'] = run_status(results)
+    if timings['status'] != 'ok':
+        logging.error(f'Run {timings["status"]}: {run_failures(results)}')
+
+
+def run_failures(results):
+    return {stage: result['error'] for stage, result in results.items() if result['status'] != 'ok'}
+
+
+def run_chirps_daily(ctx):
+    '''
+    Update the CHIRPS accumulator of the month of execution with the days available so far.
+    Returns the duration of every stage in seconds.
+    '''
+    timings = {}
+
+    from drought_model.utils import basic_data, get_provisional_chirps
+    run_stage(timings, basic_data, ctx)
+    run_stage(timings, get_provisional_chirps, ctx)
+
+    return timings
+
+
+def run_preflight_only(ctx):
+    '''
+    Print the readiness matrix of the inputs of the month.
+    Returns the exit code: 0 if all inputs are available, otherwise exit_deferred.
+    '''
+    from drought_model.preflight import preflight, inputs_ready, exit_deferred
+    df_readiness = preflight(ctx)
+    print(df_readiness.to_string(index=False))
+    return 0 if inputs_ready(df_readiness) else exit_deferred
+
+
+def main(ctx=None, chirps_daily=False, preflight_only=False):
+    if ctx is None:
+        ctx, chirps_daily, preflight_only = parse_run_context()
+    if preflight_only:
+        sys.exit(run_preflight_only(ctx))
+    if chirps_daily:
+        run_chirps_daily(ctx)
+        return
+    timings = run(ctx)
+    if 'deferred' in timings:
+        from drought_model.preflight import exit_deferred
+        sys.exit(exit_deferred)
+    if timings.get('status') == 'failed':
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
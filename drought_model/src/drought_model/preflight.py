@@ -0,0 +1,123 @@
+'''
+Preflight of a run: cheap probes of the data sources, in parallel, before any heavy download or processing.
+- ENSO: the tail of the ONI file (HTTP range request) has the season of two months before the month of execution
+- CHIRPS: one listing of the directory of the year has every day of the month of data
+- VCI: a HEAD request per week of the month of data which is not in the weekly VCI store yet
+The result is a readiness matrix with a row per ENSO season, CHIRPS day and VCI week.
+With --preflight the run is deferred (exit code 75, see pipeline.py) until all inputs are available;
+--preflight-only reports the matrix without running.
+'''
+import time
+import calendar
+import datetime
+import logging
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from drought_model.settings import enso_seasons, preflight_timeout, preflight_workers
+
+
+# exit code of a deferred run (EX_TEMPFAIL): the scheduler retries it later
+exit_deferred = 75
+
+readiness_columns = ['source', 'item', 'ready', 'status']
+
+
+def head_probe(url, timeout=preflight_timeout):
+    '''
+    Function to check with a HEAD request whether a file exists at url.
+    Returns whether it exists and the HTTP status (or the error).
+    '''
+    try:
+        response = requests.head(url, timeout=timeout, allow_redirects=True)
+    except requests.exceptions.RequestException as e:
+        return False, type(e).__name__
+    return response.ok, str(response.status_code)
+
+
+def probe_enso(ctx, timeout=preflight_timeout):
+    '''
+    Function to check whether the ONI file has the ENSO season required at the month of execution,
+    from the last bytes of the file only.
+    '''
+    year_middle, month_middle = divmod(ctx.year * 12 + ctx.month - 1 - 2, 12)
+    item = f'{enso_seasons[month_middle + 1]} {year_middle}'
+    try:
+        response = requests.get(ctx.enso_url, headers={'Range': 'bytes=-256'}, timeout=timeout)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        return [['enso', item, False, type(e).__name__]]
+
+    # last line: SEAS YR TOTAL ANOM
+    last = response.text.strip().splitlines()[-1].split()
+    last_season = ' '.join(last[:2])
+    return [['enso', item, last_season == item, f'last season {last_season}']]
+
+
+def probe_chirps(ctx, timeout=preflight_timeout):
+    '''
+    Function to check which days of the month of data are in the listing of the CHIRPS data source.
+    The listing is only searched for the file names, it is not parsed.
+    '''
+    year_data, month_data = ctx.year_data, ctx.month_data
+    dates = [datetime.date(year_data, month_data, day) for day in range(1, calendar.monthrange(year_data, month_data)[1] + 1)]
+    try:
+        response = requests.get(ctx.chirps_url + f'{year_data}/', timeout=timeout)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        return [['chirps', date.strftime('%Y-%m-%d'), False, type(e).__name__] for date in dates]
+
+    rows = []
+    for date in dates:
+        listed = f'chirps-v2.0.{date.year}.{date.month:02}.{date.day:02}.tif.gz' in response.text
+        rows.append(['chirps', date.strftime('%Y-%m-%d'), listed, 'listed' if listed else 'not listed'])
+    return rows
+
+
+def preflight(ctx, workers=preflight_workers):
+    '''
+    Function to probe all inputs of the month of execution in parallel.
+    Returns the readiness matrix: a row per ENSO season, CHIRPS day and VCI week with whether it is available.
+    '''
+    import pandas as pd
+    from drought_model.utils import get_vci_week_store
+    from drought_model.vci_weeks import list_iso_weeks, vci_filename, stored_weeks
+
+    logging.info('preflight: probing data sources')
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(probe_enso, ctx), executor.submit(probe_chirps, ctx)]
+
+        # weeks in the weekly VCI store are ready, the other weeks are probed on the data source
+        weeks_stored = stored_weeks(get_vci_week_store(ctx))
+        vci_rows = []
+        for iso_year, week in list_iso_weeks(ctx.year_data, ctx.month_data):
+            item = f'{iso_year}-W{week:02}'
+            if (iso_year, week) in weeks_stored:
+                vci_rows.append(['vci', item, True, 'stored'])
+            else:
+                future = executor.submit(head_probe, ctx.vci_url + vci_filename(iso_year, week))
+                vci_rows.append(['vci', item, future])
+        rows = [row for future in futures for row in future.result()]
+        for row in vci_rows:
+            if len(row) == 3:
+                row[2:] = row[2].result()
+            rows.append(row)
+
+    df_readiness = pd.DataFrame(rows, columns=readiness_columns)
+    logging.info(f'preflight: {int(df_readiness["ready"].sum())} of {len(df_readiness)} inputs available '
+                 f'in {time.perf_counter() - start:.1f} s')
+    return df_readiness
+
+
+def inputs_ready(df_readiness):
+    return bool(df_readiness['ready'].all())
+
+
+def readiness_summary(df_readiness):
+    '''
+    Function to summarize the readiness matrix per source: number of inputs available and missing items.
+    '''
+    return {source: {'ready': int(df_source['ready'].sum()),
+                     'required': len(df_source),
+                     'missing': list(df_source.loc[~df_source['ready'], 'item'])}
+            for source, df_source in df_readiness.groupby('source', sort=False)}
@@ -0,0 +1,152 @@
+'''
+Roll-up of values of the finest admin level to every coarser level, along the PCODE hierarchy
+of the admin csv of the finest level (columns ADM<level>_PCODE, e.g. ADM1_PCODE and ADM2_PCODE).
+Values are computed once at the finest level (e.g. zonal statistics per district); the layers of all coarser
+levels come out of one sparse-matrix product per level: a matrix (unit of the level, unit of the finest level)
+of 1 where the unit contains the finest unit, multiplied with the values, their valid mask and weights.
+The matrices only depend on the admin table, they are built once (rollup_matrices()) and reused for every source.
+Aggregations: 'sum', 'mean', 'area_mean' (mean weighted by the area of the finest units), 'max' and 'median'.
+Missing values (NaN) are ignored; a unit without any valid value gets NaN.
+'''
+import re
+import logging
+import numpy as np
+import pandas as pd
+
+
+aggregations = ('sum', 'mean', 'area_mean', 'max', 'median')
+
+
+def admin_levels(df_adm):
+    '''
+    Function to list the admin levels of the PCODE columns of an admin table, from coarsest to finest.
+    '''
+    return sorted(int(match.group(1)) for match in map(re.compile(r'ADM(\d)_PCODE').fullmatch, df_adm.columns)
+                  if match)
+
+
+def group_matrix(groups):
+    '''
+    Function to build the sparse matrix (group, row) of 1 where a row is in a group.
+    Returns the groups (sorted) and the matrix.
+    '''
+    from scipy import sparse
+
+    rows, units = pd.factorize(np.asarray(groups), sort=True)
+    matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, np.arange(len(rows)))), shape=(len(units), len(rows)))
+    return units, matrix
+
+
+def aggregate(matrix, values, how, weights=None):
+    '''
+    Function to aggregate the rows of values (row, column) per group with a matrix (group, row) of 1
+    where a row is in a group, e.g. of group_matrix().
+    weights (per row) are required by 'area_mean'.
+    Returns an array (group, column).
+    '''
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        return aggregate(matrix, values[:, np.newaxis], how, weights)[:, 0]
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0)
+    count = matrix @ valid.astype(float)
+
+    if how == 'sum':
+        result = matrix @ filled
+    elif how == 'mean':
+        result = (matrix @ filled) / np.maximum(count, 1)
+    elif how == 'area_mean':
+        # one product for the weighted sums and the sums of weights
+        stacked = np.empty((values.shape[0], 2 * values.shape[1]))
+        np.multiply(valid, np.asarray(weights, dtype=float)[:, np.newaxis], out=stacked[:, values.shape[1]:])
+        np.multiply(filled, stacked[:, values.shape[1]:], out=stacked[:, :values.shape[1]])
+        sums = matrix @ stacked
+        total, weight = sums[:, :values.shape[1]], sums[:, values.shape[1]:]
+        result = total / np.where(weight > 0, weight, 1)
+    elif how == 'max':
+        # shifted to positive values, so that the missing values (implicit zeros) never are the maximum
+        offset = np.nanmin(values, axis=0) - 1 if valid.any() else np.zeros(values.shape[1])
+        shifted = np.where(valid, values - offset, 0)
+        result = np.column_stack([matrix.multiply(shifted[:, [column]].T).max(axis=1).toarray()[:, 0]
+                                  for column in range(values.shape[1])]) + offset
+    elif how == 'median':
+        result = group_median(matrix, values)
+    else:
+        logging.error(f'aggregate: unknown aggregation {how}, one of {aggregations}')
+        raise ValueError()
+
+    return np.where(count > 0, result, np.nan)
+
+
+def group_median(matrix, values):
+    '''
+    Function to calculate the median per group and column, ignoring missing values:
+    the pairs of group and row are sorted by group and value once, the median is taken at the middle of every group.
+    '''
+    groups, rows = matrix.nonzero()
+    result = np.full((matrix.shape[0], values.shape[1]), np.nan)
+    for column in range(values.shape[1]):
+        value = values[rows, column]
+        valid = ~np.isnan(value)
+        group, value = groups[valid], value[valid]
+        order = np.lexsort((value, group))
+        group, value = group[order], value[order]
+        units, start, count = np.unique(group, return_index=True, return_counts=True)
+        lower = value[start + (count - 1) // 2]
+        upper = value[start + count // 2]
+        result[units, column] = (lower + upper) / 2
+    return result
+
+
+def rollup_matrices(df_adm):
+    '''
+    Function to build the roll-up of the finest admin level of an admin table to every coarser level:
+    the matrices of the levels stacked into one, so that every aggregation is a single product.
+    Returns the finest level, its PCODEs, the PCODEs of every coarser level (in the order of the stacked rows)
+    and the stacked matrix (unit of any coarser level, unit of the finest level).
+    '''
+    from scipy import sparse
+
+    levels = admin_levels(df_adm)
+    finest = levels[-1]
+    units, matrices = {}, []
+    for level in levels[:-1]:
+        units[level], matrix = group_matrix(df_adm[f'ADM{level}_PCODE'])
+        matrices.append(matrix)
+    matrix = sparse.vstack(matrices, format='csr') if matrices else sparse.csr_matrix((0, len(df_adm)))
+    return finest, df_adm[f'ADM{finest}_PCODE'].to_numpy(), units, matrix
+
+
+def roll_up(df_values, rollup, how, weights=None):
+    '''
+    Function to roll up layers of the finest admin level to all levels of an admin table,
+    with the matrices of rollup_matrices() of the table.
+    df_values has a column ADM<finest>_PCODE and the layers; how is an aggregation of all layers
+    or a dictionary of layer and aggregation; weights (per unit of the finest level, in the order of the table)
+    are required by 'area_mean'.
+    Returns per level a dataframe of ADM<level>_PCODE and the layers, the finest level included.
+    '''
+    finest, pcodes, units, matrix = rollup
+    pcode_column = f'ADM{finest}_PCODE'
+    layers = [column for column in df_values.columns if column != pcode_column]
+    how = how if isinstance(how, dict) else {layer: how for layer in layers}
+    values = df_values.set_index(pcode_column)[layers].reindex(pcodes).to_numpy(dtype=float)
+
+    # all coarser levels at once, a column block per aggregation
+    result = np.empty((matrix.shape[0], len(layers)))
+    for aggregation in dict.fromkeys(how.values()):
+        positions = [position for position, layer in enumerate(layers) if how[layer] == aggregation]
+        result[:, positions] = aggregate(matrix, values[:, positions], aggregation, weights)
+
+    rolled = {finest: level_frame(finest, pcodes, values, layers)}
+    start = 0
+    for level, level_units in units.items():
+        rolled[level] = level_frame(level, level_units, result[start:start + len(level_units)], layers)
+        start += len(level_units)
+    return rolled
+
+
+def level_frame(level, pcodes, values, layers):
+    df_level = pd.DataFrame(values, columns=layers)
+    df_level.insert(0, f'ADM{level}_PCODE', pcodes)
+    return df_level
@@ -0,0 +1,144 @@
+'''
+Service mode of the pipeline: a warm process which runs the pipeline on request.
+Admin boundaries, models, exposure and credentials stay in memory between runs.
+
+Start with:         "run-drought-service serve --port 8080"
+Trigger a run:      "run-drought-service trigger --date 2024-01-20 --country zwe"
+Check the service:  "run-drought-service health"
+'''
+import sys
+import json
+import time
+import datetime
+import argparse
+import threading
+import logging
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from drought_model.settings import run_context_from_env
+from drought_model import pipeline
+
+
+# one run at a time; state of the last run for the health endpoint
+run_lock = threading.Lock()
+service_state = {'started': datetime.datetime.utcnow().isoformat(), 'runs': 0, 'last_run': None}
+
+
+def trigger_run(today=None, country=None):
+    '''
+    Function to run the pipeline in the warm process for a date and country.
+    Returns the record of the run, which is also reported by the health endpoint,
+    or None without running if a run is in progress.
+    '''
+    ctx = run_context_from_env(today=today, country=country)
+    # taking the lock is the check, so that of simultaneous requests only one runs
+    if not run_lock.acquire(blocking=False):
+        return None
+    try:
+        start = time.perf_counter()
+        timings = pipeline.run(ctx)
+        record = {'date': ctx.today.isoformat(),
+                  'country': ctx.country,
+                  'finished': datetime.datetime.utcnow().isoformat(),
+                  'duration': round(time.perf_counter() - start, 3),
+                  'timings': timings}
+        service_state['runs'] += 1
+        service_state['last_run'] = record
+    finally:
+        run_lock.release()
+    return record
+
+
+def health():
+    '''
+    Function to report the state of the service: caches in memory and the last run.
+    '''
+    from drought_model.utils import cache_state
+
+    return dict(service_state, busy=run_lock.locked(), caches=cache_state())
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    '''
+    GET /health: state of the service
+    POST /run: run the pipeline, body (optional) {"date": "YYYY-MM-DD", "country": "zwe"}
+    '''
+
+    def send_json(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, health())
+        else:
+            self.send_json(404, {'error': f'unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path != '/run':
+            self.send_json(404, {'error': f'unknown path {self.path}'})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        try:
+            record = trigger_run(request.get('date'), request.get('country'))
+        except Exception as e:
+            logging.error(f'Error in trigger_run(): {e}')
+            self.send_json(500, {'error': str(e)})
+            return
+        if record is None:
+            self.send_json(409, {'error': 'a run is in progress'})
+            return
+        self.send_json(200, record)
+
+    def log_message(self, format, *args):
+        logging.info('service: ' + format % args)
+
+
+def serve(host='127.0.0.1', port=8080):
+    '''
+    Function to start the service. Runs until interrupted.
+    '''
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    logging.warning(f'service: listening on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def request_service(url, data=None):
+    if data is not None:
+        data = json.dumps(data).encode()
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drought pipeline service')
+    parser.add_argument('command', choices=['serve', 'trigger', 'health'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--date', help='date of execution YYYY-MM-DD (default: today)')
+    parser.add_argument('--country', help='country code, e.g. zwe')
+    args = parser.parse_args()
+
+    url = f'http://{args.host}:{args.port}'
+    if args.command == 'serve':
+        serve(args.host, args.port)
+    elif args.command == 'trigger':
+        data = {key: value for key, value in [('date', args.date), ('country', args.country)] if value}
+        json.dump(request_service(url + '/run', data), sys.stdout, indent=2)
+    elif args.command == 'health':
+        json.dump(request_service(url + '/health'), sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,92 @@
+import os
 import datetime
+import dataclasses
 
-# settings for posting output
+# default settings for posting output
 api_test = False # True/ False; True: to send output to the test server
 notify_email = True # True/ False; False: to disable sending email notification
-if api_test:
-  api_info = 'ibf-credentials'
-else:
-  api_info = 'ibf-credentials-zwe'
+upload_diff = True # True/ False; True: only post the layers which changed since the last post (see post_output())
 
-# set dummy-mode for testing
-dummy_time = False # True/ False
+# default of dummy-mode for testing
 dummy_data = False # True/ False
 
-# define month of execution (today)
-if dummy_time:
-  year = 2024
-  month = 1
-  today = datetime.datetime(year, month, 20)
-else:
-  today = datetime.date.today()
-  year = datetime.datetime.now().year
-  month = datetime.datetime.now().month
+# default of incremental CHIRPS: accumulate daily CHIRPS as it arrives (see get_provisional_chirps())
+# and only finalize the month in get_new_chirps()
+chirps_incremental = False # True/ False
+
+# default of gridded output: per-pixel CHIRPS and VCI of the month in drought/Gold/<country>/grid/
+gridded_output = False # True/ False
+
+# storage backend of the datalake: 'blob' (Azure), 'local' (folder local_store) or 'memory' (see storage.py)
+# None: local if a local store folder is set, otherwise blob
+storage = None
+
+# inference of the XGBoost models: 'compiled' (NumPy, see inference.py) or 'xgboost' (XGBClassifier.predict())
+inference = 'compiled'
+
+# default of ensemble forecast: forecast with the models of all lead times so far and use their ensemble
+# (see forecast_ensemble()) instead of the model of the month only
+ensemble = False # True/ False
+
+# orchestration of a run: 'sync' (stages one by one) or 'async' (downloads, uploads and computation
+# overlap, see orchestration.py) and the number of concurrent downloads of rasters in async runs
+orchestration = 'sync'
+async_downloads = 4
+
+# default of preflight: probe ENSO, CHIRPS and VCI of the month (see preflight.py) and defer the run
+# if any input is not available yet; timeout of a probe in seconds and number of probes in parallel
+preflight = False # True/ False
+preflight_timeout = 10
+preflight_workers = 16
+
+# attempts of the stages which download or post (see stage_policies in stages.py) and seconds between attempts
+stage_attempts = 2
+stage_retry_wait = 10
+
+# seconds a Key Vault secret is kept in memory by a warm process (see service.py), after which it is fetched again,
+# so that rotated credentials are picked up without a restart
+secret_cache_ttl = 3600
+
+# resident memory budget of the streaming backfill of CHIRPS in MB (see backfill.py)
+backfill_memory_budget_mb = 1024
+
+# number of processes of zonal statistics (None: number of CPUs)
+zonal_workers = None
+
+# GDAL configuration of the raster readers (see gridded.py): block cache in MB, threads decoding compressed
+# blocks ('ALL_CPUS': the CPUs are shared by the processes of zonal statistics), cache of reads over HTTP
+# (/vsicurl/) in MB, and decoding of gzipped rasters: 'memory' (decompressed in memory) or 'vsigzip' (by GDAL)
+gdal_cache_mb = 256
+gdal_num_threads = 'ALL_CPUS'
+gdal_vsi_cache_mb = 64
+raster_gzip = 'memory'
+
+# working directories of downloaded rasters (one per data month) are removed
+# when older than this or when all together are larger than this
+raster_cache_max_age_days = 93
+raster_cache_max_bytes = 2 * 1024**3
 
 # define lead time corresponding to the month of execution
-if month == 5:
-  leadtime = 11
-  leadtime_str = '0-month'
-elif month == 6:
-  leadtime = 10
-  leadtime_str = '0-month'
-elif month == 7:
-  leadtime = 9
-  leadtime_str = '0-month'
-elif month == 8:
-  leadtime = 8
-  leadtime_str = '0-month'
-elif month == 9:
-  leadtime = 7
-  leadtime_str = '7-month'
-elif month == 10:
-  leadtime = 6
-  leadtime_str = '6-month'
-elif month == 11:
-  leadtime = 5
-  leadtime_str = '5-month'
-elif month == 12:
-  leadtime = 4
-  leadtime_str = '4-month'
-elif month == 1:
-  leadtime = 3
-  leadtime_str = '3-month'
-elif month == 2:
-  leadtime = 2
-  leadtime_str = '2-month'
-elif month == 3:
-  leadtime = 1
-  leadtime_str = '1-month'
-elif month == 4:
-  leadtime = 0
-  leadtime_str = '0-month'
+# month: (lead time, lead time string of the dashboard)
+leadtimes = {
+    5: (11, '0-month'),
+    6: (10, '0-month'),
+    7: (9, '0-month'),
+    8: (8, '0-month'),
+    9: (7, '7-month'),
+    10: (6, '6-month'),
+    11: (5, '5-month'),
+    12: (4, '4-month'),
+    1: (3, '3-month'),
+    2: (2, '2-month'),
+    3: (1, '1-month'),
+    4: (0, '0-month'),
+}
+
+# ENSO seasons of the ONI file by their middle month; at the month of execution,
+# the last season available is the one of two months earlier
+enso_seasons = {1: 'DJF', 2: 'JFM', 3: 'FMA', 4: 'MAM', 5: 'AMJ', 6: 'MJJ',
+                7: 'JJA', 8: 'JAS', 9: 'ASO', 10: 'SON', 11: 'OND', 12: 'NDJ'}
 
 # Data URL
 enso_url = 'https://www.cpc.ncep.noaa.gov/data/indices/oni.ascii.txt'
@@ -66,9 +94,186 @@ chirps_url = 'https://data.chc.ucsb.edu/products/CHIRPS-2.0/africa_daily/tifs/p0
 # vci_url = 'https://io.apps.fao.org/geoserver/wms/ASIS/VCI_M/v1?' # WMS FAO
 # vci_url_version = '1.3.0' # WMS version FAO
 vci_url = 'https://www.star.nesdis.noaa.gov/data/pub0018/VHPdata4users/data/Blended_VH_4km/geo_TIFF/'
+keyvault_url = 'https://ibf-keys.vault.azure.net'
 
 # model selection
 months_inactive = [5, 6, 7, 8]
 months_for_model1 = [9, 10]
 months_for_model2 = [11, 12]
-months_for_model3 = [1, 2, 3, 4]
\ No newline at end of file
+months_for_model3 = [1, 2, 3, 4]
+
+# countries of the pipeline
+# adm_name: name of the admin boundary files, {level} is the admin level
+# api_info: name of the secret of IBF API credentials (operation, test)
+countries = {
+    'zwe': {
+        'adm_name': 'zwe_admbnda_adm{level}_zimstat_ocha_20180911',
+        'api_info': ('ibf-credentials-zwe', 'ibf-credentials'),
+    },
+}
+
+# exposure indicators of the impact calculation
+# layer name: (file in drought/Gold/<country>/, column of province pcode, column of exposure)
+impact_indicators = {
+    'population_affected': ('zwe_population_adm1.csv', 'ADM1_PCODE', 'total_pop'),
+    'small_ruminants_exposed': ('zwe_ruminants_adm1.csv', 'pcode', 'small_reminant_lsu'),
+    'cattle_exposed': ('zwe_cattle_adm1.csv', 'pcode', 'cattle_lsu'),
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class RunContext:
+    '''
+    Settings of one run of the pipeline: date of execution, country, paths, endpoints and switches.
+    local_store is a folder of local secrets and blobs used instead of Azure (see storage.py).
+    zonal_cache holds the averages of rasters calculated ahead of the stages of an asynchronous run
+    (see orchestration.py); it belongs to that run only.
+    Every function in utils.py takes it as first argument.
+    Use build_run_context() or run_context_from_env() to create it.
+    '''
+    today: datetime.date
+    country: str = 'zwe'
+    work_dir: str = '.'
+    api_test: bool = api_test
+    notify_email: bool = notify_email
+    upload_diff: bool = upload_diff
+    dummy_data: bool = dummy_data
+    gridded_output: bool = gridded_output
+    chirps_incremental: bool = chirps_incremental
+    workers: int = zonal_workers
+    local_store: str = None
+    storage: str = storage
+    inference: str = inference
+    ensemble: bool = ensemble
+    orchestration: str = orchestration
+    preflight: bool = preflight
+    enso_url: str = enso_url
+    chirps_url: str = chirps_url
+    vci_url: str = vci_url
+    keyvault_url: str = keyvault_url
+    container: str = 'ibf'
+    zonal_cache: dict = dataclasses.field(default=None, compare=False, repr=False)
+
+    @property
+    def year(self):
+        return self.today.year
+
+    @property
+    def month(self):
+        return self.today.month
+
+    @property
+    def year_data(self):
+        # data of the previous month are processed at the month of execution
+        return self.year - 1 if self.month == 1 else self.year
+
+    @property
+    def month_data(self):
+        return 12 if self.month == 1 else self.month - 1
+
+    @property
+    def leadtime(self):
+        return leadtimes[self.month][0]
+
+    @property
+    def leadtime_str(self):
+        return leadtimes[self.month][1]
+
+    @property
+    def iso3(self):
+        return self.country.upper()
+
+    @property
+    def api_info(self):
+        info_operation, info_test = countries[self.country]['api_info']
+        return info_test if self.api_test else info_operation
+
+    @property
+    def data_in_path(self):
+        return os.path.join(self.work_dir, 'data_in')
+
+    @property
+    def adm_path(self):
+        return os.path.join(self.work_dir, 'shp')
+
+    @property
+    def rawchirps_path(self):
+        return os.path.join(self.data_in_path, 'chirps_tif')
+
+    @property
+    def rawvci_path(self):
+        return os.path.join(self.data_in_path, 'vci_tif')
+
+    @property
+    def model_path(self):
+        return os.path.join(self.work_dir, 'model')
+
+    @property
+    def data_out_path(self):
+        return os.path.join(self.work_dir, 'data_out')
+
+    def adm_name(self, level):
+        return countries[self.country]['adm_name'].format(level=level)
+
+
+def build_run_context(today=None, country='zwe', **kwargs):
+    '''
+    Function to build the settings of a run.
+    today is the date of execution (default: today), other keyword arguments override fields of RunContext.
+    '''
+    if today is None:
+        today = datetime.date.today()
+    elif isinstance(today, str):
+        today = datetime.date.fromisoformat(today)
+    elif isinstance(today, datetime.datetime):
+        today = today.date()
+    if country not in countries:
+        raise ValueError(f'Country {country} not configured in settings.py')
+
+    return RunContext(today=today, country=country, **kwargs)
+
+
+def _env_flag(value):
+    return value.strip().lower() in ('1', 'true', 'yes')
+
+
+def run_context_from_env(environ=None, **overrides):
+    '''
+    Function to build the settings of a run from environment variables:
+    DROUGHT_DATE (YYYY-MM-DD), DROUGHT_COUNTRY, DROUGHT_WORK_DIR, DROUGHT_LOCAL_STORE, DROUGHT_STORAGE,
+    DROUGHT_INFERENCE (compiled/xgboost), DROUGHT_ORCHESTRATION (sync/async),
+    DROUGHT_API_TEST, DROUGHT_NOTIFY_EMAIL, DROUGHT_UPLOAD_DIFF, DROUGHT_DUMMY_DATA, DROUGHT_GRIDDED_OUTPUT,
+    DROUGHT_CHIRPS_INCREMENTAL, DROUGHT_ENSEMBLE, DROUGHT_PREFLIGHT (true/false), DROUGHT_WORKERS (number of processes).
+    Keyword arguments (e.g. from the command line) take precedence.
+    '''
+    environ = os.environ if environ is None else environ
+    kwargs = {}
+    if environ.get('DROUGHT_DATE'):
+        kwargs['today'] = environ['DROUGHT_DATE']
+    if environ.get('DROUGHT_COUNTRY'):
+        kwargs['country'] = environ['DROUGHT_COUNTRY'].lower()
+    if environ.get('DROUGHT_WORK_DIR'):
+        kwargs['work_dir'] = environ['DROUGHT_WORK_DIR']
+    if environ.get('DROUGHT_LOCAL_STORE'):
+        kwargs['local_store'] = environ['DROUGHT_LOCAL_STORE']
+    if environ.get('DROUGHT_STORAGE'):
+        kwargs['storage'] = environ['DROUGHT_STORAGE'].lower()
+    if environ.get('DROUGHT_INFERENCE'):
+        kwargs['inference'] = environ['DROUGHT_INFERENCE'].lower()
+    if environ.get('DROUGHT_ORCHESTRATION'):
+        kwargs['orchestration'] = environ['DROUGHT_ORCHESTRATION'].lower()
+    if environ.get('DROUGHT_WORKERS'):
+        kwargs['workers'] = int(environ['DROUGHT_WORKERS'])
+    for field, variable in [('api_test', 'DROUGHT_API_TEST'),
+                            ('notify_email', 'DROUGHT_NOTIFY_EMAIL'),
+                            ('upload_diff', 'DROUGHT_UPLOAD_DIFF'),
+                            ('dummy_data', 'DROUGHT_DUMMY_DATA'),
+                            ('gridded_output', 'DROUGHT_GRIDDED_OUTPUT'),
+                            ('chirps_incremental', 'DROUGHT_CHIRPS_INCREMENTAL'),
+                            ('ensemble', 'DROUGHT_ENSEMBLE'),
+                            ('preflight', 'DROUGHT_PREFLIGHT')]:
+        if environ.get(variable):
+            kwargs[field] = _env_flag(environ[variable])
+    kwargs.update({key: value for key, value in overrides.items() if value is not None})
+
+    return build_run_context(**kwargs)
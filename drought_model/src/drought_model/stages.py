@@ -0,0 +1,187 @@
+'''
+Result records of the stages of a run and the policy which decides how the run continues after a failure.
+- a stage runs only if the stages it requires succeeded in the run (if they ran), otherwise it is skipped,
+  so that no stage works on files of an earlier run in data_in
+- a stage succeeds if it raises no error and writes its output files during the run
+- the stages which download or post are attempted again after a failure (stage_attempts in settings.py)
+- when a stage fails or is skipped, its policy decides the run: 'continue' (stages requiring it are skipped),
+  'fallback' (the latest forecast of the season in the datalake is posted instead, see fallback_forecast())
+  or 'abort' (nothing is posted)
+'''
+import os
+import time
+import hashlib
+import logging
+import dataclasses
+from drought_model.settings import months_for_model1, months_for_model3, stage_attempts, stage_retry_wait
+
+
+# policy per stage: stages required, number of attempts and action of the run when it fails
+stage_policies = {
+    'basic_data': {'requires': [], 'attempts': 1, 'on_failure': 'abort'},
+    'get_new_enso': {'requires': ['basic_data'], 'attempts': stage_attempts, 'on_failure': 'continue'},
+    'get_new_chirps': {'requires': ['basic_data'], 'attempts': stage_attempts, 'on_failure': 'continue'},
+    'get_new_vci': {'requires': ['basic_data'], 'attempts': stage_attempts, 'on_failure': 'continue'},
+    'get_provisional_chirps': {'requires': ['basic_data'], 'attempts': stage_attempts, 'on_failure': 'continue'},
+    'arrange_data': {'requires': ['get_new_enso', 'get_new_chirps'], 'attempts': 1, 'on_failure': 'fallback'},
+    'forecast_model1': {'requires': ['get_new_enso'], 'attempts': 1, 'on_failure': 'fallback'},
+    'forecast_model2': {'requires': ['arrange_data'], 'attempts': 1, 'on_failure': 'fallback'},
+    'forecast_model3': {'requires': ['arrange_data'], 'attempts': 1, 'on_failure': 'fallback'},
+    'forecast_ensemble': {'requires': ['get_new_enso', 'arrange_data'], 'attempts': 1, 'on_failure': 'fallback'},
+    'fallback_forecast': {'requires': ['basic_data'], 'attempts': 1, 'on_failure': 'abort'},
+    'calculate_impact': {'requires': [], 'attempts': 1, 'on_failure': 'abort'},
+    'post_output': {'requires': ['calculate_impact'], 'attempts': stage_attempts, 'on_failure': 'abort'},
+    'post_none_output': {'requires': ['basic_data'], 'attempts': stage_attempts, 'on_failure': 'abort'},
+}
+default_policy = {'requires': [], 'attempts': 1, 'on_failure': 'continue'}
+
+
+@dataclasses.dataclass
+class StageResult:
+    '''
+    Result of a stage of a run: status ('ok', 'failed' or 'skipped'), value returned by the stage,
+    duration in seconds, number of attempts, error of the last attempt,
+    output files written and fingerprints of the input files read (None if missing).
+    '''
+    stage: str
+    status: str
+    value: object = None
+    duration: float = 0.0
+    attempts: int = 0
+    error: str = None
+    outputs: list = dataclasses.field(default_factory=list)
+    inputs: dict = dataclasses.field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return self.status == 'ok'
+
+    def record(self):
+        '''
+        Function to get the result without the value, e.g. to report it as JSON.
+        '''
+        return {field.name: getattr(self, field.name) for field in dataclasses.fields(self) if field.name != 'value'}
+
+
+def stage_files(ctx, stage):
+    '''
+    Function to list the local input and output files of a stage (input and output in data_in and data_out).
+    '''
+    month = ctx.today.strftime('%Y-%m')
+    enso_file_path = os.path.join(ctx.data_in_path, f'enso_{month}.csv')
+    input_file_path = os.path.join(ctx.data_in_path, f'data_{month}.csv')
+    predict_file_path = os.path.join(ctx.data_out_path, f'{ctx.year}-{ctx.month:02}_{ctx.country}_predict.csv')
+    files = {
+        'get_new_enso': ([], [enso_file_path]),
+        'get_new_chirps': ([], [os.path.join(ctx.data_in_path, f'chirps_{month}.csv')]),
+        'get_new_vci': ([], [os.path.join(ctx.data_in_path, f'vci_{month}.csv')]),
+        'arrange_data': ([enso_file_path], [input_file_path]),
+        'forecast_model1': ([enso_file_path], [predict_file_path]),
+        'forecast_model2': ([input_file_path], [predict_file_path]),
+        'forecast_model3': ([input_file_path], [predict_file_path]),
+        'forecast_ensemble': ([enso_file_path] + ([] if ctx.month in months_for_model1 else [input_file_path]),
+                              [predict_file_path]),
+        'fallback_forecast': ([], [predict_file_path]),
+        'calculate_impact': ([] if ctx.dummy_data else [predict_file_path], []),
+    }
+    return files.get(stage, ([], []))
+
+
+def file_fingerprint(file_path):
+    '''
+    Function to get the fingerprint of a file: sha256 of its content, None if the file is missing.
+    '''
+    if not os.path.isfile(file_path):
+        return None
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024**2), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def written_since(file_path, start):
+    # file systems store modification times with a resolution of up to a second
+    return os.path.isfile(file_path) and os.path.getmtime(file_path) >= start - 1
+
+
+def required_stages(ctx, stage):
+    requires = stage_policies.get(stage, default_policy)['requires']
+    # VCI is only an input of the months of model 3
+    if stage == 'arrange_data' and ctx.month in months_for_model3:
+        requires = requires + ['get_new_vci']
+    return requires
+
+
+def blocking_stages(ctx, results, stage):
+    '''
+    Function to list the stages required by a stage which ran in the run and did not succeed.
+    results are the records of the stages run so far.
+    '''
+    return [required for required in required_stages(ctx, stage)
+            if required in results and results[required]['status'] != 'ok']
+
+
+def skip_stage(stage, blocking):
+    logging.error(f'{stage}() skipped, required stage(s) not succeeded: {", ".join(blocking)}')
+    return StageResult(stage, 'skipped', error=f'required stage(s) not succeeded: {", ".join(blocking)}')
+
+
+def attempt_stage(function, ctx, *args):
+    '''
+    Function to run a stage with its policy: attempt it up to the attempts of its policy,
+    check that it wrote its output files and record the fingerprints of its input files.
+    Returns the StageResult.
+    '''
+    stage = function.__name__
+    attempts = stage_policies.get(stage, default_policy)['attempts']
+    input_paths, output_paths = stage_files(ctx, stage)
+    result = StageResult(stage, 'failed', inputs={path: file_fingerprint(path) for path in input_paths})
+
+    start = time.perf_counter()
+    for attempt in range(1, attempts + 1):
+        result.attempts = attempt
+        attempt_start = time.time()
+        try:
+            result.value = function(ctx, *args)
+            missing = [path for path in output_paths if not written_since(path, attempt_start)]
+            if not missing:
+                result.status, result.error = 'ok', None
+                break
+            result.error = f'output not written: {", ".join(missing)}'
+        except Exception as e:
+            result.error = f'{type(e).__name__}: {e}'
+        logging.error(f'Error in {stage}() (attempt {attempt} of {attempts}): {result.error}')
+        if attempt < attempts:
+            time.sleep(stage_retry_wait)
+    result.duration = round(time.perf_counter() - start, 3)
+    result.outputs = [path for path in output_paths if written_since(path, attempt_start)]
+
+    return result
+
+
+def run_action(results):
+    '''
+    Function to decide how the run continues from the records of its stages so far:
+    'abort' if a stage with abort policy did not succeed,
+    'fallback' if a forecast stage did not succeed and no fallback forecast was made yet, otherwise 'continue'.
+    '''
+    actions = {stage_policies.get(stage, default_policy)['on_failure']
+               for stage, result in results.items() if result['status'] != 'ok'}
+    if 'abort' in actions:
+        return 'abort'
+    if 'fallback' in actions and results.get('fallback_forecast', {}).get('status') != 'ok':
+        return 'fallback'
+    return 'continue'
+
+
+def run_status(results):
+    '''
+    Function to get the status of a run from the records of its stages:
+    'failed' (nothing posted), 'fallback' (the forecast of an earlier month posted) or 'ok'.
+    '''
+    if run_action(results) == 'abort':
+        return 'failed'
+    if 'fallback_forecast' in results:
+        return 'fallback'
+    return 'ok'
@@ -0,0 +1,147 @@
+'''
+Storage backends of the datalake. Every backend stores blobs by container and blob path:
+- BlobStorage: Azure Blob Storage (production)
+- LocalStorage: files in <folder>/<container>/<blob path>, e.g. the fixtures of fixtures.py
+- MemoryStorage: dictionary in memory, e.g. for backfills and tests
+
+Blobs are read and written as bytes, file objects or dataframes, without temporary files.
+A missing blob raises FileNotFoundError in every backend.
+'''
+import io
+import os
+import json
+import hashlib
+import datetime
+import pandas as pd
+
+
+def read_local_secret(local_store, secret_name):
+    '''
+    Function to read a secret from secrets.json of a local store folder, used instead of Azure Key Vault.
+    '''
+    with open(os.path.join(local_store, 'secrets.json')) as secrets_file:
+        return json.load(secrets_file)[secret_name]
+
+
+class Storage:
+    '''
+    Methods shared by the backends, on top of read_bytes() and write_bytes() of the backend.
+    '''
+
+    def open(self, container, blob_path):
+        '''
+        Open a blob as a binary file object for reading.
+        '''
+        return io.BytesIO(self.read_bytes(container, blob_path))
+
+    def read_dataframe(self, container, blob_path, **kwargs):
+        '''
+        Read a csv blob into a dataframe, keyword arguments are passed to pandas.read_csv().
+        '''
+        with self.open(container, blob_path) as blob_file:
+            return pd.read_csv(blob_file, **kwargs)
+
+    def write_dataframe(self, container, blob_path, df, index=False):
+        '''
+        Write a dataframe as csv blob.
+        '''
+        self.write_bytes(container, blob_path, df.to_csv(index=index).encode())
+
+    def write_file(self, container, blob_path, file_path):
+        with open(file_path, 'rb') as upload_file:
+            self.write_bytes(container, blob_path, upload_file)
+
+
+class BlobStorage(Storage):
+    '''
+    Azure Blob Storage of a connection string.
+    '''
+
+    def __init__(self, connection_string):
+        from azure.storage.blob import BlobServiceClient
+
+        self.service_client = BlobServiceClient.from_connection_string(connection_string)
+
+    def blob_client(self, container, blob_path):
+        return self.service_client.get_blob_client(container=container, blob=blob_path)
+
+    def read_bytes(self, container, blob_path):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            return self.blob_client(container, blob_path).download_blob().readall()
+        except ResourceNotFoundError:
+            raise FileNotFoundError(f'{container}/{blob_path}')
+
+    def write_bytes(self, container, blob_path, data):
+        self.blob_client(container, blob_path).upload_blob(data, overwrite=True)
+
+    def properties(self, container, blob_path):
+        '''
+        Version of a blob: ETag and last modified date.
+        '''
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            properties = self.blob_client(container, blob_path).get_blob_properties()
+        except ResourceNotFoundError:
+            raise FileNotFoundError(f'{container}/{blob_path}')
+        return {'etag': properties.etag, 'last_modified': properties.last_modified.isoformat()}
+
+
+class LocalStorage(Storage):
+    '''
+    Blobs as files in a local folder: <folder>/<container>/<blob path>.
+    '''
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def file_path(self, container, blob_path):
+        return os.path.join(self.folder, container, *blob_path.split('/'))
+
+    def open(self, container, blob_path):
+        return open(self.file_path(container, blob_path), 'rb')
+
+    def read_bytes(self, container, blob_path):
+        with self.open(container, blob_path) as blob_file:
+            return blob_file.read()
+
+    def write_bytes(self, container, blob_path, data):
+        if hasattr(data, 'read'):
+            data = data.read()
+        file_path = self.file_path(container, blob_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, 'wb') as blob_file:
+            blob_file.write(data)
+
+    def properties(self, container, blob_path):
+        data = self.read_bytes(container, blob_path)
+        modified = os.path.getmtime(self.file_path(container, blob_path))
+        return {'etag': hashlib.md5(data).hexdigest(),
+                'last_modified': datetime.datetime.fromtimestamp(modified, datetime.timezone.utc).isoformat()}
+
+
+class MemoryStorage(Storage):
+    '''
+    Blobs in a dictionary of (container, blob path) and bytes.
+    '''
+
+    def __init__(self):
+        self.blobs = {}
+        self.modified = {}
+
+    def read_bytes(self, container, blob_path):
+        if (container, blob_path) not in self.blobs:
+            raise FileNotFoundError(f'{container}/{blob_path}')
+        return self.blobs[(container, blob_path)]
+
+    def write_bytes(self, container, blob_path, data):
+        if hasattr(data, 'read'):
+            data = data.read()
+        self.blobs[(container, blob_path)] = bytes(data)
+        self.modified[(container, blob_path)] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    def properties(self, container, blob_path):
+        data = self.read_bytes(container, blob_path)
+        return {'etag': hashlib.md5(data).hexdigest(), 'last_modified': self.modified[(container, blob_path)]}
@@ -1,45 +1,124 @@
 import os
 import io
-import glob
 import json
 import errno
+import hashlib
 import pandas as pd
 import numpy as np
 # import geopandas as gpd
 import subprocess
-from rasterstats import zonal_stats
-from xgboost import XGBClassifier
-from bs4 import BeautifulSoup
 import requests
 import urllib.error
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
-from azure.storage.blob import BlobServiceClient, BlobClient
-from drought_model.settings import *
+from drought_model.settings import months_for_model1, months_for_model2, months_for_model3, months_inactive, \
+    impact_indicators, leadtimes, raster_cache_max_age_days, raster_cache_max_bytes, secret_cache_ttl
+from drought_model.impact import build_exposure_matrix, compute_impact
+from drought_model.gridded import read_clipped, cumulative_and_dryspell_grid, mean_grid, write_grid
+from drought_model.workdir import month_workdir, parse_chirps_date, parse_vci_week, \
+    index_rasters, evict_workdirs
+from drought_model.accumulator import window_columns, new_accumulator, update_accumulator, \
+    finalize_accumulator
+from drought_model.boundaries import compile_geometry_cache, load_geometry_cache
+from drought_model.rollup import rollup_matrices, roll_up, group_matrix, aggregate
+from drought_model.activity import record, busy
+from drought_model.zonal import zonal_means
+from drought_model.inference import compile_model, predict_classes, model_schema, feature_matrix
+from drought_model.storage import read_local_secret, BlobStorage, LocalStorage, MemoryStorage
+from drought_model.vci_weeks import list_iso_weeks, vci_filename, new_week_store, stored_weeks, \
+    append_week, monthly_vci
+from drought_model.feature_store import store_columns, features_to_long, slice_features, season_data_months, \
+    season_dates, missing_features
 import datetime
 import time
 import calendar
 import logging
 
+# heavy dependencies (rasterstats/GDAL, xgboost, bs4, azure) are imported in the functions
+# which use them, so that a stage only pays for the packages it needs
+
+
+# caches of a warm process (see service.py), kept between runs
+# exposure matrix of calculate_impact() per country, with the ETags of the exposure tables
+exposure_cache = {}
+# secrets per key vault and secret name, with the time they were fetched
+secret_cache = {}
+# storage backends of the datalake per connection string, local folder or 'memory'
+storage_cache = {}
+# admin boundaries (geometries and spatial index) per folder, country and admin level
+admin_cache = {}
+# trained models per blob path, with the ETag of the blob
+model_cache = {}
+
+# order of the input columns of model 2 and 3 (see arrange_data())
+input_columns_order = ['ADM1_PCODE', 'ADM2_PCODE',\
+    'JAS', 'ASO', 'SON', 'OND', 'NDJ', 'DJF', 'JFM', \
+    '09_p_cumul', '10_p_cumul', '11_p_cumul', '12_p_cumul', \
+    '01_p_cumul', '02_p_cumul', '03_p_cumul', \
+    '09_dryspell', '10_dryspell', '11_dryspell', '12_dryspell', \
+    '01_dryspell', '02_dryspell', '03_dryspell', \
+    '09_vci', '10_vci', '11_vci', '12_vci', \
+    '01_vci', '02_vci', '03_vci', \
+    'p_cumul', 'vci_avg']
+
+# months of the season with a model, in order (see forecast_ensemble())
+season_model_months = months_for_model1 + months_for_model2 + months_for_model3
+
+# layers posted to the dashboard
+output_layers = list(impact_indicators) + ['forecast_severity', 'forecast_trigger']
+
+
+@record('network')
+def get_secret_keyvault(ctx, secret_name):
+    if ctx.local_store:
+        return read_local_secret(ctx.local_store, secret_name)
+
+    from azure.identity import DefaultAzureCredential
+    from azure.keyvault.secrets import SecretClient
+
+    kv_url = ctx.keyvault_url
+    key = (kv_url, secret_name)
+    if key not in secret_cache or time.monotonic() - secret_cache[key][1] > secret_cache_ttl:
+        az_credential = DefaultAzureCredential(exclude_shared_token_cache_credential=True)
+        kv_secretClient = SecretClient(vault_url=kv_url, credential=az_credential)
+        secret_cache[key] = (kv_secretClient.get_secret(secret_name).value, time.monotonic())
+    return secret_cache[key][0]
+
+
+def evict_secret(ctx, secret_name):
+    '''
+    Function to remove a secret from memory, e.g. after an authentication with it failed,
+    so that the next attempt fetches it again from Key Vault.
+    '''
+    secret_cache.pop((ctx.keyvault_url, secret_name), None)
 
 
-def get_secret_keyvault(secret_name):
-    kv_url = f'https://ibf-keys.vault.azure.net'
-    az_credential = DefaultAzureCredential(exclude_shared_token_cache_credential=True)
-    kv_secretClient = SecretClient(vault_url=kv_url, credential=az_credential)
-    secret_value = kv_secretClient.get_secret(secret_name).value
-    return secret_value
-
-
-def get_blob_service_client(blob_path, container_name):
-    blobstorage_secrets = get_secret_keyvault('ibf-blobstorage-secrets')
-    blobstorage_secrets = json.loads(blobstorage_secrets)
-    blob_service_client = BlobServiceClient.from_connection_string(blobstorage_secrets['connection_string'])
-    # container = blobstorage_secrets['container']
-    return blob_service_client.get_blob_client(container=container_name, blob=blob_path)
+def get_storage(ctx):
+    '''
+    Function to get the storage backend of the datalake (see storage.py): ctx.storage if set,
+    otherwise the local store if ctx.local_store is set, otherwise Azure Blob Storage.
+    The backend is kept in memory after the first call.
+    '''
+    backend = ctx.storage or ('local' if ctx.local_store else 'blob')
+    if backend == 'memory':
+        key = 'memory'
+        if key not in storage_cache:
+            storage_cache[key] = MemoryStorage()
+    elif backend == 'local':
+        if not ctx.local_store:
+            logging.error('get_storage: local storage requires a local store folder')
+            raise ValueError()
+        key = ctx.local_store
+        if key not in storage_cache:
+            storage_cache[key] = LocalStorage(ctx.local_store)
+    else:
+        blobstorage_secrets = get_secret_keyvault(ctx, 'ibf-blobstorage-secrets')
+        blobstorage_secrets = json.loads(blobstorage_secrets)
+        key = blobstorage_secrets['connection_string']
+        if key not in storage_cache:
+            storage_cache[key] = BlobStorage(key)
+    return storage_cache[key]
 
 
-def basic_data():
+def basic_data(ctx):
     '''
     Function to prepare folders in container and retrieve basic data from datalake to there.
     Data are adm (shp, csv). Folders are for 
@@ -49,53 +128,172 @@ def basic_data():
     logging.info('basic_data: creating folders in container')
 
     # create folders 
-    data_in_path = "./data_in"
+    data_in_path = ctx.data_in_path
     os.makedirs(data_in_path, exist_ok=True)
-    adm_path = "./shp"
+    adm_path = ctx.adm_path
     os.makedirs(adm_path, exist_ok=True)
-    rawchirps_path = "./data_in/chirps_tif"
+    rawchirps_path = ctx.rawchirps_path
     os.makedirs(rawchirps_path, exist_ok=True)
-    rawvci_path = "./data_in/vci_tif"
+    rawvci_path = ctx.rawvci_path
     os.makedirs(rawvci_path, exist_ok=True)
-    model_path = "./model"
+
+    # remove working directories of rasters of past months, keep the month of data to process
+    # and the current month, whose daily CHIRPS are added to the accumulator (get_provisional_chirps())
+    for raw_path in (rawchirps_path, rawvci_path):
+        keep = [os.path.join(raw_path, f'{year}-{month:02}')
+                for year, month in ((ctx.year_data, ctx.month_data), (ctx.year, ctx.month))]
+        evict_workdirs(raw_path, raster_cache_max_age_days, raster_cache_max_bytes, keep)
+    model_path = ctx.model_path
     os.makedirs(model_path, exist_ok=True)
-    data_out_path = './data_out'
+    data_out_path = ctx.data_out_path
     os.makedirs(data_out_path, exist_ok=True)
 
     logging.info('basic_data: retrieving basic data from datalake to folders in container')
 
-    # call admin boundary blobstorage
-    adm_blobstorage_secrets = get_secret_keyvault('admboundary-blobstorage-secrets')
-    adm_blobstorage_secrets = json.loads(adm_blobstorage_secrets)
-    blob_service_client = BlobServiceClient.from_connection_string(adm_blobstorage_secrets['connection_string'])
+    # download admin boundaries if changed since the last download: csv of adm1 and adm2, geojson of adm2 only,
+    # the layers of adm1 are rolled up from adm2 (see rollup.py)
+    manifest_path = os.path.join(adm_path, 'manifest.json')
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+
+    csv_changed = False
+    for level in (1, 2):
+        csv_name = ctx.adm_name(level) + '.csv'
+        blob_path = f'Silver/{ctx.country}/' + csv_name
+        adm_csv_path = os.path.join(adm_path, csv_name)
+        csv_changed = sync_data_from_remote(ctx, 'admin-boundaries', blob_path, adm_csv_path, manifest) or csv_changed
+
+    shape_name = ctx.adm_name(2) + '.geojson'
+    blob_path = f'Bronze/{ctx.country}/{ctx.adm_name(2)}/' + shape_name
+    adm_shp_path = os.path.join(adm_path, shape_name)
+    shape_changed = sync_data_from_remote(ctx, 'admin-boundaries', blob_path, adm_shp_path, manifest)
+
+    # compile geojson into the binary geometry cache
+    cache_path = geometry_cache_path(ctx, 2)
+    if shape_changed or not os.path.isfile(cache_path):
+        logging.info('basic_data: compiling geometry cache of adm2')
+        compile_geometry_cache(adm_shp_path, cache_path)
+        shape_changed = True
+
+    # a warm process keeps the admin boundaries loaded by a previous run only if nothing was downloaded
+    if csv_changed or shape_changed:
+        for key in [key for key in admin_cache if key[:2] == (adm_path, ctx.country)]:
+            del admin_cache[key]
+    else:
+        logging.info('basic_data: admin boundaries not changed')
 
-    # load adm1 country shapefile
-    shape_name = 'zwe_admbnda_adm1_zimstat_ocha_20180911.geojson'
-    blob_path = 'Bronze/zwe/zwe_admbnda_adm1_zimstat_ocha_20180911/' + shape_name
-    adm1_shp_path = os.path.join(adm_path, shape_name)
-    download_data_from_remote('admin-boundaries', blob_path, adm1_shp_path)
-    
-    # load country csv file
-    csv_name = 'zwe_admbnda_adm1_zimstat_ocha_20180911.csv'
-    blob_path = 'Silver/zwe/' + csv_name
-    adm1_csv_path = os.path.join(adm_path, csv_name)
-    download_data_from_remote('admin-boundaries', blob_path, adm1_csv_path)
-
-    # load adm2 country shapefile
-    shape_name = 'zwe_admbnda_adm2_zimstat_ocha_20180911.geojson'
-    blob_path = 'Bronze/zwe/zwe_admbnda_adm2_zimstat_ocha_20180911/' + shape_name
-    adm2_shp_path = os.path.join(adm_path, 'zwe_admbnda_adm2_zimstat_ocha_20180911.geojson')
-    download_data_from_remote('admin-boundaries', blob_path, adm2_shp_path)
-    
-    # load adm2 country csv file
-    csv_name = 'zwe_admbnda_adm2_zimstat_ocha_20180911.csv'
-    blob_path = 'Silver/zwe/' + csv_name
-    adm2_csv_path = os.path.join(adm_path, csv_name)
-    download_data_from_remote('admin-boundaries', blob_path, adm2_csv_path)
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    get_admin_geometries(ctx, 2)
 
     logging.info('basic_data: done')
 
 
+def get_admin_geometries(ctx, level):
+    '''
+    Function to load the admin boundaries of a level from the binary geometry cache (see boundaries.py).
+    The geometries are kept in memory and passed to zonal_stats() instead of the GeoJSON file.
+    '''
+    key = (ctx.adm_path, ctx.country, level)
+    if key not in admin_cache:
+        admin_cache[key] = load_geometry_cache(geometry_cache_path(ctx, level))
+    return admin_cache[key]
+
+
+def geometry_cache_path(ctx, level):
+    return os.path.join(ctx.adm_path, ctx.adm_name(level) + '.geometries.pkl')
+
+
+def get_admin_hierarchy(ctx):
+    '''
+    Function to load the roll-up matrices of the PCODE hierarchy of the admin levels (columns ADM<level>_PCODE
+    of the adm2 csv, see rollup.py) and the areas of the districts in the order of the adm2 csv,
+    matched by the ADM2_PCODE of the admin boundaries. Both are kept in memory with the admin boundaries.
+    '''
+    key = (ctx.adm_path, ctx.country, 'hierarchy')
+    if key not in admin_cache:
+        df_adm = pd.read_csv(os.path.join(ctx.adm_path, ctx.adm_name(2) + '.csv'))
+        rollup = rollup_matrices(df_adm)
+        boundaries = get_admin_geometries(ctx, 2)
+        areas = pd.Series(boundaries['areas'],
+                          index=[properties.get('ADM2_PCODE') for properties in boundaries['properties']])
+        areas = areas[~areas.index.duplicated()].reindex(rollup[1])
+        if areas.isna().any():
+            logging.error(f'get_admin_hierarchy: no admin boundary of {list(areas.index[areas.isna()])}')
+            raise ValueError()
+        admin_cache[key] = (rollup, areas.to_numpy())
+    return admin_cache[key]
+
+
+def save_admin_rollup(ctx, source, df_processed):
+    '''
+    Function to roll up the monthly layers of a source per district (ADM2_PCODE) to every coarser admin level
+    of the admin hierarchy, as area-weighted means, and save them in the datalake.
+    The layers of all levels come from the zonal statistics of the districts, no other zonal statistics are run.
+    '''
+    rollup, areas = get_admin_hierarchy(ctx)
+    rolled = roll_up(df_processed, rollup, 'area_mean', weights=areas)
+    month = ctx.today.strftime('%Y-%m')
+    for level, df_level in rolled.items():
+        if level == 2:
+            continue
+        rollup_filename = f'{source}_adm{level}_{month}.csv'
+        rollup_file_path = os.path.join(ctx.data_in_path, rollup_filename)
+        df_level.to_csv(rollup_file_path, index=False)
+        blob_path = f'drought/Silver/{ctx.country}/{source}/adm{level}/{source}_{month}.csv'
+        save_data_to_remote(ctx, rollup_file_path, blob_path, ctx.container)
+    logging.info(f'save_admin_rollup: {source} rolled up to adm{", adm".join(str(level) for level in rolled if level != 2)}')
+
+
+def get_model(ctx, blob_path):
+    '''
+    Function to download a trained XGBoost model from datalake and load it:
+    compiled into arrays (see inference.py) or as XGBClassifier, depending on ctx.inference.
+    The model is kept in memory after the first call, until the ETag of its blob changes.
+    '''
+    key = (ctx.inference, blob_path)
+    storage = get_storage(ctx)
+    with busy('network'):
+        etag = storage.properties(ctx.container, blob_path)['etag']
+    if key not in model_cache or model_cache[key][0] != etag:
+        with busy('network'):
+            model_json = storage.read_bytes(ctx.container, blob_path)
+        if ctx.inference == 'compiled':
+            model = compile_model(model_json)
+        else:
+            from xgboost import XGBClassifier
+            model = XGBClassifier()
+            model.load_model(bytearray(model_json))
+        model_cache[key] = (etag, model)
+    return model_cache[key][1]
+
+
+@record('cpu')
+def predict(ctx, model, x):
+    '''
+    Function to predict the class of every row of a feature matrix (see feature_matrix() in inference.py)
+    with a model of get_model().
+    '''
+    if ctx.inference == 'compiled':
+        return predict_classes(model, x)
+    return model.predict(x)
+
+
+def cache_state():
+    '''
+    Function to report what a warm process holds in memory.
+    '''
+    return {'secrets': len(secret_cache),
+            'storage_backends': len(storage_cache),
+            'admin_boundaries': sorted(f'{country}_adm{level}' for _, country, level in admin_cache),
+            'models': sorted(os.path.basename(blob_path) for _, blob_path in model_cache),
+            'exposure': sorted(exposure_cache)}
+
+
+@record('network')
 def access_enso(url):
     '''
     Function to access and get ENSO data.
@@ -128,7 +326,7 @@ def access_enso(url):
     return(page)
 
 
-def get_new_enso():
+def get_new_enso(ctx):
     '''
     Function to download and extract latest ENSO data.
     Defending on the month of execution (lead time), the function will extract data of corresponding month(s).
@@ -137,22 +335,22 @@ def get_new_enso():
     # today = datetime.date.today()
 
     # folder
-    data_in_path = "./data_in"
+    data_in_path = ctx.data_in_path
 
-    enso_filename = 'enso_' + today.strftime("%Y-%m") + '.csv'
+    enso_filename = 'enso_' + ctx.today.strftime("%Y-%m") + '.csv'
     enso_file_path = os.path.join(data_in_path, enso_filename)
     
     # call ibf blobstorage
-    blob_path = 'drought/Silver/zwe/enso/'+ enso_filename
+    blob_path = f'drought/Silver/{ctx.country}/enso/'+ enso_filename
 
     # read new enso data
     logging.info('get_new_enso: downloading new ENSO dataset')
-    page = access_enso(enso_url)
+    page = access_enso(ctx.enso_url)
     df = pd.read_csv(io.StringIO(page), delim_whitespace=True)
-    if month == 1:
-        year_enso = year + 1
+    if ctx.month == 1:
+        year_enso = ctx.year + 1
     else:
-        year_enso = year
+        year_enso = ctx.year
     df['YR'] = df['YR'].shift(-1).fillna(year_enso)
 
     df1 = df.copy()
@@ -169,132 +367,132 @@ def get_new_enso():
 
     # pick and arrange enso data
     logging.info('get_new_enso: extracting ENSO of corressponding month(s)')
-    if month == 9: # lead time 7 month
+    if ctx.month == 9: # lead time 7 month
         if (df.tail(1)['SEAS'] == 'JJA').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(['YR', 'index',
                                     'JAS', 'ASO', 'SON', 'OND', 'NDJ', 'DJF', 'JFM'], axis=1)
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
 
-    elif month == 10: # lead time 6 month
+    elif ctx.month == 10: # lead time 6 month
         if (df.tail(1)['SEAS'] == 'JAS').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(columns=['YR', 'index',
                                         'ASO', 'SON', 'OND', 'NDJ', 'DJF', 'JFM'], axis=1)
             # df_enso = df_enso[df_enso['Year']==year].drop(columns='Year')
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
     
-    elif month == 11: # lead time 5 month
+    elif ctx.month == 11: # lead time 5 month
         if (df.tail(1)['SEAS'] == 'ASO').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(columns=['YR', 'index',
                                         'SON', 'OND', 'NDJ', 'DJF', 'JFM'], axis=1)
             # df_enso = df_enso[df_enso['Year']==year].drop(columns='Year')
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
 
-    elif month == 12: # lead time 4 month
+    elif ctx.month == 12: # lead time 4 month
         if (df.tail(1)['SEAS'] == 'SON').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(columns=['YR', 'index',
                                         'OND', 'NDJ', 'DJF', 'JFM'], axis=1)
             # df_enso = df_enso[df_enso['Year']==year].drop(columns='Year')
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
 
-    elif month == 1: # lead time 3 month
+    elif ctx.month == 1: # lead time 3 month
         if (df.tail(1)['SEAS'] == 'OND').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(columns=['YR', 'index',
                                         'NDJ', 'DJF', 'JFM'], axis=1)
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
 
-    elif month == 2: # lead time 2 month
+    elif ctx.month == 2: # lead time 2 month
         if (df.tail(1)['SEAS'] == 'NDJ').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(columns=['YR', 'index',
                                         'DJF', 'JFM'], axis=1)
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
 
-    elif month == 3: # lead time 1 month
+    elif ctx.month == 3: # lead time 1 month
         if (df.tail(1)['SEAS'] == 'DJF').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(columns=['YR', 'index',
                                         'JFM'], axis=1)
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
 
-    elif month == 4: # lead time
+    elif ctx.month == 4: # lead time
         if (df.tail(1)['SEAS'] == 'JFM').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(columns=['YR', 'index'], axis=1)
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
 
-    elif month == 5: # lead time
+    elif ctx.month == 5: # lead time
         if (df.tail(1)['SEAS'] == 'FMA').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(columns=['YR', 'index'], axis=1)
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
     
-    elif month == 6: # lead time
+    elif ctx.month == 6: # lead time
         if (df.tail(1)['SEAS'] == 'MAM').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(columns=['YR', 'index'], axis=1)
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
     
-    elif month == 7: # lead time
+    elif ctx.month == 7: # lead time
         if (df.tail(1)['SEAS'] == 'AMJ').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(columns=['YR', 'index'], axis=1)
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
     
-    elif month == 8: # lead time
+    elif ctx.month == 8: # lead time
         if (df.tail(1)['SEAS'] == 'MJJ').values:
             df_enso = df1.tail(1).reset_index()
             df_enso = df_enso.drop(columns=['YR', 'index'], axis=1)
             df_enso.to_csv(enso_file_path, index=False)
-            save_data_to_remote(enso_file_path, blob_path, 'ibf')
+            save_data_to_remote(ctx, enso_file_path, blob_path, ctx.container)
         else:
             logging.error('ENSO data not updated')
             raise ValueError()
@@ -303,6 +501,7 @@ def get_new_enso():
     # return df_enso
 
 
+@record('network')
 def access_chirps(url):
     
     logging.info('access_chirps: accessing CHIRPS data source')
@@ -327,12 +526,57 @@ def access_chirps(url):
                       str(timeToTryAccess / 3600) + ' hours')
         raise ValueError()
     
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(page, 'html.parser')
 
     return [url + node.get('href') for node in soup.find_all('a') if node.get('href')]
 
 
-def get_new_chirps():
+def chirps_downloads(ctx, year_data, month_data, start_date=None):
+    '''
+    Function to list the daily CHIRPS files of a month which are not downloaded yet,
+    from start_date on if given (e.g. the day after the last day of the accumulator).
+    Returns the index of the downloaded files by date and the list of (date, url, local path) to download.
+    '''
+    chirps_url1 = ctx.chirps_url + str(year_data) + '/'
+    urls = access_chirps(chirps_url1)#[1:]
+    file_urls = sorted([i for i in urls if i.split('/')[-1].startswith(f'chirps-v2.0.{year_data}.{month_data:02d}')])
+    if not file_urls:
+        logging.error('CHIRPS data not updated')
+        raise ValueError()
+
+    workdir = month_workdir(ctx.rawchirps_path, year_data, month_data)
+    raster_index = index_rasters(workdir, parse_chirps_date)
+    downloads = []
+    for file_url in file_urls:
+        filename = file_url.split('/')[-1]
+        date = parse_chirps_date(filename)
+        if date is None or date in raster_index or (start_date is not None and date < start_date):
+            continue
+        downloads.append((date, file_url, os.path.join(workdir, filename)))
+
+    return raster_index, downloads
+
+
+def download_chirps_month(ctx, year_data, month_data, start_date=None):
+    '''
+    Function to download the daily CHIRPS files of a month which are not downloaded yet
+    (from start_date on if given) into the working directory of the month, and archive the original compressed files.
+    Returns the index of the downloaded files by date.
+    '''
+    raster_index, downloads = chirps_downloads(ctx, year_data, month_data, start_date)
+    for date, file_url, file_path in downloads:
+        data_gz = fetch_data(file_url)
+        raster_index[date] = file_path
+        with open(file_path, 'wb') as raster_file:
+            raster_file.write(data_gz)
+        blob_path = 'drought/Bronze/chirps/new_download/' + os.path.basename(file_path)
+        save_bytes_to_remote(ctx, data_gz, blob_path, ctx.container)
+
+    return raster_index
+
+
+def get_new_chirps(ctx):
     '''
     Function to download raw daily CHIPRS data
     and return monthly cumulative per adm2
@@ -341,66 +585,125 @@ def get_new_chirps():
     # today = datetime.date.today()
     
     # folders 
-    data_in_path = "./data_in"
-    adm_path = "./shp"
-    rawchirps_path = "./data_in/chirps_tif"
+    data_in_path = ctx.data_in_path
+    adm_path = ctx.adm_path
 
     # load country file path
-    adm_shp_path = os.path.join(adm_path, 'zwe_admbnda_adm2_zimstat_ocha_20180911.geojson')
-    adm_csv_path = os.path.join(adm_path, 'zwe_admbnda_adm2_zimstat_ocha_20180911.csv')
+    adm_csv_path = os.path.join(adm_path, ctx.adm_name(2) + '.csv')
     
     df_chirps_raw = pd.read_csv(adm_csv_path)[['ADM2_PCODE']]
 
-    # access CHIRPS data source
-    logging.info('get_new_chirps: downloading new CHIRPS dataset')
-    
-    if month == 1:
-        year_data = year - 1 
-        month_data = 12
-    else:
-        year_data = year
-        month_data = month - 1
-    days = np.arange(1, calendar.monthrange(year_data, month_data)[1]+1, 1)
-        
-    chirps_url1 = chirps_url + str(year_data) + '/'
-    urls = access_chirps(chirps_url1)#[1:]
-    file_urls = sorted([i for i in urls if i.split('/')[-1].startswith(f'chirps-v2.0.{year_data}.{month_data:02d}')], reverse=True)
-    if not file_urls:
-        logging.error('CHIRPS data not updated')
-    
-    filename_list = [i.split('/')[-1] for i in file_urls]
-    
-    # download new CHIRPS data
-    for i in np.arange(0,len(filename_list)):
-        wget_download(file_urls[i], rawchirps_path,filename_list[i])
-        batch_unzip = "gzip -d -f %s" %(filename_list[i])
-        subprocess.call(batch_unzip, cwd=rawchirps_path, shell=True)
-        rawdata_file_path = os.path.join(rawchirps_path, filename_list[i].replace('.gz', ''))
-        blob_path = 'drought/Bronze/chirps/new_download/' + filename_list[i].replace('.gz', '')
-        save_data_to_remote(rawdata_file_path, blob_path, 'ibf')
-
-    filename_list = sorted(glob.glob(rawchirps_path + '/*.tif'), reverse=False)
-    i = 0
-    for filename in filename_list:
-        # raster_path = os.path.abspath(os.path.join(rawchirps_path, filename))
-        mean = zonal_stats(adm_shp_path, filename, stats='mean', nodata=-9999)
-        df_chirps_raw[f'{days[i]:02d}'] = pd.DataFrame(data=mean)['mean']
-        i += 1
-    
-    # calculate monthly cumulative
-    logging.info('get_new_chirps: calculating monthly cumulative rainfall')
-    df_chirps = cumulative_and_dryspell(df_chirps_raw, 'ADM2_PCODE', month_data)
+    year_data, month_data = ctx.year_data, ctx.month_data
 
-    processeddata_filename = 'chirps_' + today.strftime("%Y-%m") + '.csv'
+    if ctx.chirps_incremental:
+        # the accumulator is updated daily by get_provisional_chirps(), add the last days and finalize
+        logging.info('get_new_chirps: finalizing CHIRPS accumulator')
+        df_acc = update_chirps_accumulator(ctx, year_data, month_data)
+        missing_days = calendar.monthrange(year_data, month_data)[1] - df_acc['n_days'].iloc[0]
+        if missing_days:
+            logging.warning(f'get_new_chirps: CHIRPS of {missing_days} days not available')
+        df_chirps = finalize_accumulator(df_acc, month_data)
+        if ctx.gridded_output:
+            logging.info('get_new_chirps: gridded output is not calculated in incremental mode')
+
+    else:
+        # access CHIRPS data source
+        logging.info('get_new_chirps: downloading new CHIRPS dataset')
+        raster_index = download_chirps_month(ctx, year_data, month_data)
+
+        missing_days = [f'{day:02d}' for day in range(1, calendar.monthrange(year_data, month_data)[1] + 1)
+                        if datetime.date(year_data, month_data, day) not in raster_index]
+        if missing_days:
+            logging.warning(f'get_new_chirps: CHIRPS of days {", ".join(missing_days)} not available')
+
+        # average rainfall per adm2, in order of date, distributed over the workers
+        dates = sorted(raster_index)
+        means, gridded = zonal_means([raster_index[date] for date in dates], geometry_cache_path(ctx, 2),
+                                     ctx.workers, keep_arrays=ctx.gridded_output, cache=ctx.zonal_cache)
+        df_chirps_raw = pd.concat([df_chirps_raw, pd.DataFrame(means.T.reshape(len(df_chirps_raw), len(dates)),
+                                   columns=[f'{date.day:02d}' for date in dates])], axis=1)
+
+        # per-pixel rainfall and dryspell from the same rasters
+        if ctx.gridded_output and dates:
+            arrays, transform, crs = gridded
+            write_gridded_output(ctx, 'chirps', np.stack(arrays), transform, crs, year_data, month_data)
+
+        # calculate monthly cumulative
+        logging.info('get_new_chirps: calculating monthly cumulative rainfall')
+        df_chirps = cumulative_and_dryspell(df_chirps_raw, 'ADM2_PCODE', month_data)
+
+    processeddata_filename = 'chirps_' + ctx.today.strftime("%Y-%m") + '.csv'
     processeddata_file_path = os.path.join(data_in_path, processeddata_filename)
     df_chirps.to_csv(processeddata_file_path, index=False)
-    blob_path = 'drought/Silver/zwe/chirps/' + processeddata_filename
-    save_data_to_remote(processeddata_file_path, blob_path, 'ibf')
+    blob_path = f'drought/Silver/{ctx.country}/chirps/' + processeddata_filename
+    save_data_to_remote(ctx, processeddata_file_path, blob_path, ctx.container)
+    update_feature_store(ctx, 'chirps', df_chirps, year_data, month_data)
+    save_admin_rollup(ctx, 'chirps', df_chirps)
 
     logging.info('get_new_chirps: done')
     # return df_chirps
 
 
+def update_chirps_accumulator(ctx, year_data, month_data):
+    '''
+    Function to add the daily CHIRPS of a month which became available since the last update
+    to the accumulator of the month (see accumulator.py). The accumulator is kept in the datalake between runs.
+    Days are added in order, up to the first day which is not available yet.
+    '''
+    blob_path = f'drought/Silver/{ctx.country}/chirps/accumulator/chirps_accumulator_{year_data}-{month_data:02}.csv'
+    try:
+        df_acc = read_dataframe_from_remote(ctx, ctx.container, blob_path, dtype={'last_date': str},
+                                            keep_default_na=False,
+                                            na_values={column: [''] for column in window_columns})
+    except FileNotFoundError:
+        adm_csv_path = os.path.join(ctx.adm_path, ctx.adm_name(2) + '.csv')
+        df_acc = new_accumulator(pd.read_csv(adm_csv_path)['ADM2_PCODE'])
+
+    if df_acc['n_days'].iloc[0] > 0:
+        date = datetime.date.fromisoformat(df_acc['last_date'].iloc[0]) + datetime.timedelta(days=1)
+    else:
+        date = datetime.date(year_data, month_data, 1)
+
+    # only the days after the last day of the accumulator, the days before are already in it
+    raster_index = download_chirps_month(ctx, year_data, month_data, start_date=date)
+    dates = []
+    while date in raster_index:
+        dates.append(date)
+        date += datetime.timedelta(days=1)
+    means, _ = zonal_means([raster_index[date] for date in dates], geometry_cache_path(ctx, 2), ctx.workers,
+                          cache=ctx.zonal_cache)
+    for date, mean in zip(dates, means):
+        df_acc = update_accumulator(df_acc, mean, date)
+    logging.info(f'update_chirps_accumulator: {len(dates)} days added')
+
+    save_dataframe_to_remote(ctx, df_acc, blob_path, ctx.container)
+
+    return df_acc
+
+
+def get_provisional_chirps(ctx):
+    '''
+    Function to update the CHIRPS accumulator of the month of execution with the days available so far,
+    and save the provisional cumulative rainfall and dryspell per adm2 in the datalake.
+    To be run daily in incremental mode, so that get_new_chirps() only finalizes the month.
+    '''
+    logging.info('get_provisional_chirps: updating CHIRPS accumulator')
+
+    df_acc = update_chirps_accumulator(ctx, ctx.year, ctx.month)
+    df_provisional = finalize_accumulator(df_acc, ctx.month)
+    df_provisional['n_days'] = df_acc['n_days']
+
+    provisional_filename = f'chirps_provisional_{ctx.year}-{ctx.month:02}.csv'
+    provisional_file_path = os.path.join(ctx.data_in_path, provisional_filename)
+    df_provisional.to_csv(provisional_file_path, index=False)
+    blob_path = f'drought/Silver/{ctx.country}/chirps/provisional/' + provisional_filename
+    save_data_to_remote(ctx, provisional_file_path, blob_path, ctx.container)
+
+    logging.info('get_provisional_chirps: done')
+    return df_provisional
+
+
+@record('network')
 def access_vci(url):
     '''
     Function to access and get VCI data.
@@ -431,79 +734,132 @@ def access_vci(url):
                       str(timeToTryAccess / 3600) + ' hours')
         raise ValueError()
     
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(page, 'html.parser')
 
     return [url + node.get('href') for node in soup.find_all('a') if node.get('href')]
 
 
-def get_new_vci():
+def vci_downloads(ctx, weeks, weeks_stored):
+    '''
+    Function to list the weekly VCI files of the month of data which have to be downloaded:
+    weeks which are not in the weekly VCI store (all weeks for gridded output) and not downloaded yet.
+    Returns the index of the downloaded files by (ISO year, week) and the list of (week, url, local path).
     '''
-    Function to download raw daily VCI data
-    and return monthly average per adm2
+    workdir = month_workdir(ctx.rawvci_path, ctx.year_data, ctx.month_data)
+    raster_index = index_rasters(workdir, parse_vci_week)
+    downloads = []
+    for iso_year, week in weeks:
+        if (iso_year, week) in raster_index or ((iso_year, week) in weeks_stored and not ctx.gridded_output):
+            continue
+        filename = vci_filename(iso_year, week)
+        downloads.append(((iso_year, week), ctx.vci_url + filename, os.path.join(workdir, filename)))
+
+    return raster_index, downloads
+
+
+def get_new_vci(ctx):
+    '''
+    Function to download raw weekly VCI data
+    and return monthly average per adm2.
+    The average VCI per adm2 of every week is kept in the weekly VCI store,
+    so that a week overlapping two months is downloaded and processed once.
     '''
     # folders 
-    data_in_path = "./data_in"
-    adm_path = "./shp"
-    rawvci_path = "./data_in/vci_tif"
+    data_in_path = ctx.data_in_path
+    adm_path = ctx.adm_path
 
     # load country file path
-    adm_shp_path = os.path.join(adm_path, 'zwe_admbnda_adm2_zimstat_ocha_20180911.geojson')
-    adm_csv_path = os.path.join(adm_path, 'zwe_admbnda_adm2_zimstat_ocha_20180911.csv')
-    
-    df_vci = pd.read_csv(adm_csv_path)[['ADM2_PCODE']]
+    adm_csv_path = os.path.join(adm_path, ctx.adm_name(2) + '.csv')
+    pcodes = pd.read_csv(adm_csv_path)['ADM2_PCODE']
 
-    if month == 1:
-        year_data = year - 1 
-        month_data = 12
-    else:
-        year_data = year
-        month_data = month - 1
-    week_numbers = list_week_number(year_data, month_data)
+    year_data, month_data = ctx.year_data, ctx.month_data
+    weeks = list_iso_weeks(year_data, month_data)
+    df_store = get_vci_week_store(ctx)
+    weeks_stored = stored_weeks(df_store)
 
     logging.info('get_new_vci: downloading new VCI dataset')
 
-    file_urls = []
-    filename_list = []
-    filepath_list = []
-    for week_number in week_numbers:
-        # # specify file name and its url
-        # if week_number-min(week_numbers) >= 50:
-        #     year_data_vci = year - 1
-        # else:
-        #     year_data_vci = year_data
-        filename = f'VHP.G04.C07.j01.P{year_data}{week_number:03d}.VH.VCI.tif'
-        filepath_local = os.path.join(rawvci_path, filename)
-        file_url = vci_url + filename
-        file_urls.append(file_url)
-        filename_list.append(filename)
-        filepath_list.append(filepath_local)
-
-        # download file
-        wget_download(file_url, rawvci_path, filename)
-    
-    for week_number, filename, filepath_local in zip(week_numbers, filename_list, filepath_list):
-        blob_path = 'drought/Bronze/vci/' + filename
-        save_data_to_remote(filepath_local, blob_path, 'ibf')
-
-        # calculate average vci per admin
-        mean = zonal_stats(adm_shp_path, filepath_local, stats='mean', nodata=-9999)
-        df_vci[f'{week_number:02d}'] = pd.DataFrame(data=mean)['mean']
-
-    # calculate montly mean
-    df_vci[f'{month_data:02}_vci'] = df_vci.loc[:,f"{week_numbers[0]:02d}":f"{week_numbers[-1]:02d}"].mean(axis=1)
-    df_vci = df_vci[['ADM2_PCODE', f'{month_data:02}_vci']]
+    # download the weeks which are not in the store (all weeks for gridded output)
+    # into the working directory of the month
+    raster_index, downloads = vci_downloads(ctx, weeks, weeks_stored)
+    for week, file_url, file_path in downloads:
+        workdir, filename = os.path.split(file_path)
+        wget_download(file_url, workdir, filename)
+        if os.path.isfile(file_path):
+            raster_index[week] = file_path
+            blob_path = 'drought/Bronze/vci/' + filename
+            save_data_to_remote(ctx, file_path, blob_path, ctx.container)
+
+    # calculate average vci per admin of the new weeks, distributed over the workers
+    new_weeks = []
+    for iso_year, week in weeks:
+        if (iso_year, week) in weeks_stored:
+            continue
+        if (iso_year, week) not in raster_index:
+            logging.warning(f'get_new_vci: VCI of week {week} of {iso_year} not available')
+            continue
+        new_weeks.append((iso_year, week))
+    means, _ = zonal_means([raster_index[week] for week in new_weeks], geometry_cache_path(ctx, 2), ctx.workers,
+                          cache=ctx.zonal_cache)
+    for (iso_year, week), mean in zip(new_weeks, means):
+        df_store = append_week(df_store, pcodes, mean, iso_year, week)
+        weeks_stored.add((iso_year, week))
+    if not weeks_stored.intersection(weeks):
+        logging.error('VCI data not updated')
+        raise ValueError()
+    save_vci_week_store(ctx, df_store)
+
+    # per-pixel vci from the same rasters
+    filepath_list = [raster_index[week] for week in weeks if week in raster_index]
+    if ctx.gridded_output and filepath_list:
+        bounds = get_admin_geometries(ctx, 2)['total_bounds']
+        arrays = [read_clipped(filepath_local, bounds) for filepath_local in filepath_list]
+        transform, crs = arrays[0][1], arrays[0][2]
+        stack = np.stack([array for array, _, _ in arrays])
+        write_gridded_output(ctx, 'vci', stack, transform, crs, year_data, month_data)
+
+    # calculate montly mean, weighted by the days of the month in each week
+    df_vci = pd.DataFrame({'ADM2_PCODE': pcodes}).merge(
+        monthly_vci(df_store, weeks, month_data), on='ADM2_PCODE', how='left')
     
-    processeddata_filename = 'vci_' + today.strftime("%Y-%m") + '.csv'
+    processeddata_filename = 'vci_' + ctx.today.strftime("%Y-%m") + '.csv'
     processeddata_file_path = os.path.join(data_in_path, processeddata_filename)
     df_vci.to_csv(processeddata_file_path, index=False)
-    blob_path = 'drought/Silver/zwe/vci/' + processeddata_filename
-    save_data_to_remote(processeddata_file_path, blob_path, 'ibf')
+    blob_path = f'drought/Silver/{ctx.country}/vci/' + processeddata_filename
+    save_data_to_remote(ctx, processeddata_file_path, blob_path, ctx.container)
+    update_feature_store(ctx, 'vci', df_vci, year_data, month_data)
+    save_admin_rollup(ctx, 'vci', df_vci)
 
     logging.info('get_new_vci: done')
     # return df_vci
 
 
-def arrange_data():
+def write_gridded_output(ctx, source, stack, transform, crs, year_data, month_data):
+    '''
+    Function to calculate gridded output of a month from a stack of rasters (time, row, column)
+    clipped to the country: cumulative rainfall and dryspell days per pixel for chirps,
+    average VCI per pixel for vci.
+    The output is a tiled, compressed GeoTIFF saved in the datalake.
+    '''
+    logging.info(f'write_gridded_output: calculating gridded {source}')
+
+    if source == 'chirps':
+        p_cumul, dryspell = cumulative_and_dryspell_grid(stack)
+        bands = {'p_cumul': p_cumul, 'dryspell': dryspell}
+    else:
+        bands = {'vci': mean_grid(stack)}
+
+    grid_filename = f'{source}_{year_data}-{month_data:02}.tif'
+    grid_file_path = os.path.join(ctx.data_out_path, grid_filename)
+    write_grid(grid_file_path, bands, transform, crs)
+    blob_path = f'drought/Gold/{ctx.country}/grid/' + grid_filename
+    save_data_to_remote(ctx, grid_file_path, blob_path, ctx.container)
+
+    logging.info('write_gridded_output: done')
+
+
+def arrange_data(ctx):
     '''
     Function to arrange ENSO, CHIRPS and VCI data depending on the month.
     This is only for forecast_model2() and forecast_model3().
@@ -512,138 +868,55 @@ def arrange_data():
     # today = datetime.date.today()
 
     # folder of processed data csv
-    data_in_path = "./data_in"
-    adm_path = "./shp"
-    
-    # desired order of columns
-    cols_order = ['ADM1_PCODE', 'ADM2_PCODE',\
-        'JAS', 'ASO', 'SON', 'OND', 'NDJ', 'DJF', 'JFM', \
-        '09_p_cumul', '10_p_cumul', '11_p_cumul', '12_p_cumul', \
-        '01_p_cumul', '02_p_cumul', '03_p_cumul', \
-        '09_dryspell', '10_dryspell', '11_dryspell', '12_dryspell', \
-        '01_dryspell', '02_dryspell', '03_dryspell', \
-        '09_vci', '10_vci', '11_vci', '12_vci', \
-        '01_vci', '02_vci', '03_vci', \
-        'p_cumul', 'vci_avg'] 
+    data_in_path = ctx.data_in_path
+    adm_path = ctx.adm_path
 
     # specify processed data file name
-    input_filename = 'data_' + today.strftime("%Y-%m") + '.csv'
+    input_filename = 'data_' + ctx.today.strftime("%Y-%m") + '.csv'
     input_file_path = os.path.join(data_in_path, input_filename)
 
     # load country file path
-    adm_csv_path = os.path.join(adm_path, 'zwe_admbnda_adm2_zimstat_ocha_20180911.csv')
+    adm_csv_path = os.path.join(adm_path, ctx.adm_name(2) + '.csv')
     df_adm = pd.read_csv(adm_csv_path)[['ADM1_PCODE', 'ADM2_PCODE']]
 
     # load enso data
-    enso_filename = 'enso_' + today.strftime("%Y-%m") + '.csv'
+    enso_filename = 'enso_' + ctx.today.strftime("%Y-%m") + '.csv'
     enso_file_path = os.path.join(data_in_path, enso_filename)
     df_enso = pd.read_csv(enso_file_path)#.drop(columns='Unnamed: 0')#, sep=' ')
     df_data = df_adm.merge(df_enso, how='cross')
 
     logging.info('arrange_data: arranging ENSO and CHIRPS datasets for the model')
 
-    # load relevant month(s) chirps and vci data, and append to the big dataframe
-    if month == 11:
-        month_data = 10
-        this_year = today.year
-        df_chirps = get_dataframe_from_remote('chirps', this_year, month_data, data_in_path)
-        df_data = df_data.merge(df_chirps, on='ADM2_PCODE')
-    if month == 12:
-        months_data = (10, 11)
-        years_data =  ((today.year, ) * len(months_data))
-        # this_year = today.year
-        for month_data, year_data in zip(months_data, years_data):
-            df_chirps = get_dataframe_from_remote('chirps', year_data, month_data, data_in_path)
-            df_data = df_data.merge(df_chirps, on='ADM2_PCODE')
-    if month == 1:
-        months_data = (10, 11, 12)
-        years_data = ((today.year-1, ) * len(months_data))
-        for month_data, year_data in zip(months_data, years_data):
-            df_chirps = get_dataframe_from_remote('chirps', year_data, month_data, data_in_path)
-            df_vci = get_dataframe_from_remote('vci', year_data, month_data, data_in_path)
-            df_data = df_data.merge(df_chirps, on='ADM2_PCODE')
-            df_data = df_data.merge(df_vci, on='ADM2_PCODE')
-    if month == 2:
-        months_data = (10, 11, 12, 1)
-        years_data = (today.year-1, today.year-1, today.year-1, today.year)
-        for month_data, year_data in zip(months_data, years_data):
-            df_chirps = get_dataframe_from_remote('chirps', year_data, month_data, data_in_path)
-            df_vci = get_dataframe_from_remote('vci', year_data, month_data, data_in_path)
-            df_data = df_data.merge(df_chirps, on='ADM2_PCODE')
-            df_data = df_data.merge(df_vci, on='ADM2_PCODE')
-    if month == 3:
-        months_data = (10, 11, 12, 1, 2)
-        years_data = (today.year-1, today.year-1, today.year-1, today.year, today.year)
-        for month_data, year_data in zip(months_data, years_data):
-            df_chirps = get_dataframe_from_remote('chirps', year_data, month_data, data_in_path)
-            df_vci = get_dataframe_from_remote('vci', year_data, month_data, data_in_path)
-            df_data = df_data.merge(df_chirps, on='ADM2_PCODE')
-            df_data = df_data.merge(df_vci, on='ADM2_PCODE')
-    if month == 4:
-        month_data = (10, 11, 12, 1, 2, 3)
-        years_data = (today.year-1, today.year-1, today.year-1, today.year, today.year, today.year)
-        for month_data, year_data in zip(months_data, years_data):
-            df_chirps = get_dataframe_from_remote('chirps', year_data, month_data, data_in_path)
-            df_vci = get_dataframe_from_remote('vci', year_data, month_data, data_in_path)
-            df_data = df_data.merge(df_chirps, on='ADM2_PCODE')
-            df_data = df_data.merge(df_vci, on='ADM2_PCODE')
-
-    # load latest chirps data
-    df_chirps = get_dataframe_from_remote('chirps', year, month, data_in_path)
-    df_data = df_data.merge(df_chirps, on='ADM2_PCODE')#.drop(columns=['Unnamed: 0_x', 'Unnamed: 0_y'])
-    if month in months_for_model3:
-        df_vci = get_dataframe_from_remote('vci', year, month, data_in_path)
-        df_data = df_data.merge(df_vci, on='ADM2_PCODE')#.drop(columns=['Unnamed: 0_x', 'Unnamed: 0_y'])
-
-    # add cumulative chirps column, total dryspell, and averaged vci 
-    if month == 11:
-        df_data['p_cumul'] = df_data[['09_p_cumul', '10_p_cumul']].sum(axis=1)
-        # df_data['dryspell'] = df_data[['09_dryspell', '10_dryspell']].sum(axis=1)
-        subfoldername = 'enso+chirps'
-    elif month == 12:
-        df_data['p_cumul'] = df_data[['09_p_cumul', '10_p_cumul', \
-            '11_p_cumul']].sum(axis=1)
-        # df_data['dryspell'] = df_data[['09_dryspell', '10_dryspell', \
-        #     '11_dryspell']].sum(axis=1)
-        subfoldername = 'enso+chirps'
-    elif month == 1:
-        df_data['p_cumul'] = df_data[['09_p_cumul', '10_p_cumul', \
-            '11_p_cumul', '12_p_cumul']].sum(axis=1)
-        # df_data['dryspell'] = df_data[['09_dryspell', '10_dryspell', \
-        #     '11_dryspell', '12_dryspell']].sum(axis=1)
-        df_data['vci_avg'] = df_data[['09_vci', '10_vci', \
-            '11_vci', '12_vci']].sum(axis=1)
-        subfoldername = 'enso+chirps+vci'
-    elif month == 2:
-        df_data['p_cumul'] = df_data[['09_p_cumul', '10_p_cumul', \
-            '11_p_cumul', '12_p_cumul', '01_p_cumul']].sum(axis=1)
-        # df_data['dryspell'] = df_data[['09_dryspell', '10_dryspell', \
-        #     '11_dryspell', '12_dryspell', '01_dryspell']].sum(axis=1)
-        df_data['vci_avg'] = df_data[['09_vci', '10_vci', \
-            '11_vci', '12_vci', '01_vci']].sum(axis=1)
-        subfoldername = 'enso+chirps+vci'
-    elif month == 3:
-        df_data['p_cumul'] = df_data[['09_p_cumul', '10_p_cumul', \
-            '11_p_cumul', '12_p_cumul', '01_p_cumul', '02_p_cumul']].sum(axis=1)
-        # df_data['dryspell'] = df_data[['09_dryspell', '10_dryspell', \
-        #     '11_dryspell', '12_dryspell', '01_dryspell', '02_dryspell']].sum(axis=1)
-        df_data['vci_avg'] = df_data[['09_vci', '10_vci', \
-            '11_vci', '12_vci', '01_vci', '02_vci']].sum(axis=1)
-        subfoldername = 'enso+chirps+vci'
-    elif month == 4:
-        df_data['p_cumul'] = df_data[['09_p_cumul', '10_p_cumul', \
-            '11_p_cumul', '12_p_cumul', '01_p_cumul', '02_p_cumul', '03_p_cumul']].sum(axis=1)
-        # df_data['dryspell'] = df_data[['09_dryspell', '10_dryspell', \
-        #     '11_dryspell', '12_dryspell', '01_dryspell', '02_dryspell', '03_dryspell']].sum(axis=1)
-        df_data['vci_avg'] = df_data[['09_vci', '10_vci', \
-            '11_vci', '12_vci', '01_vci', '02_vci', '03_vci']].sum(axis=1)
+    # slice the season of all relevant variables from the feature store at once
+    if ctx.month in months_for_model3:
+        sources = ['chirps', 'vci']
+        variables = ['p_cumul', 'dryspell', 'vci']
         subfoldername = 'enso+chirps+vci'
+    else:
+        sources = ['chirps']
+        variables = ['p_cumul', 'dryspell']
+        subfoldername = 'enso+chirps'
+    dates = season_dates(ctx.year, ctx.month)
+    df_store = pd.concat([get_feature_store(ctx, source, dates) for source in sources],
+                         ignore_index=True)
+    missing = missing_features(df_store, ctx.year, ctx.month, variables)
+    if missing:
+        logging.error(f'arrange_data: no data in the feature store for {", ".join(missing)}, '
+                      f'fill it with backfill-drought-model --source chirps|vci --from-processed')
+        raise ValueError()
+    df_features = slice_features(df_store, ctx.year, ctx.month, variables)
+    df_data = df_data.merge(df_features, on='ADM2_PCODE')
+
+    # add cumulative chirps column and averaged vci
+    df_data['p_cumul'] = df_data[[col for col in df_data.columns if col.endswith('_p_cumul')]].sum(axis=1)
+    if ctx.month in months_for_model3:
+        df_data['vci_avg'] = df_data[[col for col in df_data.columns if col.endswith('_vci')]].sum(axis=1)
 
     # save data
-    df_data = reorder_columns(df_data, cols_order)
+    df_data = reorder_columns(df_data, input_columns_order)
     df_data.to_csv(input_file_path, index=False)
-    blob_path = f'drought/Silver/zwe/{subfoldername}/{input_filename}'
-    save_data_to_remote(input_file_path, blob_path, 'ibf')
+    blob_path = f'drought/Silver/{ctx.country}/{subfoldername}/{input_filename}'
+    save_data_to_remote(ctx, input_file_path, blob_path, ctx.container)
 
     logging.info('arrange_data: done')
     # return df_data
@@ -652,7 +925,7 @@ def arrange_data():
 # Hey there, cookie?
 
 
-def forecast_model1():
+def forecast_model1(ctx):
     '''
     Function to load trained model 1 (ENSO) and run the forecast with new input data per province.
     An output csv contained PCODE and so-called forecast_severity will be saved in the datalake.
@@ -661,58 +934,58 @@ def forecast_model1():
 
     # today = datetime.date.today()
 
-    data_in_path = "./data_in"
-    adm_path = './shp'
-    model_path = "./model"
-    data_out_path = './data_out'
+    data_in_path = ctx.data_in_path
+    adm_path = ctx.adm_path
+    data_out_path = ctx.data_out_path
 
     # load adm data
-    adm_csv_path = os.path.join(adm_path, 'zwe_admbnda_adm1_zimstat_ocha_20180911.csv')
-    zwe_adm1 = pd.read_csv(adm_csv_path)
+    adm_csv_path = os.path.join(adm_path, ctx.adm_name(1) + '.csv')
+    df_adm1 = pd.read_csv(adm_csv_path)
 
-    regions = np.unique(zwe_adm1['ADM1_PCODE'])
+    regions = np.unique(df_adm1['ADM1_PCODE'])
 
     # load enso data
-    enso_filename = 'enso_' + today.strftime("%Y-%m") + '.csv'
+    enso_filename = 'enso_' + ctx.today.strftime("%Y-%m") + '.csv'
     enso_file_path = os.path.join(data_in_path, enso_filename)
     df_enso = pd.read_csv(enso_file_path)#.drop(columns='Unnamed: 0')#, sep=' ')
 
     # forecast based on crop-yield
     logging.info('forecast_model1: forecasting with model 1 ENSO-only')
     df_pred_provinces = pd.DataFrame()
+    # feature matrix per model schema, shared by the models of the regions
+    matrices = {}
 
     for region in regions:
         df_pred = pd.DataFrame()
         
         # load model
-        model_filename = 'zwe_m1_crop_' + region + '_' + str(leadtime) + '_model.json'
-        blob_path = 'drought/Gold/zwe/model1/' + model_filename
-        model_filepath = os.path.join(model_path, model_filename)
-        download_data_from_remote('ibf', blob_path, model_filepath)
-
-        model = XGBClassifier()
-        model.load_model(model_filepath)
+        model_filename = f'{ctx.country}_m1_crop_' + region + '_' + str(ctx.leadtime) + '_model.json'
+        blob_path = f'drought/Gold/{ctx.country}/model1/' + model_filename
+        model = get_model(ctx, blob_path)
 
         # forecast
-        pred = model.predict(df_enso)
+        schema = tuple(model_schema(model, list(df_enso.columns)))
+        if schema not in matrices:
+            matrices[schema], _ = feature_matrix(df_enso, schema)
+        pred = predict(ctx, model, matrices[schema])
         df_pred['forecast_severity'] = pred
         df_pred['region'] = region
-        df_pred['leadtime'] = leadtime
+        df_pred['leadtime'] = ctx.leadtime
         df_pred_provinces = df_pred_provinces.append(pd.DataFrame(data=df_pred, index=[0]))
 
     # save output locally
-    predict_file_path = os.path.join(data_out_path, f'{year}-{month:02}_zwe_predict.csv')
+    predict_file_path = os.path.join(data_out_path, f'{ctx.year}-{ctx.month:02}_{ctx.country}_predict.csv')
     df_pred_provinces.to_csv(predict_file_path, index=False)
 
     # upload processed output
-    blob_path = f'drought/Gold/zwe/{year}-{month:02}_zwe_predict.csv'
-    save_data_to_remote(predict_file_path, blob_path, 'ibf')
+    blob_path = f'drought/Gold/{ctx.country}/{ctx.year}-{ctx.month:02}_{ctx.country}_predict.csv'
+    save_data_to_remote(ctx, predict_file_path, blob_path, ctx.container)
 
     logging.info('forecast_model1: done')
     # forecast based on impact database: TBD
 
 
-def forecast_model2():
+def forecast_model2(ctx):
     '''
     Function to load trained model 2 (ENSO+CHIRPS) and run the forecast with new input data per province.
     An output csv contained PCODE and so-called forecast_severity will be saved in the datalake.
@@ -721,59 +994,43 @@ def forecast_model2():
 
     # today = datetime.date.today()
 
-    data_in_path = "./data_in"
-    adm_path = './shp'
-    model_path = "./model"
-    data_out_path = './data_out'
-
-    # load adm data
-    adm_csv_path = os.path.join(adm_path, 'zwe_admbnda_adm1_zimstat_ocha_20180911.csv')
-    zwe_adm1 = pd.read_csv(adm_csv_path)
-
-    regions = np.unique(zwe_adm1['ADM1_PCODE'])
+    data_in_path = ctx.data_in_path
+    data_out_path = ctx.data_out_path
 
     # load input data
-    input_filename = 'data_' + today.strftime("%Y-%m") + '.csv'
+    input_filename = 'data_' + ctx.today.strftime("%Y-%m") + '.csv'
     input_file_path = os.path.join(data_in_path, input_filename)
     df_input = pd.read_csv(input_file_path).drop(columns=['ADM2_PCODE'])#, sep=' ')
-    
-    # forecast based on crop-yield
-    logging.info('forecast_model2: forecasting with model 2 ENSO+CHIRPS')
-    df_pred_provinces = pd.DataFrame()
 
-    for region in regions:
-        # df_pred = pd.DataFrame()
-        
-        # load model
-        model_filename = 'zwe_m2_crop_' + str(leadtime) + '_model.json'
-        blob_path = 'drought/Gold/zwe/model2/' + model_filename
-        model_filepath = os.path.join(model_path, model_filename)
-        download_data_from_remote('ibf', blob_path, model_filepath)
+    # load model
+    model_filename = f'{ctx.country}_m2_crop_' + str(ctx.leadtime) + '_model.json'
+    blob_path = f'drought/Gold/{ctx.country}/model2/' + model_filename
+    model = get_model(ctx, blob_path)
 
-        model = XGBClassifier()
-        model.load_model(model_filepath)
-        # forecast
-        df_input_region = df_input[df_input['ADM1_PCODE']==region].drop(columns='ADM1_PCODE')
-        pred = model.predict(df_input_region)
-        pred = max(list(pred))
-        df_pred = {'forecast_severity': pred,
-                   'region': region,
-                   'leadtime': leadtime}
-        df_pred_provinces = df_pred_provinces.append(pd.DataFrame(data=df_pred, index=[0]))
+    # feature matrix of all districts
+    schema = model_schema(model, [column for column in df_input.columns if column != 'ADM1_PCODE'])
+    x, districts_province = feature_matrix(df_input, schema, index_column='ADM1_PCODE')
+    
+    # forecast based on crop-yield: all districts in one call, the most severe district per province
+    logging.info('forecast_model2: forecasting with model 2 ENSO+CHIRPS')
+    regions, severity = province_severity(predict(ctx, model, x), districts_province, 'max')
+    df_pred_provinces = pd.DataFrame({'forecast_severity': severity,
+                                      'region': regions,
+                                      'leadtime': ctx.leadtime})
 
     # save output locally
-    predict_file_path = os.path.join(data_out_path, f'{year}-{month:02}_zwe_predict.csv')
+    predict_file_path = os.path.join(data_out_path, f'{ctx.year}-{ctx.month:02}_{ctx.country}_predict.csv')
     df_pred_provinces.to_csv(predict_file_path, index=False)
 
     # upload processed output
-    blob_path = f'drought/Gold/zwe/{year}-{month:02}_zwe_predict.csv'
-    save_data_to_remote(predict_file_path, blob_path, 'ibf')
+    blob_path = f'drought/Gold/{ctx.country}/{ctx.year}-{ctx.month:02}_{ctx.country}_predict.csv'
+    save_data_to_remote(ctx, predict_file_path, blob_path, ctx.container)
 
     logging.info('forecast_model2: done')
     # forecast based on impact database: TBD
 
 
-def forecast_model3():
+def forecast_model3(ctx):
     '''
     Function to load trained model 3 (ENSO+CHIRPS+DrySpell+VCI) and run the forecast with new input data per province.
     An output csv contained PCODE and so-called forecast_severity will be saved in the datalake.
@@ -782,117 +1039,243 @@ def forecast_model3():
 
     # today = datetime.date.today()
 
-    data_in_path = "./data_in"
-    adm_path = './shp'
-    model_path = "./model"
-    data_out_path = './data_out'
-
-    # load adm data
-    adm_csv_path = os.path.join(adm_path, 'zwe_admbnda_adm1_zimstat_ocha_20180911.csv')
-    zwe_adm1 = pd.read_csv(adm_csv_path)
-
-    regions = np.unique(zwe_adm1['ADM1_PCODE'])
+    data_in_path = ctx.data_in_path
+    data_out_path = ctx.data_out_path
 
     # load input data
-    input_filename = 'data_' + today.strftime("%Y-%m") + '.csv'
+    input_filename = 'data_' + ctx.today.strftime("%Y-%m") + '.csv'
     input_file_path = os.path.join(data_in_path, input_filename)
     df_input = pd.read_csv(input_file_path).drop(columns=['ADM2_PCODE'])#, sep=' ')
-    
-    # forecast based on crop-yield
-    logging.info('forecast_model3: forecasting with model 3 ENSO+CHIRPS+DrySpell+VCI')
-    df_pred_provinces = pd.DataFrame()
 
-    for region in regions:
-        
-        # load model
-        model_filename = 'zwe_m3_crop_' + str(leadtime) + '_model.json'
-        blob_path = 'drought/Gold/zwe/model3/' + model_filename
-        model_filepath = os.path.join(model_path, model_filename)
-        download_data_from_remote('ibf', blob_path, model_filepath)
+    # load model
+    model_filename = f'{ctx.country}_m3_crop_' + str(ctx.leadtime) + '_model.json'
+    blob_path = f'drought/Gold/{ctx.country}/model3/' + model_filename
+    model = get_model(ctx, blob_path)
 
-        model = XGBClassifier()
-        model.load_model(model_filepath)
-
-        # forecast
-        df_input_region = df_input[df_input['ADM1_PCODE']==region].drop(columns='ADM1_PCODE')
-        pred = model.predict(df_input_region)
-        pred = round(np.median(list(pred)))
-        df_pred = {'forecast_severity': pred,
-                   'region': region,
-                   'leadtime': leadtime}
-        df_pred_provinces = df_pred_provinces.append(pd.DataFrame(data=df_pred, index=[0]))
+    # feature matrix of all districts
+    schema = model_schema(model, [column for column in df_input.columns if column != 'ADM1_PCODE'])
+    x, districts_province = feature_matrix(df_input, schema, index_column='ADM1_PCODE')
+    
+    # forecast based on crop-yield: all districts in one call, the median district per province
+    logging.info('forecast_model3: forecasting with model 3 ENSO+CHIRPS+DrySpell+VCI')
+    regions, severity = province_severity(predict(ctx, model, x), districts_province, 'median')
+    df_pred_provinces = pd.DataFrame({'forecast_severity': severity,
+                                      'region': regions,
+                                      'leadtime': ctx.leadtime})
 
     # save output locally
-    predict_file_path = os.path.join(data_out_path, f'{year}-{month:02}_zwe_predict.csv')
+    predict_file_path = os.path.join(data_out_path, f'{ctx.year}-{ctx.month:02}_{ctx.country}_predict.csv')
     df_pred_provinces.to_csv(predict_file_path, index=False)
 
     # upload processed output
-    blob_path = f'drought/Gold/zwe/{year}-{month:02}_zwe_predict.csv'
-    save_data_to_remote(predict_file_path, blob_path, 'ibf')
+    blob_path = f'drought/Gold/{ctx.country}/{ctx.year}-{ctx.month:02}_{ctx.country}_predict.csv'
+    save_data_to_remote(ctx, predict_file_path, blob_path, ctx.container)
 
     logging.info('forecast_model3: done')
 
 
+def province_severity(pred, districts_province, how):
+    '''
+    Function to aggregate the forecast severity of the districts per province (see rollup.py):
+    'max' (model 2) or 'median' rounded to the nearest severity, half to even (model 3).
+    Returns the provinces and their severity.
+    '''
+    regions, matrix = group_matrix(districts_province)
+    severity = aggregate(matrix, pred, how)
+    return regions, np.round(severity).astype(int)
+
+
+def ensemble_members(ctx):
+    '''
+    Function to list the models which can forecast with the inputs of the month of execution:
+    the models of all months of the season up to this month, i.e. the current lead time and all longer ones.
+    Returns (model, month of the model, lead time) per member.
+    '''
+    members = []
+    for month in season_model_months[:season_model_months.index(ctx.month) + 1]:
+        if month in months_for_model1:
+            model = 'model1'
+        elif month in months_for_model2:
+            model = 'model2'
+        else:
+            model = 'model3'
+        members.append((model, month, leadtimes[month][0]))
+    return members
+
+
+def member_input(df_data, month):
+    '''
+    Function to get the input of the model of an earlier month of the season from the input of arrange_data():
+    the season totals p_cumul and vci_avg only cover the data months observed at that month.
+    '''
+    data_months = season_data_months(month)
+    df_member = df_data.copy()
+    df_member['p_cumul'] = df_data[[f'{month_data:02}_p_cumul' for month_data in data_months]].sum(axis=1)
+    if month in months_for_model3:
+        df_member['vci_avg'] = df_data[[f'{month_data:02}_vci' for month_data in data_months]].sum(axis=1)
+    return df_member
+
+
+def forecast_ensemble(ctx):
+    '''
+    Function to forecast with all models of the current and longer lead times (see ensemble_members())
+    and combine them per province into an ensemble severity: the most frequent severity of the members,
+    the higher one if tied, and their agreement: the share of members forecasting it.
+    Every model predicts all districts in one call; its feature matrix is shared by the provinces.
+    A table of the members and the ensemble of all lead times is saved in the datalake,
+    and the ensemble severity is saved as forecast for calculate_impact().
+    '''
+    data_in_path = ctx.data_in_path
+    adm_path = ctx.adm_path
+    data_out_path = ctx.data_out_path
 
-def calculate_impact():
+    # load adm data
+    adm_csv_path = os.path.join(adm_path, ctx.adm_name(1) + '.csv')
+    regions = np.unique(pd.read_csv(adm_csv_path)['ADM1_PCODE'])
+
+    # load enso data and, after the months of model 1, the input data of arrange_data()
+    enso_filename = 'enso_' + ctx.today.strftime("%Y-%m") + '.csv'
+    df_enso = pd.read_csv(os.path.join(data_in_path, enso_filename))
+    if ctx.month not in months_for_model1:
+        input_filename = 'data_' + ctx.today.strftime("%Y-%m") + '.csv'
+        df_input = pd.read_csv(os.path.join(data_in_path, input_filename)).drop(columns=['ADM2_PCODE'])
+
+    logging.info('forecast_ensemble: forecasting with the models of all lead times')
+    members = []
+    enso_matrices = {}
+    for model_name, month, leadtime in ensemble_members(ctx):
+        if model_name == 'model1':
+            blob_paths = {region: f'drought/Gold/{ctx.country}/model1/{ctx.country}_m1_crop_{region}_{leadtime}_model.json'
+                          for region in regions}
+        else:
+            blob_path = f'drought/Gold/{ctx.country}/{model_name}/{ctx.country}_m{model_name[-1]}_crop_{leadtime}_model.json'
+            blob_paths = {None: blob_path}
+        try:
+            models = {region: get_model(ctx, blob_path) for region, blob_path in blob_paths.items()}
+        except FileNotFoundError as e:
+            if leadtime == ctx.leadtime:
+                raise
+            logging.warning(f'forecast_ensemble: {model_name} of lead time {leadtime} skipped, model not found: {e}')
+            continue
+
+        if model_name == 'model1':
+            for region, model in models.items():
+                schema = tuple(model_schema(model, list(df_enso.columns)))
+                if schema not in enso_matrices:
+                    enso_matrices[schema], _ = feature_matrix(df_enso, schema)
+                members.append((region, model_name, leadtime, predict(ctx, model, enso_matrices[schema])[0]))
+        else:
+            model = models[None]
+            df_member = df_input if month == ctx.month else member_input(df_input, month)
+            schema = model_schema(model, [column for column in df_member.columns if column != 'ADM1_PCODE'])
+            x, districts_province = feature_matrix(df_member, schema, index_column='ADM1_PCODE')
+            # same aggregation of the districts as forecast_model2() and forecast_model3()
+            provinces, severity = province_severity(predict(ctx, model, x), districts_province,
+                                                    'max' if model_name == 'model2' else 'median')
+            members.extend((region, model_name, leadtime, value) for region, value in zip(provinces, severity))
+
+    df_members = pd.DataFrame(members, columns=['region', 'model', 'leadtime', 'forecast_severity'])
+    df_members['forecast_severity'] = df_members['forecast_severity'].astype(int)
+    df_ensemble = df_members.groupby(['region', 'forecast_severity']).size().rename('votes').reset_index()
+    df_ensemble = df_ensemble.sort_values(['region', 'votes', 'forecast_severity']).groupby('region').tail(1)
+    df_ensemble['agreement'] = df_ensemble['votes'] / df_ensemble['region'].map(df_members['region'].value_counts())
+    df_ensemble['model'] = 'ensemble'
+    df_ensemble['leadtime'] = ctx.leadtime
+    df_table = pd.concat([df_members, df_ensemble.drop(columns='votes')], ignore_index=True)
+
+    # save the table of all lead times
+    ensemble_file_path = os.path.join(data_out_path, f'{ctx.year}-{ctx.month:02}_{ctx.country}_ensemble.csv')
+    df_table.to_csv(ensemble_file_path, index=False)
+    blob_path = f'drought/Gold/{ctx.country}/{ctx.year}-{ctx.month:02}_{ctx.country}_ensemble.csv'
+    save_data_to_remote(ctx, ensemble_file_path, blob_path, ctx.container)
+
+    # save the ensemble as forecast
+    df_pred_provinces = df_ensemble[['forecast_severity', 'region', 'leadtime']]
+    predict_file_path = os.path.join(data_out_path, f'{ctx.year}-{ctx.month:02}_{ctx.country}_predict.csv')
+    df_pred_provinces.to_csv(predict_file_path, index=False)
+    blob_path = f'drought/Gold/{ctx.country}/{ctx.year}-{ctx.month:02}_{ctx.country}_predict.csv'
+    save_data_to_remote(ctx, predict_file_path, blob_path, ctx.container)
+
+    logging.info('forecast_ensemble: done')
+
+
+def fallback_forecast(ctx):
+    '''
+    Function to take the latest forecast of the season in the datalake as forecast of the month,
+    when the forecast of the month failed (see stages.py).
+    It is only saved locally for calculate_impact(), the datalake keeps the forecasts made per month.
+    '''
+    month_start = datetime.date(ctx.year, ctx.month, 1)
+    for months_back in range(1, 12):
+        date = month_start - pd.DateOffset(months=months_back)
+        if date.month in months_inactive:
+            break
+        blob_path = f'drought/Gold/{ctx.country}/{date.year}-{date.month:02}_{ctx.country}_predict.csv'
+        try:
+            df_pred_provinces = read_dataframe_from_remote(ctx, ctx.container, blob_path)
+        except FileNotFoundError:
+            continue
+        logging.warning(f'fallback_forecast: forecast of {date.year}-{date.month:02} used as forecast of the month')
+        predict_file_path = os.path.join(ctx.data_out_path, f'{ctx.year}-{ctx.month:02}_{ctx.country}_predict.csv')
+        df_pred_provinces.to_csv(predict_file_path, index=False)
+        return
+
+    logging.error('fallback_forecast: no forecast of an earlier month of the season in the datalake')
+    raise ValueError()
+
+
+def calculate_impact(ctx):
     '''
     Function to calculate impacts of drought per provinces.
     Drought areas are defined by the above function forecast() which is saved in the datalake.
-    Impacts include affected population and affected ruminants.
+    Impacts are the layers in impact_indicators of settings.py, e.g. affected population and exposed ruminants.
     If a drought is forecasted in a province, entire population and ruminants of the province are considered to be impacted.
     
     '''
 
     logging.info('calculate_impact: calculating drought impact')
 
-    data_out_path = "./data_out"
+    data_out_path = ctx.data_out_path
 
     # download to-be-uploaded data: forecast_severity
-    if dummy_data:
-        blob_path = 'drought/Gold/zwe/zwe_m1_crop_predict_dummy.csv'
-        predict_filepath = os.path.join(data_out_path, 'zwe_m1_crop_predict_dummy.csv')
-        download_data_from_remote('ibf', blob_path, predict_filepath)
-        df_pred_provinces = pd.read_csv(predict_filepath)
+    if ctx.dummy_data:
+        blob_path = f'drought/Gold/{ctx.country}/{ctx.country}_m1_crop_predict_dummy.csv'
+        df_pred_provinces = read_dataframe_from_remote(ctx, ctx.container, blob_path)
     else:
-        predict_file_path = os.path.join(data_out_path, f'{year}-{month:02}_zwe_predict.csv')
+        predict_file_path = os.path.join(data_out_path, f'{ctx.year}-{ctx.month:02}_{ctx.country}_predict.csv')
         df_pred_provinces = pd.read_csv(predict_file_path)
     df_pred_provinces = df_pred_provinces.rename(columns={'drought': 'forecast_severity'})
     df_pred_provinces['forecast_trigger'] = df_pred_provinces['forecast_severity'] # In this case forecast_trigger is the same as forecast_severity
 
-    # load to-be-uploaded data: affected population
-    blob_path = 'drought/Gold/zwe/zwe_population_adm1.csv'
-    pop_filepath = os.path.join(data_out_path, 'zwe_population_adm1')
-    download_data_from_remote('ibf', blob_path, pop_filepath)
-    df_pop_provinces = pd.read_csv(pop_filepath)
-    df_pred_provinces = df_pred_provinces.merge(df_pop_provinces, left_on='region', right_on='ADM1_PCODE')
-    df_pred_provinces['population_affected'] = df_pred_provinces['forecast_severity'] * df_pred_provinces['total_pop']
-    df_pred_provinces.drop(columns=['ADM1_EN', 'ADM1_PCODE', 'ADM0_EN', 'ADM0_PCODE', \
-        'total_pop'], inplace=True)
-
-    # load to-be-uploaded data: exposed ruminents
-    blob_path = 'drought/Gold/zwe/zwe_ruminants_adm1.csv'
-    rumi_filepath = os.path.join(data_out_path, 'zwe_ruminants_adm1.csv')
-    download_data_from_remote('ibf', blob_path, rumi_filepath)
-    df_pop_provinces = pd.read_csv(rumi_filepath)
-    df_pred_provinces = df_pred_provinces.merge(df_pop_provinces, left_on='region', right_on='pcode')
-    df_pred_provinces['small_ruminants_exposed'] = df_pred_provinces['forecast_severity'] * df_pred_provinces['small_reminant_lsu']
-    df_pred_provinces.drop(columns=['admin1Name_en', 'pcode', 'season', 'small_reminant_lsu'], inplace=True)
-
-    # load to-be-uploaded data: exposed cattle
-    blob_path = 'drought/Gold/zwe/zwe_cattle_adm1.csv'
-    catt_filepath = os.path.join(data_out_path, 'zwe_cattle_adm1.csv')
-    download_data_from_remote('ibf', blob_path, catt_filepath)
-    df_pop_provinces = pd.read_csv(catt_filepath)
-    df_pred_provinces = df_pred_provinces.merge(df_pop_provinces, left_on='region', right_on='pcode')
-    df_pred_provinces['cattle_exposed'] = df_pred_provinces['forecast_severity'] * df_pred_provinces['cattle_lsu']
-    df_pred_provinces.drop(columns=['admin1Name_en', 'pcode', 'season', 'cattle_lsu'], inplace=True)
+    # calculate all impact layers at once
+    df_exposure = get_exposure_matrix(ctx)
+    df_pred_provinces = compute_impact(df_pred_provinces, df_exposure)
 
     logging.info('calculate_impact: done')
 
     return(df_pred_provinces)
 
 
-def post_output(df_pred_provinces, upload_date):
+def get_exposure_matrix(ctx):
+    '''
+    Function to load the exposure tables of impact_indicators into a matrix of province x indicator.
+    The matrix of a country is kept in memory after the first call, until the ETag of an exposure table changes.
+    '''
+    blob_paths = {layer: f'drought/Gold/{ctx.country}/' + filename
+                  for layer, (filename, _, _) in impact_indicators.items()}
+    storage = get_storage(ctx)
+    with busy('network'):
+        etags = [storage.properties(ctx.container, blob_path)['etag'] for blob_path in blob_paths.values()]
+    if ctx.country not in exposure_cache or exposure_cache[ctx.country][0] != etags:
+        exposure_tables = {layer: read_dataframe_from_remote(ctx, ctx.container, blob_path)
+                           for layer, blob_path in blob_paths.items()}
+        exposure_cache[ctx.country] = (etags, build_exposure_matrix(exposure_tables, impact_indicators))
+
+    return exposure_cache[ctx.country][1]
+
+
+@record('network')
+def post_output(ctx, df_pred_provinces, upload_date):
     '''
     Function to post layers into IBF System.
     For every layer, the function calls IBF API and post the layer in the format of json.
@@ -902,52 +1285,18 @@ def post_output(df_pred_provinces, upload_date):
 
     logging.info('post_output: sending output to dashboard')
 
-    # load credentials to IBF API
-    ibf_credentials = get_secret_keyvault(api_info)
-    ibf_credentials = json.loads(ibf_credentials)
-    IBF_API_URL = ibf_credentials["IBF_API_URL"]
-    ADMIN_LOGIN = ibf_credentials["ADMIN_LOGIN"]
-    ADMIN_PASSWORD = ibf_credentials["ADMIN_PASSWORD"]
-
-    # log in to IBF API
-    login_response = requests.post(f'{IBF_API_URL}/api/user/login',
-                                   data=[('email', ADMIN_LOGIN), ('password', ADMIN_PASSWORD)])
-    token = login_response.json()['user']['token']
-
-    # loop over layers to upload
-    for layer in ['population_affected', 'small_ruminants_exposed', 'cattle_exposed', 'forecast_severity', 'forecast_trigger']:
-        
-        # prepare layer
-        exposure_data = {'countryCodeISO3': 'ZWE'}
-        exposure_place_codes = []
-        for ix, row in df_pred_provinces.iterrows():
-            exposure_entry = {'placeCode': row['region'],
-                                                'amount': row[layer]}
-            exposure_place_codes.append(exposure_entry)
-        exposure_data['exposurePlaceCodes'] = exposure_place_codes
-        exposure_data["adminLevel"] = 1
-        exposure_data["leadTime"] = leadtime_str
-        exposure_data["dynamicIndicator"] = layer
-        exposure_data["disasterType"] = 'drought'
-        exposure_data["date"] = upload_date
-        
-        # upload layer
-        r = requests.post(f'{IBF_API_URL}/api/admin-area-dynamic-data/exposure',
-                          json=exposure_data,
-                          headers={'Authorization': 'Bearer '+ token,
-                                  'Content-Type': 'application/json',
-                                  'Accept': 'application/json'})
-        if r.status_code >= 400:
-            # logging.error(f"PIPELINE ERROR AT EMAIL {email_response.status_code}: {email_response.text}")
-            # print(r.text)
-            raise ValueError()
-
-    # process events (and send email if applicable)
-    post_process_events(upload_date, IBF_API_URL, token)
+    # nothing is uploaded if no layer changed since the last post
+    payloads = exposure_payloads(ctx, df_pred_provinces, upload_date)
+    changed = layers_to_post(ctx, payloads)
+    if not changed:
+        logging.info('post_output: no layer changed, nothing posted')
+        return
 
+    post_layers(ctx, changed, upload_date)
 
 
-def post_none_output(upload_date):
+@record('network')
+def post_none_output(ctx, upload_date):
     '''
     Function to post non-trigger layers into IBF System during inactive months.
     For every layer, the function calls IBF API and post the layer in the format of json.
@@ -955,17 +1304,30 @@ def post_none_output(upload_date):
     
     '''
 
-    data_out_path = "./data_out"
-
-    file_path_remote = 'drought/Gold/zwe/zwe_nontrigger.csv'
-    predict_filepath = os.path.join(data_out_path, 'zwe_nontrigger.csv')
-    download_data_from_remote('ibf', file_path_remote, predict_filepath)
-    df_pred_provinces = pd.read_csv(predict_filepath)
+    file_path_remote = f'drought/Gold/{ctx.country}/{ctx.country}_nontrigger.csv'
+    df_pred_provinces = read_dataframe_from_remote(ctx, ctx.container, file_path_remote)
 
     logging.info('post_none_output: sending non-trigger output to dashboard')
 
+    # all amounts 0, nothing is uploaded if no layer changed since the last post
+    payloads = exposure_payloads(ctx, df_pred_provinces, upload_date, none_output=True)
+    changed = layers_to_post(ctx, payloads)
+    if not changed:
+        logging.info('post_none_output: no layer changed, nothing posted')
+        return
+
+    post_layers(ctx, changed, upload_date)
+
+
+@record('network')
+def post_layers(ctx, changed, upload_date):
+    '''
+    Function to log in to IBF API, post the layers of layers_to_post(), process the events of the upload date
+    (and send email if applicable) and keep the hashes of the posted layers.
+    '''
+
     # load credentials to IBF API
-    ibf_credentials = get_secret_keyvault(api_info)
+    ibf_credentials = get_secret_keyvault(ctx, ctx.api_info)
     ibf_credentials = json.loads(ibf_credentials)
     IBF_API_URL = ibf_credentials["IBF_API_URL"]
     ADMIN_LOGIN = ibf_credentials["ADMIN_LOGIN"]
@@ -974,85 +1336,139 @@ def post_none_output(upload_date):
     # log in to IBF API
     login_response = requests.post(f'{IBF_API_URL}/api/user/login',
                                    data=[('email', ADMIN_LOGIN), ('password', ADMIN_PASSWORD)])
+    if login_response.status_code in (401, 403):
+        # credentials may have been rotated, the next attempt of the stage fetches them again
+        evict_secret(ctx, ctx.api_info)
+        logging.error(f'IBF API login failed: {login_response.status_code}')
+        raise ValueError()
     token = login_response.json()['user']['token']
 
     # loop over layers to upload
-    for layer in ['population_affected', 'small_ruminants_exposed', 'cattle_exposed', 'forecast_severity', 'forecast_trigger']:
-        
-        # prepare layer
-        exposure_data = {'countryCodeISO3': 'ZWE'}
-        exposure_place_codes = []
-        for ix, row in df_pred_provinces.iterrows():
-            exposure_entry = {'placeCode': row['region'],
-                                                'amount': 0}
-            exposure_place_codes.append(exposure_entry)
-        exposure_data['exposurePlaceCodes'] = exposure_place_codes
-        exposure_data["adminLevel"] = 1
-        exposure_data["leadTime"] = leadtime_str
-        exposure_data["dynamicIndicator"] = layer
-        exposure_data["disasterType"] = 'drought'
-        exposure_data["date"] = upload_date
-        
-        # upload layer
+    for exposure_data in changed:
         r = requests.post(f'{IBF_API_URL}/api/admin-area-dynamic-data/exposure',
                           json=exposure_data,
                           headers={'Authorization': 'Bearer '+ token,
                                   'Content-Type': 'application/json',
                                   'Accept': 'application/json'})
         if r.status_code >= 400:
-            # logging.error(f"PIPELINE ERROR AT EMAIL {email_response.status_code}: {email_response.text}")
-            # print(r.text)
+            logging.error(f'post_layers: posting {payload_key(exposure_data)} failed: {r.status_code} {r.text}')
             raise ValueError()
 
-    logging.info('post_none_output: sending output to dashboard')
-
-    
     # process events (and send email if applicable)
-    post_process_events(upload_date, IBF_API_URL, token)
+    post_process_events(ctx, upload_date, IBF_API_URL, token)
+    save_posted_hashes(ctx, changed)
 
-def post_process_events(upload_date, IBF_API_URL, token):
+
+def exposure_payloads(ctx, df_pred_provinces, upload_date, none_output=False):
+    '''
+    Function to prepare the payload of every layer posted to IBF API:
+    amount per province of the layer, or 0 for the non-trigger output.
+    '''
+    regions = df_pred_provinces['region'].tolist()
+    payloads = []
+    for layer in output_layers:
+        if none_output:
+            amounts = [0] * len(regions)
+        else:
+            amounts = df_pred_provinces[layer].tolist()
+        exposure_data = {'countryCodeISO3': ctx.iso3}
+        exposure_data['exposurePlaceCodes'] = [{'placeCode': region, 'amount': amount}
+                                               for region, amount in zip(regions, amounts)]
+        exposure_data["adminLevel"] = 1
+        exposure_data["leadTime"] = ctx.leadtime_str
+        exposure_data["dynamicIndicator"] = layer
+        exposure_data["disasterType"] = 'drought'
+        exposure_data["date"] = upload_date
+        payloads.append(exposure_data)
+
+    return payloads
+
+
+def posted_hashes_path(ctx):
+    server = 'test' if ctx.api_test else 'production'
+    return f'drought/Gold/{ctx.country}/posted/posted_layers_{server}.json'
+
+
+def payload_key(exposure_data):
+    return f"{exposure_data['leadTime']}/{exposure_data['dynamicIndicator']}"
+
+
+def payload_hash(exposure_data):
+    '''
+    Function to get the hash of the content of a layer posted to IBF API, without the upload date.
+    '''
+    content = {key: value for key, value in exposure_data.items() if key != 'date'}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def get_posted_hashes(ctx):
+    '''
+    Get the hashes of the last layers posted to the IBF API (test or production) per lead time and layer
+    from datalake
+    '''
+    try:
+        return json.loads(get_storage(ctx).read_bytes(ctx.container, posted_hashes_path(ctx)))
+    except FileNotFoundError:
+        logging.info('get_posted_hashes: no layers posted yet')
+        return {}
+
+
+def save_posted_hashes(ctx, payloads):
+    '''
+    Save the hashes of the layers posted to the IBF API in datalake
+    '''
+    posted_hashes = get_posted_hashes(ctx)
+    posted_hashes.update({payload_key(exposure_data): payload_hash(exposure_data) for exposure_data in payloads})
+    save_bytes_to_remote(ctx, json.dumps(posted_hashes, indent=2, sort_keys=True).encode(),
+                         posted_hashes_path(ctx), ctx.container)
+
+
+def changed_payloads(ctx, payloads):
+    '''
+    Function to select the layers whose content changed since they were last posted to the IBF API.
+    All layers are selected if ctx.upload_diff is False.
+    '''
+    if not ctx.upload_diff:
+        return payloads
+    posted_hashes = get_posted_hashes(ctx)
+    return [exposure_data for exposure_data in payloads
+            if posted_hashes.get(payload_key(exposure_data)) != payload_hash(exposure_data)]
+
+
+def layers_to_post(ctx, payloads):
+    '''
+    Function to select the layers to post: all layers if any of them changed since the last post
+    (see changed_payloads()), because the events are processed for the upload date of the layers,
+    or none if nothing changed, in which case the events are not processed either.
+    '''
+    changed = changed_payloads(ctx, payloads)
+    logging.info(f'layers_to_post: {len(changed)} of {len(payloads)} layers changed since the last post')
+    return payloads if changed else []
+
+
+@record('network')
+def post_process_events(ctx, upload_date, IBF_API_URL, token):
     '''
     process events (and send email if applicable)
     
     '''
     
-    if notify_email:
+    if ctx.notify_email:
         api_path = 'events/process' #default for noNotifications=false
     else:
         api_path = 'events/process?noNotifications=true'
     process_events_response = requests.post(f'{IBF_API_URL}/api/{api_path}',
-                                json={'countryCodeISO3': 'ZWE',
+                                json={'countryCodeISO3': ctx.iso3,
                                         'disasterType': 'drought',
                                         'date': upload_date},
                                 headers={'Authorization': 'Bearer ' + token,
                                         'Content-Type': 'application/json',
                                         'Accept': 'application/json'})
     if process_events_response.status_code >= 400:
-        # logging.error(f"PIPELINE ERROR AT EMAIL {process_events_response.status_code}: {process_events_response.text}")
-        # print(r.text)
+        logging.error(f'post_process_events: {process_events_response.status_code} {process_events_response.text}')
         raise ValueError()
-        exit(0)
-
-def list_week_number(year, month):
-    '''
-    List week number of a year in a month
-    '''
-    first_date_of_month = datetime.date(year, month, 1)
-    date_of_next_month = first_date_of_month + datetime.timedelta(days=32) 
-    last_date_of_month = date_of_next_month.replace(day=1)
-    delta = last_date_of_month - first_date_of_month
-
-    week_numbers = []
-    for i in range(delta.days + 1):
-        day = first_date_of_month + datetime.timedelta(days=i)
-        week_number = day.isocalendar()[1]
-        week_numbers.append(week_number)
-
-    week_list = np.unique(week_numbers)
-
-    return week_list
-
 
+@record('network')
 def wget_download(file_url, local_path, filename):
     '''
     Function to wget download file from url.
@@ -1076,38 +1492,134 @@ def wget_download(file_url, local_path, filename):
             logging.error(f'Failed to download {filename}')
 
 
-def get_dataframe_from_remote(data, year, month, folder_local):
+def feature_partition_path(ctx, source, date):
+    '''
+    Get the datalake path of the partition of the feature store of a data source (chirps, vci)
+    for a data month ('YYYY-MM')
+    '''
+    return f'drought/Silver/{ctx.country}/features/{source}/{date}.csv'
+
+
+def get_feature_store(ctx, source, dates):
+    '''
+    Get the partitions of the feature store of a data source (chirps, vci) for data months ('YYYY-MM')
+    from datalake; months without partition are left out
+    '''
+    partitions = []
+    for date in dates:
+        try:
+            partitions.append(read_dataframe_from_remote(ctx, ctx.container, feature_partition_path(ctx, source, date),
+                                                         dtype={'date': str}))
+        except FileNotFoundError:
+            logging.info(f'get_feature_store: no feature store of {source} for {date}')
+    if not partitions:
+        return pd.DataFrame(columns=store_columns)
+    return pd.concat(partitions, ignore_index=True)
+
+
+def update_feature_store(ctx, source, df_processed, year_data, month_data):
     '''
-    Get past processed chirps data as dataframe from datalake
+    Save processed monthly data of a source as the partition of its month in the feature store in datalake
     '''
-    filename = f'{data}_{year}-{month:02}.csv'
-    file_path_remote = f'drought/Silver/zwe/{data}/'+ filename
-    file_path_local = os.path.join(folder_local, filename)
-    download_data_from_remote('ibf', file_path_remote, file_path_local)
-    df = pd.read_csv(file_path_local)
+    df_new = features_to_long(df_processed, 'ADM2_PCODE', year_data, month_data)
+    df_new = df_new.sort_values(['variable', 'ADM2_PCODE']).reset_index(drop=True)
+    file_path_remote = feature_partition_path(ctx, source, f'{year_data}-{month_data:02}')
+    save_dataframe_to_remote(ctx, df_new, file_path_remote, ctx.container)
+    logging.info(f'update_feature_store: {source} of {year_data}-{month_data:02} stored')
+
+
+def get_vci_week_store(ctx):
+    '''
+    Get the weekly VCI store (average VCI per adm2 and ISO week) from datalake
+    '''
+    file_path_remote = f'drought/Silver/{ctx.country}/vci/weeks/vci_weeks.csv'
+    try:
+        df = read_dataframe_from_remote(ctx, ctx.container, file_path_remote)
+    except FileNotFoundError:
+        logging.info('get_vci_week_store: no weekly VCI store yet')
+        return new_week_store()
     return df
 
 
-def download_data_from_remote(container, file_path_remote, file_path_local):
+def save_vci_week_store(ctx, df_store):
+    '''
+    Save the weekly VCI store in datalake
+    '''
+    file_path_remote = f'drought/Silver/{ctx.country}/vci/weeks/vci_weeks.csv'
+    save_dataframe_to_remote(ctx, df_store, file_path_remote, ctx.container)
+
+
+@record('network')
+def sync_data_from_remote(ctx, container, file_path_remote, file_path_local, manifest):
     '''
-    Download data from datalake
+    Download data from datalake only if the blob changed since the last download.
+    ETag and last modified date of downloaded blobs are kept in manifest.
+    Returns True if the file is downloaded.
     '''
+    storage = get_storage(ctx)
+    version = storage.properties(container, file_path_remote)
+    if os.path.isfile(file_path_local) and manifest.get(file_path_remote) == version:
+        logging.info(f'{file_path_remote} not changed, download skipped')
+        return False
     with open(file_path_local, "wb") as download_file:
-        blob_client = get_blob_service_client(file_path_remote, container)
-        download_file.write(blob_client.download_blob().readall())
-    # df = pd.read_csv(file_path_local)
-    # return file_path_local # df
+        download_file.write(storage.read_bytes(container, file_path_remote))
+    manifest[file_path_remote] = version
+    return True
+
+
+@record('network')
+def fetch_data(file_url, attempts=5):
+    '''
+    Function to download a file from url into memory.
+    If failed, try again for 5 time.
+    '''
+    for attempt in range(attempts):
+        try:
+            response = requests.get(file_url)
+            response.raise_for_status()
+            logging.info(f'{file_url} downloaded')
+            return response.content
+        except requests.exceptions.RequestException:
+            logging.info(f'Attempt to download {file_url} failed, retry {attempt + 1}')
+            time.sleep(10)
+    logging.error(f'Failed to download {file_url}')
+    raise ValueError()
+
+
+@record('network')
+def read_dataframe_from_remote(ctx, container, file_path_remote, **kwargs):
+    '''
+    Read a csv from datalake into a dataframe, without a local copy.
+    Keyword arguments are passed to pandas.read_csv().
+    '''
+    return get_storage(ctx).read_dataframe(container, file_path_remote, **kwargs)
 
 
-def save_data_to_remote(file_path_local, file_path_remote, container):
+@record('network')
+def save_data_to_remote(ctx, file_path_local, file_path_remote, container):
     '''
     Function to save data to datalake
     '''
-    with open(file_path_local, "rb") as upload_file:
-        blob_client = get_blob_service_client(file_path_remote, container)
-        blob_client.upload_blob(upload_file, overwrite=True)
+    get_storage(ctx).write_file(container, file_path_remote, file_path_local)
+
+
+@record('network')
+def save_bytes_to_remote(ctx, data, file_path_remote, container):
+    '''
+    Function to save data in memory to datalake
+    '''
+    get_storage(ctx).write_bytes(container, file_path_remote, data)
+
+
+@record('network')
+def save_dataframe_to_remote(ctx, df, file_path_remote, container):
+    '''
+    Function to save a dataframe as csv to datalake, without a local copy
+    '''
+    get_storage(ctx).write_dataframe(container, file_path_remote, df)
 
 
+@record('cpu')
 def cumulative_and_dryspell(df_precip, admin_column, month_data):
     '''
     Function to calculate:
@@ -0,0 +1,69 @@
+import datetime
+import calendar
+import pandas as pd
+
+
+# columns of the weekly VCI store
+week_store_columns = ['ADM2_PCODE', 'iso_year', 'week', 'vci']
+
+
+def list_iso_weeks(year, month):
+    '''
+    Function to list the ISO weeks (ISO year, week) overlapping a month,
+    with the number of days of the month in each week.
+    The ISO year differs from the calendar year for weeks around new year, e.g. 2021-01-01 is in week 53 of 2020.
+    '''
+    weeks = {}
+    for day in range(1, calendar.monthrange(year, month)[1] + 1):
+        iso_year, week, _ = datetime.date(year, month, day).isocalendar()
+        weeks[(iso_year, week)] = weeks.get((iso_year, week), 0) + 1
+
+    return weeks
+
+
+def vci_filename(iso_year, week):
+    '''
+    Function to get the file name of the VCI of a week, e.g. VHP.G04.C07.j01.P2024005.VH.VCI.tif
+    '''
+    return f'VHP.G04.C07.j01.P{iso_year}{week:03d}.VH.VCI.tif'
+
+
+def new_week_store():
+    return pd.DataFrame(columns=week_store_columns)
+
+
+def stored_weeks(df_store):
+    '''
+    Function to get the set of weeks (ISO year, week) in the weekly VCI store.
+    '''
+    return set(zip(df_store['iso_year'].astype(int), df_store['week'].astype(int)))
+
+
+def append_week(df_store, pcodes, mean, iso_year, week):
+    '''
+    Function to add the average VCI per district of a week to the weekly VCI store.
+    A week already in the store is replaced.
+    '''
+    df_week = pd.DataFrame({'ADM2_PCODE': list(pcodes), 'iso_year': iso_year, 'week': week, 'vci': mean})
+    keep = ~((df_store['iso_year'].astype(int) == iso_year) & (df_store['week'].astype(int) == week))
+    df_store = pd.concat([df_store[keep], df_week], ignore_index=True)
+
+    return df_store.sort_values(['iso_year', 'week', 'ADM2_PCODE']).reset_index(drop=True)
+
+
+def monthly_vci(df_store, weeks, month_data):
+    '''
+    Function to calculate the monthly VCI per district from the weekly VCI store:
+    average of the weeks of the month weighted by their number of days in the month.
+    weeks is the output of list_iso_weeks(); weeks missing in the store are left out.
+    '''
+    df_weeks = df_store.copy()
+    df_weeks['days'] = [weeks.get((int(iso_year), int(week)), 0)
+                        for iso_year, week in zip(df_weeks['iso_year'], df_weeks['week'])]
+    df_weeks = df_weeks[(df_weeks['days'] > 0) & df_weeks['vci'].notna()]
+    df_weeks['weighted'] = df_weeks['vci'] * df_weeks['days']
+
+    df_month = df_weeks.groupby('ADM2_PCODE')[['weighted', 'days']].sum()
+    df_month[f'{month_data:02}_vci'] = df_month['weighted'] / df_month['days']
+
+    return df_month[[f'{month_data:02}_vci']].reset_index()
@@ -0,0 +1,80 @@
+import os
+import re
+import time
+import shutil
+import datetime
+import logging
+
+
+def month_workdir(root, year, month):
+    '''
+    Function to get (and create) the working directory of a data month, e.g. ./data_in/chirps_tif/2024-01
+    '''
+    workdir = os.path.join(root, f'{year}-{month:02}')
+    os.makedirs(workdir, exist_ok=True)
+    return workdir
+
+
+def parse_chirps_date(filename):
+    '''
+    Function to parse the date of a CHIRPS daily file, e.g. chirps-v2.0.2024.01.05.tif.gz
+    Returns None if the file name is not a CHIRPS daily file.
+    '''
+    match = re.match(r'chirps-v2\.0\.(\d{4})\.(\d{2})\.(\d{2})\.tif', filename)
+    if match is None:
+        return None
+    return datetime.date(*map(int, match.groups()))
+
+
+def parse_vci_week(filename):
+    '''
+    Function to parse the (ISO year, week) of a VCI weekly file, e.g. VHP.G04.C07.j01.P2024005.VH.VCI.tif
+    Returns None if the file name is not a VCI weekly file.
+    '''
+    match = re.search(r'\.P(\d{4})(\d{3})\.VH\.VCI\.tif$', filename)
+    if match is None:
+        return None
+    return tuple(map(int, match.groups()))
+
+
+def index_rasters(workdir, parse_key):
+    '''
+    Function to index the rasters of a working directory by the key parsed from their file name
+    (date of acquisition). Files which can not be parsed are ignored.
+    '''
+    raster_index = {}
+    for filename in os.listdir(workdir):
+        key = parse_key(filename)
+        if key is not None:
+            raster_index[key] = os.path.join(workdir, filename)
+    return raster_index
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(path, filename))
+               for path, _, filenames in os.walk(directory) for filename in filenames)
+
+
+def evict_workdirs(root, max_age_days, max_bytes, keep=()):
+    '''
+    Function to remove the month working directories under root which are older than max_age_days,
+    then the oldest ones until all together are at most max_bytes.
+    Directories in keep are not removed.
+    '''
+    if not os.path.isdir(root):
+        return
+    workdirs = [os.path.join(root, name) for name in os.listdir(root)
+                if os.path.isdir(os.path.join(root, name))]
+    workdirs = sorted(workdirs, key=os.path.getmtime)
+    sizes = {workdir: directory_size(workdir) for workdir in workdirs}
+    total = sum(sizes.values())
+    now = time.time()
+
+    for workdir in workdirs:
+        if workdir in keep:
+            continue
+        too_old = now - os.path.getmtime(workdir) > max_age_days * 86400
+        if too_old or total > max_bytes:
+            shutil.rmtree(workdir, ignore_errors=True)
+            total -= sizes[workdir]
+            logging.info(f'evict_workdirs: {workdir} removed')
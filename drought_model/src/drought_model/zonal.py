@@ -0,0 +1,107 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from drought_model.activity import record
+from drought_model.boundaries import load_geometry_cache
+from drought_model.gridded import raster_config, configure_rasters, read_raster
+
+
+# admin boundaries of a worker process, loaded once by init_worker()
+worker_boundaries = {}
+
+
+def init_worker(cache_path, config=None):
+    '''
+    Function to load the admin boundaries from the binary geometry cache once per worker process
+    and set the GDAL configuration of its raster readers (see gridded.py).
+    A geometry cache which is already loaded (e.g. by another thread in the current process) is not reloaded.
+    '''
+    if config:
+        configure_rasters(**config)
+    source = (cache_path, os.path.getmtime(cache_path))
+    if worker_boundaries.get('source') == source:
+        return
+    worker_boundaries.clear()
+    worker_boundaries.update(load_geometry_cache(cache_path))
+    worker_boundaries['source'] = source
+
+
+def array_zonal_mean(array, transform, geometries):
+    '''
+    Function to calculate the average of a raster array per geometry, in the order of the geometries.
+    '''
+    from rasterstats import zonal_stats
+
+    mean = zonal_stats(geometries, array, affine=transform, stats='mean', nodata=-9999)
+    return np.array([stats['mean'] for stats in mean], dtype=float)
+
+
+def raster_zonal_mean(raster_path):
+    '''
+    Function to calculate the average of a raster (file or URL) per admin boundary of the worker.
+    The raster is read clipped to the boundaries, see gridded.read_raster().
+    Returns the averages in the order of the boundaries, the window array, its transform and crs.
+    '''
+    array, transform, crs = read_raster(raster_path, worker_boundaries['total_bounds'])
+    mean = array_zonal_mean(array, transform, worker_boundaries['geometries'])
+
+    return mean, array, transform, crs
+
+
+def zonal_mean_task(raster_path, keep_arrays):
+    '''
+    Function to calculate the average of a raster per admin boundary in a worker of zonal_executor().
+    '''
+    mean, array, transform, crs = raster_zonal_mean(raster_path)
+    if not keep_arrays:
+        # the window array is only sent back to the parent process when needed
+        array = None
+    return mean, array, transform, crs
+
+
+def zonal_executor(cache_path, workers=None, mp_context=None):
+    '''
+    Function to start a pool of processes which have loaded the admin boundaries, for zonal_mean_task().
+    The processes read rasters with the GDAL configuration of this process; with 'ALL_CPUS' threads,
+    the CPUs are shared by the processes.
+    mp_context is the multiprocessing context of the processes (default: of the platform).
+    '''
+    workers = workers or os.cpu_count() or 1
+    config = dict(raster_config)
+    if config['num_threads'] == 'ALL_CPUS':
+        config['num_threads'] = max(1, (os.cpu_count() or 1) // workers)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                               initializer=init_worker, initargs=(cache_path, config))
+
+
+@record('cpu')
+def zonal_means(raster_paths, cache_path, workers=None, keep_arrays=False, cache=None):
+    '''
+    Function to calculate the average of rasters per admin boundary, distributed over a pool of processes.
+    workers is the number of processes (default: number of CPUs); with 1 worker the rasters are processed
+    in the current process. Averages already in cache (per geometry cache and raster, e.g. calculated
+    ahead of the stages, see orchestration.py) are not calculated again.
+    Returns a 2D array of averages (raster, boundary) and, if keep_arrays,
+    the list of window arrays with their transform and crs.
+    '''
+    raster_paths = list(raster_paths)
+    if not raster_paths:
+        return np.empty((0, 0)), ([], None, None) if keep_arrays else None
+    results = {} if keep_arrays or cache is None else \
+        {raster_path: cache[(cache_path, raster_path)] for raster_path in raster_paths
+         if (cache_path, raster_path) in cache}
+    missing = [raster_path for raster_path in raster_paths if raster_path not in results]
+    workers = min(workers or os.cpu_count() or 1, max(len(missing), 1))
+
+    if missing and workers == 1:
+        init_worker(cache_path)
+        results.update({raster_path: zonal_mean_task(raster_path, keep_arrays) for raster_path in missing})
+    elif missing:
+        with zonal_executor(cache_path, workers) as executor:
+            results.update(zip(missing, executor.map(zonal_mean_task, missing, [keep_arrays] * len(missing))))
+    results = [results[raster_path] for raster_path in raster_paths]
+
+    means = np.vstack([mean for mean, _, _, _ in results])
+    if not keep_arrays:
+        return means, None
+    return means, ([array for _, array, _, _ in results], results[0][2], results[0][3])
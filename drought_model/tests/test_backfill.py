@@ -0,0 +1,92 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('rasterio')
+pytest.importorskip('rasterstats')
+
+from drought_model import backfill
+from drought_model.backfill import backfill_chirps, backfill_feature_store, current_rss
+from drought_model.feature_store import features_to_long
+from drought_model.fixtures import make_fixtures, serve_fixtures, fixture_context, write_chirps, write_model_inputs
+from drought_model.utils import basic_data, get_feature_store, arrange_data, save_dataframe_to_remote
+
+# months of execution of the backfill, the last one is the month of the fixtures
+today = '2024-02-15'
+run_months = [(2023, 11), (2023, 12), (2024, 1), (2024, 2)]
+
+
+@pytest.fixture
+def fixture_run(tmp_path):
+    root = str(tmp_path)
+    paths = make_fixtures(root, today, n_adm2=50)
+    rng = np.random.default_rng(0)
+    for year_run, month_run in run_months[:-1]:
+        year_data, month_data = (year_run - 1, 12) if month_run == 1 else (year_run, month_run - 1)
+        write_chirps(paths['http_root'], year_data, month_data, rng)
+    server, base_url = serve_fixtures(paths['http_root'])
+    try:
+        ctx = fixture_context(root, base_url, today, notify_email=False)
+        basic_data(ctx)
+        yield ctx
+    finally:
+        server.shutdown()
+
+
+def test_backfill_stays_under_memory_budget(fixture_run):
+    # a budget of 256 MB above the memory of the test process
+    memory_budget_mb = int(current_rss() / 1024**2) + 256
+
+    result = backfill_chirps(fixture_run, run_months, memory_budget_mb)
+
+    assert result['months'] == len(run_months)
+    assert result['peak_rss_mb'] <= memory_budget_mb
+    assert not any(files for _, _, files in os.walk(fixture_run.rawchirps_path))
+
+
+def test_backfill_fails_over_memory_budget(fixture_run):
+    with pytest.raises(ValueError):
+        backfill_chirps(fixture_run, run_months, 1)
+
+
+def test_backfill_keeps_months_processed_before_failure(fixture_run, monkeypatch):
+    backfill_month = backfill.backfill_chirps_month
+    processed = {}
+
+    def fail_after_first_month(ctx, urls, year_data, month_data, memory, memory_budget):
+        if (year_data, month_data) != (2023, 10):
+            raise ValueError()
+        processed[(year_data, month_data)] = backfill_month(ctx, urls, year_data, month_data, memory, memory_budget)
+        return processed[(year_data, month_data)]
+
+    monkeypatch.setattr(backfill, 'backfill_chirps_month', fail_after_first_month)
+    with pytest.raises(ValueError):
+        backfill_chirps(fixture_run, run_months, None)
+
+    df_store = get_feature_store(fixture_run, 'chirps', ['2023-10'])
+    df_expected = features_to_long(processed[(2023, 10)], 'ADM2_PCODE', 2023, 10)
+    df_saved = df_store[df_store['date'] == '2023-10'].merge(df_expected, on=['ADM2_PCODE', 'variable'])
+    assert len(df_saved) == len(df_expected)
+    np.testing.assert_allclose(df_saved['value_x'], df_saved['value_y'])
+
+
+def test_arrange_data_needs_every_month_of_the_season(fixture_run):
+    ctx = fixture_run
+    write_model_inputs(ctx, np.random.default_rng(0))
+    # the fixtures hold the feature store up to December, not the data month January
+    with pytest.raises(ValueError):
+        arrange_data(ctx)
+
+    pcodes = pd.read_csv(os.path.join(ctx.adm_path, ctx.adm_name(2) + '.csv'))['ADM2_PCODE']
+    processed = {'chirps': pd.DataFrame({'ADM2_PCODE': pcodes, '01_p_cumul': 50.0, '01_dryspell': 3}),
+                 'vci': pd.DataFrame({'ADM2_PCODE': pcodes, '01_vci': 40.0})}
+    for source, df_processed in processed.items():
+        save_dataframe_to_remote(ctx, df_processed, f'drought/Silver/{ctx.country}/{source}/{source}_2024-02.csv',
+                                 ctx.container)
+        assert backfill_feature_store(ctx, source, [(2024, 2)]) == {'months': 1}
+        assert set(get_feature_store(ctx, source, ['2024-01'])['date']) == {'2024-01'}
+
+    arrange_data(ctx)
+    df_data = pd.read_csv(os.path.join(ctx.data_in_path, 'data_2024-02.csv'))
+    assert (df_data['01_p_cumul'] == 50.0).all() and (df_data['01_vci'] == 40.0).all()
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+import pytest
+from drought_model.settings import months_for_model1, months_for_model2, months_for_model3
+
+pytest.importorskip('xgboost')
+
+
+@pytest.mark.parametrize('month', months_for_model1 + months_for_model2 + months_for_model3)
+def test_compiled_inference_matches_xgboost(month):
+    from drought_model.fixtures import dummy_model, model_features
+    from drought_model.inference import compile_model, predict_classes, feature_matrix
+
+    rng = np.random.default_rng(month)
+    features = model_features(month)
+    model = dummy_model(features, rng)
+    compiled = compile_model(model.get_booster().save_raw('json'))
+
+    df_input = pd.DataFrame(rng.random((500, len(features))), columns=features)
+    df_input = df_input.mask(rng.random(df_input.shape) < 0.05)
+    x, _ = feature_matrix(df_input, features)
+
+    np.testing.assert_array_equal(predict_classes(compiled, x), model.predict(df_input))
@@ -0,0 +1,16 @@
+import pytest
+
+pytest.importorskip('rasterio')
+pytest.importorskip('rasterstats')
+
+from drought_model.benchmark import overlap_benchmark
+
+
+def test_async_run_overlaps_network_and_cpu():
+    results = overlap_benchmark(n_adm2=20, today='2024-02-15', workers=1, latency=0.2)
+    print(f"async / sync: {results['ratio']}, overlap: {results['overlap']}")
+
+    for run in results['runs'].values():
+        assert not {'get_new_chirps', 'get_new_vci'} & set(run['failures'])
+    assert results['overlap'] > 0
+    assert results['ratio'] < 1
@@ -0,0 +1,71 @@
+import dataclasses
+import pandas as pd
+import pytest
+from drought_model import utils
+from drought_model.settings import build_run_context
+from drought_model.utils import output_layers, exposure_payloads, changed_payloads, layers_to_post, \
+    save_posted_hashes
+
+
+@pytest.fixture
+def ctx(monkeypatch):
+    # a fresh datalake in memory for every test
+    monkeypatch.setattr(utils, 'storage_cache', {})
+    return build_run_context('2024-02-15', storage='memory')
+
+
+def payloads_of(ctx, upload_date, trigger):
+    df_pred = pd.DataFrame({'region': ['ZW10', 'ZW11'], 'forecast_trigger': [trigger, 0]})
+    for layer in output_layers:
+        if layer != 'forecast_trigger':
+            df_pred[layer] = [trigger * 100, 0]
+    return exposure_payloads(ctx, df_pred, upload_date)
+
+
+def test_everything_is_posted_first(ctx):
+    payloads = payloads_of(ctx, '2024-02-15T00:00:00', 0)
+    assert changed_payloads(ctx, payloads) == payloads
+    assert layers_to_post(ctx, payloads) == payloads
+
+
+def test_nothing_is_posted_when_nothing_changed(ctx):
+    save_posted_hashes(ctx, payloads_of(ctx, '2024-01-15T00:00:00', 1))
+    # a new upload date with the same content, a drought forecasted included
+    payloads = payloads_of(ctx, '2024-02-15T00:00:00', 1)
+    assert changed_payloads(ctx, payloads) == []
+    assert layers_to_post(ctx, payloads) == []
+
+
+def test_all_layers_are_posted_when_one_changed(ctx):
+    payloads = payloads_of(ctx, '2024-01-15T00:00:00', 0)
+    save_posted_hashes(ctx, payloads)
+    payloads = payloads_of(ctx, '2024-02-15T00:00:00', 0)
+    payloads[0]['exposurePlaceCodes'][0]['amount'] = 1
+    assert changed_payloads(ctx, payloads) == [payloads[0]]
+    assert layers_to_post(ctx, payloads) == payloads
+
+
+def test_all_layers_are_posted_without_upload_diff(ctx):
+    ctx = dataclasses.replace(ctx, upload_diff=False)
+    payloads = payloads_of(ctx, '2024-02-15T00:00:00', 0)
+    save_posted_hashes(ctx, payloads)
+    assert layers_to_post(ctx, payloads) == payloads
+
+
+def test_post_none_output_posts_once(tmp_path, monkeypatch):
+    from drought_model.fixtures import make_fixtures, serve_fixtures, fixture_context
+
+    monkeypatch.setattr(utils, 'storage_cache', {})
+    root = str(tmp_path)
+    paths = make_fixtures(root, '2024-06-15', n_adm2=20)
+    server, base_url = serve_fixtures(paths['http_root'])
+    try:
+        ctx = fixture_context(root, base_url, '2024-06-15', notify_email=False)
+        utils.post_none_output(ctx, '2024-06-15T00:00:00')
+        # every layer and the events of the upload date
+        assert [post['path'].split('/api/')[1] for post in server.posted] == \
+            ['admin-area-dynamic-data/exposure'] * len(output_layers) + ['events/process?noNotifications=true']
+        utils.post_none_output(ctx, '2024-07-15T00:00:00')
+        assert len(server.posted) == len(output_layers) + 1
+    finally:
+        server.shutdown()
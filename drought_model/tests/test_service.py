@@ -0,0 +1,47 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from drought_model import pipeline, service
+
+
+def test_simultaneous_runs_get_409(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def blocking_run(ctx):
+        started.set()
+        release.wait(10)
+        return {'status': 'ok'}
+
+    monkeypatch.setattr(pipeline, 'run', blocking_run)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), service.ServiceHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/run'
+    statuses = []
+
+    def post():
+        request = urllib.request.Request(url, data=json.dumps({'date': '2024-02-15'}).encode())
+        try:
+            with urllib.request.urlopen(request) as response:
+                statuses.append(response.status)
+        except urllib.error.HTTPError as e:
+            statuses.append(e.code)
+
+    try:
+        first = threading.Thread(target=post)
+        first.start()
+        assert started.wait(10)
+        others = [threading.Thread(target=post) for _ in range(4)]
+        for thread in others:
+            thread.start()
+        for thread in others:
+            thread.join(10)
+        release.set()
+        first.join(10)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert sorted(statuses) == [200, 409, 409, 409, 409]
+    assert not service.run_lock.locked()
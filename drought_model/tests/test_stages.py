@@ -0,0 +1,68 @@
+import os
+import pytest
+from drought_model import stages
+from drought_model.settings import build_run_context
+from drought_model.stages import attempt_stage, blocking_stages, run_action, run_status
+
+
+@pytest.fixture
+def ctx(tmp_path):
+    ctx = build_run_context('2024-02-15', work_dir=str(tmp_path))
+    os.makedirs(ctx.data_in_path, exist_ok=True)
+    return ctx
+
+
+def test_failed_forecast_falls_back():
+    results = {'basic_data': {'status': 'ok'}, 'arrange_data': {'status': 'ok'},
+               'forecast_model3': {'status': 'failed'}}
+    assert run_action(results) == 'fallback'
+
+    results['fallback_forecast'] = {'status': 'ok'}
+    assert run_action(results) == 'continue'
+    assert run_status(results) == 'fallback'
+
+
+def test_failed_fallback_forecast_aborts():
+    results = {'basic_data': {'status': 'ok'}, 'forecast_model3': {'status': 'failed'},
+               'fallback_forecast': {'status': 'failed'}}
+    assert run_action(results) == 'abort'
+    assert run_status(results) == 'failed'
+
+
+def test_skipped_stage_blocks_its_dependants(ctx):
+    results = {'basic_data': {'status': 'ok'}, 'get_new_enso': {'status': 'ok'},
+               'get_new_chirps': {'status': 'ok'}, 'get_new_vci': {'status': 'failed'},
+               'arrange_data': {'status': 'skipped'}}
+    # VCI is required by arrange_data in the months of model 3
+    assert blocking_stages(ctx, results, 'arrange_data') == ['get_new_vci']
+    assert blocking_stages(ctx, results, 'forecast_model3') == ['arrange_data']
+    # a required stage which did not run does not block
+    assert blocking_stages(ctx, {'basic_data': {'status': 'ok'}}, 'arrange_data') == []
+
+
+def test_stage_without_output_fails(ctx, monkeypatch):
+    monkeypatch.setattr(stages, 'stage_retry_wait', 0)
+
+    def get_new_enso(ctx):
+        return 'done'
+
+    result = attempt_stage(get_new_enso, ctx)
+    assert result.status == 'failed'
+    assert result.attempts == stages.stage_policies['get_new_enso']['attempts']
+    assert result.error.startswith('output not written')
+    assert result.outputs == []
+
+
+def test_stage_with_output_succeeds(ctx, monkeypatch):
+    monkeypatch.setattr(stages, 'stage_retry_wait', 0)
+    enso_file_path = os.path.join(ctx.data_in_path, 'enso_2024-02.csv')
+
+    def get_new_enso(ctx):
+        with open(enso_file_path, 'w') as enso_file:
+            enso_file.write('JAS\n0.5\n')
+        return 'done'
+
+    result = attempt_stage(get_new_enso, ctx)
+    assert result.ok and result.value == 'done'
+    assert result.attempts == 1
+    assert result.outputs == [enso_file_path]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from drought_model.vci_weeks import list_iso_weeks, vci_filename, new_week_store, stored_weeks, append_week, \
+    monthly_vci
+
+
+def test_weeks_of_december_2020():
+    # 2020 has an ISO week 53, from Monday 28 December 2020 to Sunday 3 January 2021
+    assert list_iso_weeks(2020, 12) == {(2020, 49): 6, (2020, 50): 7, (2020, 51): 7, (2020, 52): 7, (2020, 53): 4}
+
+
+def test_weeks_of_january_2021():
+    weeks = list_iso_weeks(2021, 1)
+    assert weeks == {(2020, 53): 3, (2021, 1): 7, (2021, 2): 7, (2021, 3): 7, (2021, 4): 7}
+    assert sum(weeks.values()) == 31
+
+
+def test_filenames_use_iso_year():
+    assert vci_filename(2020, 53) == 'VHP.G04.C07.j01.P2020053.VH.VCI.tif'
+    assert vci_filename(2021, 1) == 'VHP.G04.C07.j01.P2021001.VH.VCI.tif'
+    assert [vci_filename(*week) for week in list_iso_weeks(2021, 1)][0] == 'VHP.G04.C07.j01.P2020053.VH.VCI.tif'
+
+
+def test_monthly_vci_weighted_by_days_of_the_month():
+    pcodes = ['ZW100001', 'ZW100002']
+    df_store = new_week_store()
+    df_store = append_week(df_store, pcodes, [10.0, 20.0], 2020, 53)
+    for week in (1, 2, 3, 4):
+        df_store = append_week(df_store, pcodes, [52.0, np.nan if week == 2 else 40.0], 2021, week)
+    # a week outside the month is ignored, a week stored again is replaced
+    df_store = append_week(df_store, pcodes, [99.0, 99.0], 2021, 5)
+    df_store = append_week(df_store, pcodes, [52.0, 40.0], 2021, 1)
+    assert stored_weeks(df_store) == {(2020, 53), (2021, 1), (2021, 2), (2021, 3), (2021, 4), (2021, 5)}
+
+    df_month = monthly_vci(df_store, list_iso_weeks(2021, 1), 1).set_index('ADM2_PCODE')['01_vci']
+
+    # 3 days of week 53 of 2020 and 28 days of 2021; the missing week of the second district is left out
+    assert df_month['ZW100001'] == pytest.approx((3 * 10.0 + 28 * 52.0) / 31)
+    assert df_month['ZW100002'] == pytest.approx((3 * 20.0 + 21 * 40.0) / 24)
@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('shapely')
+
+from drought_model import utils
+from drought_model.fixtures import make_fixtures, fixture_context, blob_file_path, dummy_model, model_features
+from drought_model.settings import impact_indicators
+from drought_model.utils import basic_data, get_admin_geometries, get_model, get_exposure_matrix
+
+today = '2024-02-15'
+
+
+@pytest.fixture
+def ctx(tmp_path, monkeypatch):
+    # the caches of a warm process, empty at the start of every test
+    for cache in ('storage_cache', 'admin_cache', 'model_cache', 'exposure_cache'):
+        monkeypatch.setattr(utils, cache, {})
+    root = str(tmp_path)
+    make_fixtures(root, today, n_adm2=20)
+    return fixture_context(root, 'http://127.0.0.1:9/', today, notify_email=False)
+
+
+def test_basic_data_restores_deleted_admin_csv(ctx):
+    basic_data(ctx)
+    boundaries = get_admin_geometries(ctx, 2)
+    basic_data(ctx)
+    assert get_admin_geometries(ctx, 2) is boundaries
+
+    adm_csv_path = os.path.join(ctx.adm_path, ctx.adm_name(2) + '.csv')
+    os.remove(adm_csv_path)
+    basic_data(ctx)
+    assert os.path.isfile(adm_csv_path)
+    assert get_admin_geometries(ctx, 2) is not boundaries
+
+
+def test_model_reloaded_when_blob_changes(ctx):
+    pytest.importorskip('xgboost')
+    blob_path = f'drought/Gold/{ctx.country}/model3/test_model.json'
+    model_file_path = blob_file_path(ctx.local_store, ctx.container, blob_path)
+    dummy_model(model_features(2), np.random.default_rng(0)).save_model(model_file_path)
+    model = get_model(ctx, blob_path)
+    assert get_model(ctx, blob_path) is model
+
+    dummy_model(model_features(2), np.random.default_rng(1)).save_model(model_file_path)
+    assert get_model(ctx, blob_path) is not model
+
+
+def test_exposure_reloaded_when_table_changes(ctx):
+    df_exposure = get_exposure_matrix(ctx)
+    assert get_exposure_matrix(ctx) is df_exposure
+
+    filename, _, exposure_column = next(iter(impact_indicators.values()))
+    table_path = blob_file_path(ctx.local_store, ctx.container, f'drought/Gold/{ctx.country}/{filename}')
+    df_table = pd.read_csv(table_path)
+    df_table[exposure_column] += 1
+    df_table.to_csv(table_path, index=False)
+    assert get_exposure_matrix(ctx) is not df_exposure